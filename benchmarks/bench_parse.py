@@ -0,0 +1,54 @@
+"""
+Lines/sec of the Request parsing, the baseline is the Request before __slots__,
+lazy dates and the section cache
+
+    python -m benchmarks.bench_parse --lines 20000000
+"""
+from src.config import CSV_COLUMNS
+from src.model.server import Request
+from datetime import datetime
+import click
+import itertools
+import os
+import time
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), '..', 'sample_csv.txt')
+
+
+class BaselineRequest:
+    def __init__(self, request_line: str):
+        self._remotehost, self._rfc931, self._authuser, self.timestamp,\
+            self._request, self.status, self._bytes = request_line.split(',')
+        self.timestamp = int(self.timestamp)
+        self.section = self._request.split(' ')[1].split('/')[1]
+        self.date = datetime.utcfromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def read_sample_lines():
+    with open(SAMPLE_CSV, 'r') as log_file:
+        next(log_file)
+        return [line for line in log_file if len(line.split(',')) == CSV_COLUMNS]
+
+
+def measure(request_class, lines, total_lines: int) -> float:
+    start = time.perf_counter()
+    for line in itertools.islice(itertools.cycle(lines), total_lines):
+        request_class(line)
+    return total_lines / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--lines", "total_lines", type=int, default=10000000, help="Lines to parse, the sample file is repeated")
+def main(total_lines):
+    lines = read_sample_lines()
+
+    baseline = measure(BaselineRequest, lines, total_lines)
+    current = measure(Request, lines, total_lines)
+
+    click.echo(f"lines: {total_lines}")
+    click.echo(f"baseline: {baseline:,.0f} lines/sec")
+    click.echo(f"current: {current:,.0f} lines/sec ({current / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Synthetic access log generator
+
+    python -m benchmarks.generator access.csv --duration 600 --rate 2000
+"""
+from src.config import LOG_DELAY
+from typing import Dict, Iterator
+import click
+import random
+
+HEADER = '"remotehost","rfc931","authuser","date","request","status","bytes"'
+DEFAULT_STATUS_MIX = {'200': 0.85, '301': 0.03, '404': 0.08, '500': 0.04}
+
+
+class LogGenerator:
+    """
+    Generates realistic CSV access log lines
+
+    - rate: the requests per second, during a burst it is multiplied by burst_factor
+    - sections: the number of distinct sections, the popularity follows a Zipf distribution
+    - status_mix: the weight of each status
+    - jitter: the max seconds a late line is behind the lines around it (out of order lines),
+    it should be lower than LOG_DELAY to keep the alarms exact
+    - late_ratio: the ratio of late lines
+    - burst_every / burst_length: a burst of burst_length seconds starts every burst_every seconds
+    """
+    def __init__(self, rate: int = 100, sections: int = 20, status_mix: Dict[str, float] = None,
+                 jitter: int = LOG_DELAY - 1, late_ratio: float = 0.05,
+                 burst_every: int = 0, burst_length: int = 0, burst_factor: float = 1,
+                 hosts: int = 256, start: int = 1549573860, seed: int = 0):
+        self.rate = rate
+        self.sections = [f'section{index}' for index in range(sections)]
+        self.status_mix = status_mix or DEFAULT_STATUS_MIX
+        self.jitter = jitter
+        self.late_ratio = late_ratio
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.burst_factor = burst_factor
+        self.hosts = [f'10.0.{index // 256}.{index % 256}' for index in range(hosts)]
+        self.start = start
+        self._random = random.Random(seed)
+        self._section_weights = [1 / (rank + 1) for rank in range(sections)]
+
+    def get_rate(self, second: int) -> int:
+        if self.burst_every and second % self.burst_every < self.burst_length:
+            return int(self.rate * self.burst_factor)
+        return self.rate
+
+    def lines(self, duration: int) -> Iterator[str]:
+        yield HEADER
+
+        for second in range(duration):
+            hits = self.get_rate(second)
+            sections = self._random.choices(self.sections, self._section_weights, k=hits)
+            statuses = self._random.choices(list(self.status_mix), list(self.status_mix.values()), k=hits)
+
+            for section, status in zip(sections, statuses):
+                timestamp = self.start + second
+                if self._random.random() < self.late_ratio:
+                    timestamp -= self._random.randint(1, max(min(self.jitter, second), 1))
+                host = self._random.choice(self.hosts)
+                bytes_sent = self._random.randint(100, 10000)
+                yield f'"{host}","-","apache",{timestamp},"GET /{section}/item HTTP/1.0",{status},{bytes_sent}'
+
+    def write(self, file_path: str, duration: int):
+        with open(file_path, 'w') as log_file:
+            for line in self.lines(duration):
+                log_file.write(line + '\n')
+
+
+@click.command()
+@click.argument("file", type=str, required=True)
+@click.option("--duration", type=int, default=600, help="Seconds of log")
+@click.option("--rate", type=int, default=100, help="Requests per second")
+@click.option("--sections", type=int, default=20, help="Distinct sections")
+@click.option("--jitter", type=int, default=LOG_DELAY - 1, help="Max seconds of out of order lines")
+@click.option("--late-ratio", type=float, default=0.05, help="Ratio of out of order lines")
+@click.option("--burst-every", type=int, default=0, help="Seconds between bursts (0 without bursts)")
+@click.option("--burst-length", type=int, default=0, help="Seconds of each burst")
+@click.option("--burst-factor", type=float, default=1, help="Rate multiplier during a burst")
+@click.option("--seed", type=int, default=0)
+def main(file, duration, rate, sections, jitter, late_ratio, burst_every, burst_length, burst_factor, seed):
+    generator = LogGenerator(rate, sections, jitter=jitter, late_ratio=late_ratio, burst_every=burst_every,
+                             burst_length=burst_length, burst_factor=burst_factor, seed=seed)
+    generator.write(file, duration)
+
+
+if __name__ == '__main__':
+    main()
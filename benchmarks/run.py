@@ -0,0 +1,160 @@
+"""
+Runs the benchmarks over a synthetic log and saves the results as JSON
+
+    python -m benchmarks.run --duration 300 --rate 1000 --output results.json
+    python -m benchmarks.run --compare results.json
+"""
+from benchmarks.generator import LogGenerator
+from src.config import ALERT_INTERVAL, CSV_COLUMNS, DISPLAY_INTERVAL, LOG_DELAY
+from src.model.server import Request, ServerStateMachine
+from src.service.agent import Agent
+from src.service.aggregator import StatsAggregator
+from src.service.batch import BatchReader
+from src.utils.utils import TTLIntervalCache, TTLBucketIntervalCache, TTLRequestCache
+from datetime import datetime, timezone
+from typing import Callable, Dict
+import click
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+
+class Benchmark:
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, 'r') as log_file:
+            next(log_file)
+            self.lines = [line for line in log_file if len(line.split(',')) == CSV_COLUMNS]
+        self.requests = [Request(line) for line in self.lines]
+        self.timestamps = [request.timestamp for request in self.requests]
+
+    def get_benchmarks(self) -> Dict[str, Callable[[], int]]:
+        benchmarks = {
+            'request_parse': self.request_parse,
+            'interval_cache_heap_append': lambda: self.interval_cache_append(TTLIntervalCache),
+            'interval_cache_ring_append': lambda: self.interval_cache_append(TTLBucketIntervalCache),
+            'request_cache_windows': self.request_cache_windows,
+            'stats_aggregator_windows': self.stats_aggregator_windows,
+            'agent_line': lambda: self.agent(),
+            'agent_mmap': lambda: self.agent(use_mmap=True),
+        }
+        if BatchReader.is_available():
+            benchmarks['agent_batch'] = lambda: self.agent(batch=True)
+        return benchmarks
+
+    def request_parse(self) -> int:
+        for line in self.lines:
+            Request(line)
+        return len(self.lines)
+
+    def interval_cache_append(self, cache_class) -> int:
+        cache = cache_class(ALERT_INTERVAL, LOG_DELAY, ServerStateMachine())
+        for timestamp in self.timestamps:
+            cache.append(timestamp)
+        return len(self.timestamps)
+
+    def request_cache_windows(self) -> int:
+        request_cache = TTLRequestCache(DISPLAY_INTERVAL, LOG_DELAY)
+        for request in self.requests:
+            request_cache.append(request)
+        return len(self.requests)
+
+    def stats_aggregator_windows(self) -> int:
+        aggregator = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        for request in self.requests:
+            aggregator.append(request)
+        return len(self.requests)
+
+    def agent(self, **options) -> int:
+        agent = Agent(self.file_path, ServerStateMachine(), **options)
+        agent.add_stats_subscriber(lambda event: None)
+        agent.add_state_change_subscriber(lambda event: None)
+        agent.run()
+        agent.join()
+        return agent.total_requests
+
+
+def measure(function: Callable[[], int], repeat: int) -> Dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operations = function()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best['seconds']:
+            best = {'operations': operations, 'seconds': seconds, 'operations_per_sec': operations / seconds}
+    return best
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(results: Dict, previous: Dict):
+    click.echo(f"Compared with {previous.get('commit', '')[:10]}")
+    for name, result in results['results'].items():
+        if name not in previous['results']:
+            continue
+        ratio = result['operations_per_sec'] / previous['results'][name]['operations_per_sec']
+        color = 'green' if ratio >= 0.95 else 'red'
+        click.secho(f'{name:<30} {ratio:.2f}x', fg=color)
+
+
+@click.command()
+@click.option("--duration", type=int, default=300, help="Seconds of synthetic log")
+@click.option("--rate", type=int, default=500, help="Requests per second")
+@click.option("--sections", type=int, default=20, help="Distinct sections")
+@click.option("--jitter", type=int, default=LOG_DELAY - 1, help="Max seconds of out of order lines")
+@click.option("--late-ratio", type=float, default=0.05, help="Ratio of out of order lines")
+@click.option("--burst-every", type=int, default=300, help="Seconds between bursts (0 without bursts)")
+@click.option("--burst-length", type=int, default=60, help="Seconds of each burst")
+@click.option("--burst-factor", type=float, default=3, help="Rate multiplier during a burst")
+@click.option("--repeat", type=int, default=3, help="Runs of each benchmark, the best one is saved")
+@click.option("--only", multiple=True, help="Run only these benchmarks")
+@click.option("--output", "-o", type=click.Path(), default=None, help="Save the results as JSON")
+@click.option("--compare", "compare_file", type=click.Path(exists=True), default=None,
+              help="Compare with the results of a previous run")
+def main(duration, rate, sections, jitter, late_ratio, burst_every, burst_length, burst_factor, repeat, only, output,
+         compare_file):
+    generator_options = {'duration': duration, 'rate': rate, 'sections': sections, 'jitter': jitter,
+                         'late_ratio': late_ratio, 'burst_every': burst_every, 'burst_length': burst_length,
+                         'burst_factor': burst_factor}
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'access.csv')
+        LogGenerator(rate, sections, jitter=jitter, late_ratio=late_ratio, burst_every=burst_every,
+                     burst_length=burst_length, burst_factor=burst_factor).write(file_path, duration)
+
+        benchmark = Benchmark(file_path)
+        results = {
+            'commit': get_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'generator': generator_options,
+            'results': {},
+        }
+
+        for name, function in benchmark.get_benchmarks().items():
+            if only and name not in only:
+                continue
+            result = measure(function, repeat)
+            results['results'][name] = result
+            click.echo(f"{name:<30} {result['operations_per_sec']:>14,.0f} ops/sec")
+
+    if output:
+        with open(output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if compare_file:
+        with open(compare_file, 'r') as previous_file:
+            compare(results, json.load(previous_file))
+
+
+if __name__ == '__main__':
+    main()
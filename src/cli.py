@@ -1,26 +1,435 @@
 import click
 from src.service.agent import Agent
+from src.service.batch import BatchReader
+from src.service.report import Report
+from src.service.metrics import Metrics, MetricsFileExporter, MetricsHttpServer
+from src.service.checkpoint import Checkpoint
+from src.service.compressed import CompressedReader
+from src.service.index import TimestampIndex
+from src.service.rules import load_rules
+from src.service.syslog import SyslogReader
+from src.service.storage import get_store
+from datetime import datetime, timezone
+from src.config import METRICS_INTERVAL, INDEX_EVERY_LINES, SYSLOG_UDP_PORT, SYSLOG_TCP_PORT, TOP_SECTIONS, \
+    ROLLUP_RESOLUTIONS, TOP_K_ENGINE, WINDOW_EMISSION
+import glob
 import os
+import sys
+import time
+from src.utils.clock import ReplayClock
 from src.utils.utils import Screen
 from src.model.server import ServerStateMachine
 
 
-@click.command()
-@click.argument("file", type=str, required=True)
-def cli(file):
+class DefaultCommandGroup(click.Group):
+    """
+    Runs the default command when the first argument is not a command,
+    so `log-monitor FILE` keeps working next to `log-monitor report FILE`
+    """
+    def __init__(self, *args, default_command: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in self.get_help_option_names(ctx):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+def engine_options(function):
+    function = click.option("--workers", type=int, default=0,
+                            help="Parse the file with a pool of processes (0 reads it sequentially)")(function)
+    function = click.option("--batch", is_flag=True, help="Parse the file in chunks with the numpy batch engine")(function)
+    function = click.option("--mmap", "use_mmap", is_flag=True, help="Memory map the file and scan it in place")(function)
+    function = click.option("--checkpoint", type=click.Path(), default=None,
+                            help="Save the offset and the windows to this file and continue from it on restart")(function)
+    return function
+
+
+class TimestampType(click.ParamType):
+    """
+    A UNIX timestamp or a UTC date (2019-02-07 21:11:00)
+    """
+    name = 'timestamp'
+    DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int) or str(value).isdigit():
+            return int(value)
+
+        for date_format in self.DATE_FORMATS:
+            try:
+                return int(datetime.strptime(value, date_format).replace(tzinfo=timezone.utc).timestamp())
+            except ValueError:
+                continue
+        self.fail(f'{value} is not a UNIX timestamp or a date like 2019-02-07 21:11:00', param, ctx)
+
+
+def time_range_options(function):
+    function = click.option("--to", "to_timestamp", type=TimestampType(), default=None,
+                            help="Process the lines until this timestamp or UTC date (uses the index of the file)")(function)
+    function = click.option("--from", "from_timestamp", type=TimestampType(), default=None,
+                            help="Process the lines from this timestamp or UTC date (uses the index of the file)")(function)
+    return function
+
+
+def get_time_range(from_timestamp, to_timestamp):
+    if from_timestamp is None and to_timestamp is None:
+        return None
+    return from_timestamp, to_timestamp
+
+
+def rules_option(function):
+    return click.option("--rules", "rules_file", type=click.Path(exists=True), default=None,
+                        help="A JSON file of alert rules evaluated next to the high traffic alarm")(function)
+
+
+def get_rules(rules_file):
+    """
+    Returns the rules of the file (None without a file) or False when the file is not valid
+    """
+    if not rules_file:
+        return None
+
+    try:
+        return load_rules(rules_file)
+    except (ValueError, TypeError) as error:
+        click.secho(f'Invalid rules file: {error}', fg='red')
+        return False
+
+
+def window_option(function):
+    return click.option("--windows", "window_emission", type=click.Choice(Agent.WINDOW_EMISSIONS), default=None,
+                        help="Close each stats window on the next request ('arrival') or with a watermark "
+                             "of the event time ('watermark'), WINDOW_EMISSION by default")(function)
+
+
+def store_option(function):
+    return click.option("--store", "store_path", type=click.Path(), default=None,
+                        help="Keep the windows and alerts on this SQLite database (or .jsonl file)")(function)
+
+
+def start_store(store_path, agent: Agent):
+    """
+    Subscribes a started store (None without a path) to the windows and alerts of the agent
+    """
+    if not store_path:
+        return None
 
-    if not os.path.exists(file):
+    store = get_store(store_path)
+    store.start()
+    agent.add_stats_subscriber(store.on_new_stats)
+    agent.add_state_change_subscriber(store.on_server_state_change)
+    agent.add_rule_state_change_subscriber(store.on_rule_state_change)
+    return store
+
+
+def close_store(store):
+    if not store:
+        return
+
+    store.close()
+    if store.error:
+        click.secho(f'The store {store.path} failed: {store.error}', fg='red', err=True)
+
+
+def exit_on_agent_error(agent: Agent):
+    if agent.error:
+        click.secho(f'Can not read the log: {agent.error}', fg='red', err=True)
+        sys.exit(1)
+
+
+def metrics_options(function):
+    function = click.option("--metrics-port", type=int, default=None,
+                            help="Serve the metrics in the Prometheus format on http://127.0.0.1:PORT/metrics")(function)
+    function = click.option("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                            help="Seconds between each write of the metrics file")(function)
+    function = click.option("--metrics-file", type=click.Path(), default=None,
+                            help="Write the pipeline metrics as JSON to this file periodically")(function)
+    return function
+
+
+def start_metrics_exporters(metrics_file, metrics_interval, metrics_port) -> tuple:
+    """
+    Returns the metrics registry (None without exporters) and the started exporters
+    """
+    if not metrics_file and metrics_port is None:
+        return None, []
+
+    metrics = Metrics()
+    exporters = []
+    if metrics_file:
+        exporters.append(MetricsFileExporter(metrics, metrics_file, metrics_interval))
+    if metrics_port is not None:
+        exporters.append(MetricsHttpServer(metrics, metrics_port))
+
+    for exporter in exporters:
+        exporter.start()
+    return metrics, exporters
+
+
+def get_files(patterns) -> list:
+    """
+    Expands the glob patterns (e.g. "/var/log/web-*/access.csv"), a pattern without matches is kept as it is
+    """
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    return files
+
+
+def is_valid_input(files, follow, batch, workers, use_mmap, checkpoint=None, time_range=None,
+                   window_emission=None) -> bool:
+    if not all(os.path.exists(file) for file in files):
         click.secho('File not found', fg='red')
+        return False
+
+    if (window_emission or WINDOW_EMISSION) == 'watermark' and TOP_K_ENGINE != 'exact':
+        click.secho(f"--windows watermark counts the sections exactly, it can not be used with "
+                    f"TOP_K_ENGINE = '{TOP_K_ENGINE}'", fg='red')
+        return False
+
+    if sum(bool(engine) for engine in (batch, workers, use_mmap)) > 1:
+        click.secho('Only one of --batch, --workers and --mmap can be used', fg='red')
+        return False
+
+    if (batch or workers or use_mmap) and len(files) > 1:
+        click.secho('--batch, --workers and --mmap read a single file', fg='red')
+        return False
+
+    if (batch or workers or use_mmap) and follow:
+        click.secho('--batch, --workers and --mmap can not be used with --follow', fg='red')
+        return False
+
+    compressed = any(CompressedReader.is_compressed(file) for file in files)
+    if (batch or workers or use_mmap) and compressed:
+        click.secho('--batch, --workers and --mmap can not read compressed files', fg='red')
+        return False
+
+    if checkpoint and (batch or workers or use_mmap or len(files) > 1 or compressed):
+        click.secho('--checkpoint reads a single plain file without --batch, --workers and --mmap', fg='red')
+        return False
+
+    if time_range and (follow or batch or workers or use_mmap or len(files) > 1 or compressed):
+        click.secho('--from and --to read a single plain file without --follow, --batch, --workers and --mmap',
+                    fg='red')
+        return False
+
+    if batch and not BatchReader.is_available():
+        click.secho('--batch requires numpy, please install it with `pip install numpy`', fg='red')
+        return False
+
+    return True
+
+
+@click.group(cls=DefaultCommandGroup, default_command='monitor')
+def cli():
+    pass
+
+
+@cli.command()
+@click.argument("files", nargs=-1, type=str, required=True)
+@click.option("--follow", "-f", is_flag=True, help="Keep reading new lines appended to the file (like tail -F)")
+@click.option("--speed", type=click.FloatRange(min=0), default=None,
+              help="Replay the log on a clock driven by its timestamps, SPEED times faster than real time "
+                   "(1 real time, 60 a minute per second, 0 unbounded)")
+@engine_options
+@time_range_options
+@rules_option
+@window_option
+@store_option
+@metrics_options
+def monitor(files, follow, speed, batch, workers, use_mmap, checkpoint, from_timestamp, to_timestamp, rules_file,
+            window_emission, store_path, metrics_file, metrics_interval, metrics_port):
+    """Shows the stats and alarms of the log FILES (or globs) merged by timestamp on the screen"""
+    files = get_files(files)
+    time_range = get_time_range(from_timestamp, to_timestamp)
+    if not is_valid_input(files, follow, batch, workers, use_mmap, checkpoint, time_range, window_emission):
+        return
+
+    rules = get_rules(rules_file)
+    if rules is False:
+        return
+
+    metrics, exporters = start_metrics_exporters(metrics_file, metrics_interval, metrics_port)
+    clock = ReplayClock(speed) if speed is not None else None
+
+    server_state_machine = ServerStateMachine()
+    agent = Agent(files, server_state_machine, follow=follow, batch=batch, workers=workers,
+                  use_mmap=use_mmap, metrics=metrics, checkpoint=Checkpoint(checkpoint) if checkpoint else None,
+                  time_range=time_range, rules=rules, clock=clock, window_emission=window_emission)
+    screen = Screen(history_hits=agent.rollups.get_hits, clock=clock)
+
+    agent.add_state_change_subscriber(screen.on_server_state_change)
+    agent.add_stats_subscriber(screen.on_new_stats)
+    agent.add_rule_state_change_subscriber(screen.on_rule_state_change)
+    store = start_store(store_path, agent)
+
+    agent.run()
+    agent.join()
+    close_store(store)
+
+    for exporter in exporters:
+        exporter.stop()
+    exit_on_agent_error(agent)
+
+
+@cli.command()
+@click.argument("files", nargs=-1, type=str, required=True)
+@click.option("--format", "output_format", type=click.Choice(Report.FORMATS), default='json',
+              help="Write the windows and alarms as JSON lines or CSV rows")
+@click.option("--output", "-o", type=click.File('w'), default='-', help="The report file (stdout by default)")
+@click.option("--per-source", is_flag=True, help="Write the windows of each file too when there are many files")
+@click.option("--history", type=click.Choice([str(resolution) for resolution, _ in ROLLUP_RESOLUTIONS]), default=None,
+              help="Write the traffic history at this resolution (in seconds) at the end of the report")
+@engine_options
+@time_range_options
+@rules_option
+@window_option
+@store_option
+@metrics_options
+def report(files, output_format, output, per_source, history, batch, workers, use_mmap, checkpoint, from_timestamp,
+           to_timestamp, rules_file, window_emission, store_path, metrics_file, metrics_interval, metrics_port):
+    """Writes the stats and alarms of the log FILES (or globs) without a screen, as fast as possible"""
+    files = get_files(files)
+    time_range = get_time_range(from_timestamp, to_timestamp)
+    if not is_valid_input(files, False, batch, workers, use_mmap, checkpoint, time_range, window_emission):
+        return
+
+    rules = get_rules(rules_file)
+    if rules is False:
+        return
+
+    per_source = per_source and len(files) > 1
+    log_report = Report(output, output_format, per_source=per_source)
+    metrics, exporters = start_metrics_exporters(metrics_file, metrics_interval, metrics_port)
+
+    server_state_machine = ServerStateMachine()
+    agent = Agent(files, server_state_machine, batch=batch, workers=workers, use_mmap=use_mmap,
+                  metrics=metrics, per_source_stats=per_source,
+                  checkpoint=Checkpoint(checkpoint) if checkpoint else None, time_range=time_range, rules=rules,
+                  window_emission=window_emission)
+
+    agent.add_state_change_subscriber(log_report.on_server_state_change)
+    agent.add_stats_subscriber(log_report.on_new_stats)
+    agent.add_rule_state_change_subscriber(log_report.on_rule_state_change)
+    if per_source:
+        agent.add_source_stats_subscriber(log_report.on_new_stats)
+    store = start_store(store_path, agent)
+    if store and per_source:
+        agent.add_source_stats_subscriber(store.on_new_stats)
+
+    start = time.perf_counter()
+    agent.run()
+    agent.join()
+    elapsed = time.perf_counter() - start
+    if history:
+        log_report.write_history(agent.rollups.get_history(int(history)))
+    output.flush()
+    close_store(store)
+
+    for exporter in exporters:
+        exporter.stop()
+
+    click.secho(f'Processed {agent.total_requests} requests in {elapsed:.2f}s '
+                f'({agent.total_requests / max(elapsed, 1e-6):,.0f} requests/sec)', fg='green', err=True)
+    if agent.stats.late_records:
+        click.secho(f'Dropped {agent.stats.late_records} late requests', fg='yellow', err=True)
+    exit_on_agent_error(agent)
+
+
+@cli.command()
+@click.option("--host", type=str, default='127.0.0.1', help="The address to listen on")
+@click.option("--udp-port", type=int, default=None, help="Receive syslog messages over UDP on this port")
+@click.option("--tcp-port", type=int, default=None, help="Receive syslog messages over TCP on this port")
+@rules_option
+@window_option
+@store_option
+@metrics_options
+def listen(host, udp_port, tcp_port, rules_file, window_emission, store_path, metrics_file, metrics_interval, metrics_port):
+    """Shows the stats and alarms of the access log lines received as syslog messages over UDP and TCP
+    (on SYSLOG_UDP_PORT and SYSLOG_TCP_PORT without --udp-port and --tcp-port)"""
+    if udp_port is None and tcp_port is None:
+        udp_port, tcp_port = SYSLOG_UDP_PORT, SYSLOG_TCP_PORT
+    if not is_valid_input([], False, False, 0, False, window_emission=window_emission):
         return
 
-    screen = Screen()
+    rules = get_rules(rules_file)
+    if rules is False:
+        return
+
+    reader = SyslogReader(host, udp_port=udp_port, tcp_port=tcp_port)
+    try:
+        reader.start()
+    except OSError as error:
+        click.secho(f'Can not listen on {host}: {error.strerror}', fg='red')
+        return
+
+    metrics, exporters = start_metrics_exporters(metrics_file, metrics_interval, metrics_port)
 
     server_state_machine = ServerStateMachine()
-    agent = Agent(file, server_state_machine)
+    agent = Agent(reader.name, server_state_machine, metrics=metrics, rules=rules, reader=reader,
+                  window_emission=window_emission)
+    screen = Screen(dropped_lines=lambda: reader.dropped_lines, history_hits=agent.rollups.get_hits)
 
     agent.add_state_change_subscriber(screen.on_server_state_change)
-    agent.add_data_subscriber(screen.on_new_data)
+    agent.add_stats_subscriber(screen.on_new_stats)
+    agent.add_rule_state_change_subscriber(screen.on_rule_state_change)
+    store = start_store(store_path, agent)
 
     agent.run()
+    agent.join()
+    close_store(store)
+
+    for exporter in exporters:
+        exporter.stop()
+
+
+@cli.command()
+@click.argument("file", type=str, required=True)
+@click.option("--every", type=int, default=INDEX_EVERY_LINES, help="Lines between each entry of the index")
+def index(file, every):
+    """Builds (or updates with the appended lines) the timestamp index of the log FILE used by --from and --to"""
+    if not is_valid_input([file], False, False, 0, False):
+        return
+
+    if CompressedReader.is_compressed(file):
+        click.secho('Compressed files can not be indexed', fg='red')
+        return
+
+    timestamp_index = TimestampIndex(file, every=every)
+    start = time.perf_counter()
+    lines = timestamp_index.update()
+    if timestamp_index.error:
+        click.secho(f'Can not save the index {timestamp_index.index_path}: {timestamp_index.error.strerror}',
+                    fg='red', err=True)
+        sys.exit(1)
+    click.secho(f'Indexed {lines} new lines in {time.perf_counter() - start:.2f}s, '
+                f'{len(timestamp_index)} entries in {timestamp_index.index_path}', fg='green')
+
+
+@cli.command()
+@click.argument("store_path", type=click.Path(exists=True), required=True)
+@click.option("--from", "from_timestamp", type=TimestampType(), default=None,
+              help="List the windows and alerts from this timestamp or UTC date")
+@click.option("--to", "to_timestamp", type=TimestampType(), default=None,
+              help="List the windows and alerts until this timestamp or UTC date")
+@click.option("--top", type=int, default=TOP_SECTIONS, help="The number of top sections to list")
+def query(store_path, from_timestamp, to_timestamp, top):
+    """Lists the alerts and the top sections of a time range kept by --store on STORE_PATH"""
+    store = get_store(store_path)
+    try:
+        alerts = store.query_alerts(from_timestamp, to_timestamp)
+        top_sections = store.query_top_sections(from_timestamp, to_timestamp, top)
+    except (OSError, ValueError) as error:
+        click.secho(f'Can not read the store: {error}', fg='red', err=True)
+        sys.exit(1)
 
+    click.secho('Alerts', fg='green')
+    for alert in alerts:
+        date = datetime.utcfromtimestamp(alert['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        click.echo(f"{date}  {alert['name']}  {alert['state']}  {alert['value']:.2f}")
 
+    click.secho('Top sections', fg='green')
+    for section, hits in top_sections:
+        click.echo(f'{section}  {hits}')
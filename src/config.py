@@ -18,5 +18,122 @@ SCREEN_INTERVAL = 3
 # The top sections to show during each screen interval
 TOP_SECTIONS = 5
 
+# The top remote hosts to show during each screen interval (only with TOP_K_ENGINE = 'space_saving')
+TOP_HOSTS = 5
+
+# The max frames per second drawn on the screen
+SCREEN_FPS = 4
+
+# The windows waiting to be shown, when the queue is full the oldest window is dropped
+SCREEN_QUEUE_SIZE = 10
+
+# The alarms waiting for their window to be shown, when the queue is full the oldest alarm is dropped
+SCREEN_ALARMS_QUEUE_SIZE = 100
+
+# The seconds the screen waits for new data before drawing again while there are no requests
+SCREEN_IDLE_INTERVAL = 0.5
+
 # The log order is not guaranteed, increase in scenarios of high workload
 LOG_DELAY = 5
+
+# The engine used to keep the ALERT_INTERVAL window, 'ring' keeps per second counters (fixed memory)
+# and 'heap' keeps every timestamp in a MIN HEAP
+ALERT_WINDOW_ENGINE = 'ring'
+
+# The engine used to find the top sections, 'exact' counts every section of the window and 'space_saving'
+# keeps fixed size sketches of the sections and remote hosts (for many distinct sections or hosts)
+TOP_K_ENGINE = 'exact'
+
+# With 'space_saving' the counts are at most TOP_K_ERROR_RATE * hits of the window higher than the real ones,
+# each sketch keeps 1 / TOP_K_ERROR_RATE keys
+TOP_K_ERROR_RATE = 0.001
+
+# The relative error of the p50, p95 and p99 response bytes of each section (DDSketch)
+BYTES_SKETCH_ACCURACY = 0.01
+
+# The max buckets of each response bytes sketch, the lowest buckets are collapsed above it
+BYTES_SKETCH_MAX_BUCKETS = 2048
+
+# How the stats windows are closed, 'arrival' closes a window when a request is DISPLAY_INTERVAL + LOG_DELAY
+# seconds newer than its first second and 'watermark' closes the aligned windows of DISPLAY_INTERVAL seconds
+# once the newest timestamp - LOG_DELAY passes their end (the later requests of a closed window are dropped)
+WINDOW_EMISSION = 'arrival'
+
+# With 'watermark' and --follow, the seconds without new lines before the watermark moves with the wall clock
+WATERMARK_IDLE_TIMEOUT = 5
+
+# The (seconds by bucket, buckets) of each resolution of the traffic history, by default 1 second for an hour,
+# 1 minute for a day and 1 hour for 30 days
+ROLLUP_RESOLUTIONS = [(1, 3600), (60, 1440), (3600, 720)]
+
+# The top sections kept on each bucket of the traffic history
+ROLLUP_TOP_SECTIONS = 10
+
+# READ SETTINGS
+# The bytes read from the log file on each read
+READ_CHUNK_SIZE = 1024 * 1024
+
+# With --follow the seconds to wait for new lines when inotify is not available,
+# it starts on the min value and doubles while there is no new data
+FOLLOW_MIN_POLL = 0.05
+FOLLOW_MAX_POLL = 1
+
+# The batches of lines decompressed ahead while the agent parses a compressed file (gzip, bz2 or xz)
+DECOMPRESS_QUEUE_SIZE = 8
+
+# The max number of distinct request paths whose section is cached while parsing
+SECTION_CACHE_SIZE = 100000
+
+# The bytes read on each chunk by the batch engine (--batch)
+BATCH_CHUNK_SIZE = 8 * 1024 * 1024
+
+# The bytes of the longest request or status column parsed with the vectorized operations of the batch engine,
+# the longer columns are decoded one by one
+BATCH_MAX_FIELD_WIDTH = 256
+
+# The bytes of each range of the file parsed by a process of the pool (--workers)
+PARALLEL_CHUNK_SIZE = 16 * 1024 * 1024
+
+# The runs (hits of consecutive lines with the same timestamp) returned on each batch by the mmap reader (--mmap)
+MMAP_RUNS_BATCH = 10000
+
+# SYSLOG SETTINGS
+# The default ports of log-monitor listen (access log lines as syslog messages over UDP and TCP)
+SYSLOG_UDP_PORT = 5140
+SYSLOG_TCP_PORT = 5140
+
+# The lines of each batch received by the syslog reader, a smaller batch is sent after SYSLOG_FLUSH_INTERVAL seconds
+SYSLOG_BATCH_SIZE = 1000
+SYSLOG_FLUSH_INTERVAL = 0.05
+
+# The batches waiting for the agent, when the queue is full the TCP senders are slowed down and the UDP lines dropped
+SYSLOG_QUEUE_SIZE = 64
+
+# STORE SETTINGS
+# The windows and alerts written on each batch of the store (--store), a smaller batch is written
+# after STORE_FLUSH_INTERVAL seconds
+STORE_BATCH_SIZE = 1000
+STORE_FLUSH_INTERVAL = 1
+
+# With a .jsonl store the file is rotated above STORE_JSONL_MAX_BYTES keeping STORE_JSONL_BACKUPS old files
+STORE_JSONL_MAX_BYTES = 64 * 1024 * 1024
+STORE_JSONL_BACKUPS = 5
+
+# METRICS SETTINGS
+# The seconds between each write of the metrics file (--metrics-file)
+METRICS_INTERVAL = 5
+
+# CHECKPOINT SETTINGS
+# The seconds between each save of the checkpoint (--checkpoint)
+CHECKPOINT_INTERVAL = 5
+
+# INDEX SETTINGS
+# The lines between each entry of the timestamp index (log-monitor index)
+INDEX_EVERY_LINES = 1000
+
+# MULTI FILE SETTINGS
+# The batches of lines read ahead from each file while they are merged
+MERGE_QUEUE_SIZE = 4
+
+# The lines of each batch of the merged stream
+MERGE_BATCH_SIZE = 10000
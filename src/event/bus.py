@@ -0,0 +1,119 @@
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+import traceback
+
+
+class QueuedSubscriber:
+    """
+    Delivers the events to a subscriber from a bounded queue in its own thread,
+    so a slow subscriber doesn't stall the thread publishing the events
+
+    When the queue is full the overflow policy is applied:
+        - block -> the publisher waits until there is space in the queue
+        - drop_oldest -> the oldest queued event is discarded
+        - coalesce -> the newest queued event is replaced by the new one
+
+    Once it is closed the new events are dropped (a publisher blocked on a full queue stops waiting)
+    """
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'coalesce')
+
+    def __init__(self, function: Callable, queue_size: int, overflow: str = 'block'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy {overflow}')
+
+        self.function = function
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = deque([])
+        self._condition = threading.Condition()
+        self._closed = False
+        self._delivery_thread = threading.Thread(target=self._deliver, daemon=True)
+        self._delivery_thread.start()
+
+    def __call__(self, event):
+        with self._condition:
+            if self._closed:
+                self.dropped += 1
+                return
+
+            if len(self._queue) >= self.queue_size:
+                if self.overflow == 'block':
+                    self._condition.wait_for(lambda: len(self._queue) < self.queue_size or self._closed)
+                    if self._closed:
+                        self.dropped += 1
+                        return
+                elif self.overflow == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self._queue.pop()
+                    self.dropped += 1
+
+            self._queue.append(event)
+            self._condition.notify_all()
+
+    def close(self, timeout: float = None):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._delivery_thread.join(timeout)
+
+    def _deliver(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                event = self._queue.popleft()
+                self._condition.notify_all()
+
+            try:
+                self.function(event)
+            except Exception:
+                traceback.print_exc()
+
+
+class EventBus:
+    """
+    Event dispatcher scoped to an instance (each Agent has its own), the subscribers
+    are registered by event type so each event goes directly to its subscribers
+
+    A subscriber can be registered with a queue_size to receive the events
+    from a bounded queue in its own thread (see QueuedSubscriber)
+
+    dispatched keeps the events dispatched to each subscriber by its id (its name and the order it was
+    subscribed, e.g. `print_stats#1`), so two subscribers with the same name are counted apart
+
+    on_publish is called with each event after its subscribers, it is not a subscriber (e.g. to
+    measure the latency of the events without counting it as a dispatch)
+    """
+    def __init__(self):
+        self._subscribers: Dict[type, List[Tuple[Callable, str]]] = {}
+        self.dispatched: Dict[str, int] = {}
+        self.on_publish: Optional[Callable] = None
+
+    def subscribe(self, event_type: type, function: Callable, queue_size: int = 0, overflow: str = 'block') -> Callable:
+        subscriber = QueuedSubscriber(function, queue_size, overflow) if queue_size else function
+        name = getattr(function, '__qualname__', type(function).__name__)
+        subscriber_id = f'{name}#{len(self.dispatched) + 1}'
+        self._subscribers.setdefault(event_type, []).append((subscriber, subscriber_id))
+        self.dispatched[subscriber_id] = 0
+        return subscriber
+
+    def publish(self, event):
+        for subscriber, subscriber_id in self._subscribers.get(type(event), ()):
+            subscriber(event)
+            self.dispatched[subscriber_id] += 1
+        if self.on_publish:
+            self.on_publish(event)
+
+    def close(self):
+        """
+        Waits until the queued subscribers received all their events
+        """
+        for subscribers in self._subscribers.values():
+            for subscriber, _ in subscribers:
+                if isinstance(subscriber, QueuedSubscriber):
+                    subscriber.close()
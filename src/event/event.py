@@ -1,3 +1,6 @@
+from datetime import datetime
+
+
 class NewRequestsEvent:
     def __init__(self, requests):
         self.requests = requests
@@ -10,4 +13,41 @@ class StateChangeEvent:
         self.timestamp = timestamp
 
 
+class RuleStateChangeEvent:
+    def __init__(self, rule_name: str, rule_state, value: float, timestamp: int):
+        self.rule_name = rule_name
+        self.rule_state = rule_state
+        self.value = value
+        self.timestamp = timestamp
+
+
+class StatsEvent:
+    def __init__(self, from_timestamp: int, to_timestamp: int, total_hits: int, top_sections, hits_by_status,
+                 top_hosts=None, alert_top_sections=None, alert_top_hosts=None, late_records=None):
+        self.from_timestamp = from_timestamp
+        self.to_timestamp = to_timestamp
+        self.total_hits = total_hits
+        self.top_sections = top_sections
+        self.hits_by_status = hits_by_status
+        self.top_hosts = top_hosts or []
+        self.alert_top_sections = alert_top_sections or []
+        self.alert_top_hosts = alert_top_hosts or []
+        self.late_records = late_records
+
+    @property
+    def from_date(self):
+        return datetime.utcfromtimestamp(self.from_timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+    @property
+    def to_date(self):
+        return datetime.utcfromtimestamp(self.to_timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
 
+class SourceStatsEvent(StatsEvent):
+    """
+    The StatsEvent of a single log file when many files are merged
+    """
+    def __init__(self, source: str, from_timestamp: int, to_timestamp: int, total_hits: int, top_sections,
+                 hits_by_status, **top):
+        super().__init__(from_timestamp, to_timestamp, total_hits, top_sections, hits_by_status, **top)
+        self.source = source
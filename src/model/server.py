@@ -1,27 +1,75 @@
 from src.state_machine.state import ServerState
 from src.event.event import StateChangeEvent
+from src.event.bus import EventBus
+from src.config import SECTION_CACHE_SIZE
 from datetime import datetime
-import zope.event
+import sys
+
+_sections = {}
+
+
+def get_section(request: str) -> str:
+    """
+    Returns the section of a request column ("GET /api/user HTTP/1.0" -> api),
+    the sections of the recurring requests are cached (up to SECTION_CACHE_SIZE requests)
+    and interned so all the requests share the same string
+    """
+    section = _sections.get(request)
+    if section is None:
+        section = sys.intern(request.split(' ')[1].split('/')[1])
+        if len(_sections) < SECTION_CACHE_SIZE:
+            _sections[request] = section
+    return section
 
 
 class Request:
+    __slots__ = ('_remotehost', '_rfc931', '_authuser', 'timestamp', '_request', 'status', '_bytes', 'section')
+
     def __init__(self, request_line: str):
-        self._remotehost, self._rfc931, self._authuser, self.timestamp,\
-            self._request, self.status, self._bytes = request_line.split(',')
-        self.timestamp = int(self.timestamp)
-        self.section = self._request.split(' ')[1].split('/')[1]
-        self.date = datetime.utcfromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        self._remotehost, self._rfc931, self._authuser, timestamp,\
+            self._request, status, self._bytes = request_line.split(',')
+        self.timestamp = int(timestamp)
+        self.status = sys.intern(status)
+        self.section = get_section(self._request)
+
+    @property
+    def remotehost(self) -> str:
+        return self._remotehost.strip('"')
+
+    @property
+    def bytes(self) -> int:
+        """
+        The size of the response, 0 when it is unknown (-)
+        """
+        try:
+            return int(self._bytes)
+        except ValueError:
+            return 0
+
+    @property
+    def date(self):
+        return datetime.utcfromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
     def __lt__(self, other):
         return self.timestamp < other.timestamp
 
 
 class Observable:
-    def add_subscriber(self, function):
-        zope.event.subscribers.append(function)
+    _event_bus = None
+
+    def get_event_bus(self) -> EventBus:
+        if self._event_bus is None:
+            self._event_bus = EventBus()
+        return self._event_bus
+
+    def set_event_bus(self, event_bus: EventBus):
+        self._event_bus = event_bus
+
+    def add_subscriber(self, event_type: type, function, queue_size: int = 0, overflow: str = 'block'):
+        self.get_event_bus().subscribe(event_type, function, queue_size, overflow)
 
     def notify(self, event):
-        zope.event.notify(event)
+        self.get_event_bus().publish(event)
 
 
 class ServerStateMachine(Observable):
@@ -35,6 +83,12 @@ class ServerStateMachine(Observable):
     def get_server_state(self):
         return self._server_state
 
+    def get_state(self) -> dict:
+        return {'server_state': self._server_state.name}
+
+    def set_state(self, state: dict):
+        self._server_state = ServerState[state['server_state']]
+
     def _validate_events(self, new_state, average_hits, unix_timestamp):
         if self._is_state_change_to_high_traffic(new_state):
             self._trigger_on_high_traffic_event(average_hits, unix_timestamp)
@@ -0,0 +1,56 @@
+from src.utils.sketch import DDSketch
+from typing import Dict, Optional
+
+
+class SectionTrafficStats:
+    """
+    The hits by status of a section on a window
+
+    - response_bytes is the DDSketch of the response sizes (None when the bytes are unknown,
+    e.g. the runs of the batch readers or the sections of the space_saving engine)
+    - The hits are grouped by status class (2xx, 3xx, 4xx and 5xx) from the hits by status
+    """
+    STATUS_CLASSES = ('2xx', '3xx', '4xx', '5xx')
+
+    def __init__(self, section: str):
+        self.hits_by_status = {}
+        self.section = section
+        self.total_hits = 0
+        self.error = 0
+        self.response_bytes: Optional[DDSketch] = None
+
+    def get_percentage_by_status(self, status):
+        status = str(status)
+        if status not in self.hits_by_status:
+            return 0
+        total = (self.hits_by_status[status] / self.total_hits) * 100
+        return f"{total:.2f}%"
+
+    def get_hits_by_class(self) -> Dict[str, int]:
+        hits_by_class = {status_class: 0 for status_class in self.STATUS_CLASSES}
+        for status, hits in self.hits_by_status.items():
+            status_class = f'{status[:1]}xx'
+            hits_by_class[status_class] = hits_by_class.get(status_class, 0) + hits
+        return hits_by_class
+
+    def get_percentage_by_class(self, status_class: str):
+        hits = self.get_hits_by_class().get(status_class, 0)
+        if not hits:
+            return 0
+        return f"{hits / self.total_hits * 100:.2f}%"
+
+    def get_bytes_quantile(self, q: float) -> Optional[float]:
+        return self.response_bytes.quantile(q) if self.response_bytes else None
+
+    def get_bytes_per_second(self, seconds: int) -> Optional[float]:
+        return self.response_bytes.sum / seconds if self.response_bytes else None
+
+    def add_hits(self, hits_by_status: Dict[str, int]):
+        for status, hits in hits_by_status.items():
+            self.hits_by_status[status] = self.hits_by_status.get(status, 0) + hits
+            self.total_hits += hits
+
+    def __lt__(self, other):
+        if self.total_hits == other.total_hits:
+            return self.section < other.section
+        return self.total_hits > other.total_hits
@@ -1,63 +1,426 @@
 from src.model.server import Request, ServerStateMachine
-from src.config import ALERT_INTERVAL, DISPLAY_INTERVAL, LOG_DELAY, CSV_COLUMNS
-from src.utils.utils import TTLIntervalCache, TTLRequestCache
+from src.event.event import NewRequestsEvent, RuleStateChangeEvent, SourceStatsEvent, StateChangeEvent, StatsEvent
+from src.config import ALERT_INTERVAL, DISPLAY_INTERVAL, LOG_DELAY, CSV_COLUMNS, ALERT_WINDOW_ENGINE, TOP_K_ENGINE, \
+    WINDOW_EMISSION
+from src.utils.utils import TTLIntervalCache, TTLBucketIntervalCache, TTLRequestCache
+from src.service.aggregator import StatsAggregator, SketchStatsAggregator, WatermarkStatsAggregator
+from src.service.compressed import CompressedReader, READ_ERRORS, get_log_reader
+from src.service.batch import BatchReader
+from src.service.parallel import ParallelReader
+from src.service.mmap_reader import MmapReader
+from src.service.merge import MergedReader
+from src.service.metrics import Metrics
+from src.service.checkpoint import Checkpoint
+from src.service.index import TimestampIndex
+from src.service.rollup import RollupStore
+from src.service.rules import AlertRule, RuleEngine
+from src.service.syslog import SyslogReader
+from src.utils.clock import Clock
+from typing import List, Optional, Tuple, Union
+import os
 import threading
+import time
 
 
 class Agent:
     """
     The Agent will receive a filepath and a server_state_machine as parameters
     The run method should be called  to start the agent, it will read the file and stop when reach the last line,
+    join waits until the agent finished reading (it returns False when the timeout expires before),
+    done is set once the input is read and the last windows are closed,
+    with follow it will keep waiting for new lines (see LogTail) until stop is called,
     Subscribers can listen the following events:
         - add_data_subscriber -> it will notify with a NewRequestsEvent
+        - add_stats_subscriber -> it will notify with a StatsEvent
         - add_state_change_subscriber -> it will notify with a StateChangeEvent
 
+    The events are published on the event bus of the server_state_machine, a subscriber can
+    pass a queue_size to receive them in its own thread from a bounded queue with an overflow
+    policy (block, drop_oldest or coalesce) so a slow subscriber doesn't stall the agent
+
     The agent will use a MIN HEAP data structure to handle the alarm intervals and requests
-    please take a look to the TTLIntervalCache and TTLRequestCache classes respectively
+    please take a look to the TTLIntervalCache and TTLRequestCache classes respectively,
+    the alarm interval can also use per second counters (TTLBucketIntervalCache) setting ALERT_WINDOW_ENGINE
+
+    The section stats are updated on each request by the StatsAggregator, the requests are only kept
+    in the TTLRequestCache when there is a data subscriber, with TOP_K_ENGINE = 'space_saving' the
+    top sections and remote hosts are kept in fixed size sketches (see SketchStatsAggregator), the open
+    windows are closed at the end of the input, and with window_emission = 'watermark' (WINDOW_EMISSION by
+    default) the windows are closed by a watermark, also while the files have no new lines
+    (see WatermarkStatsAggregator)
+
+    With batch the file is parsed in chunks by the BatchReader (numpy) and the caches are updated
+    with runs of hits, it raises the same StatsEvent and StateChangeEvent but no NewRequestsEvent,
+    with workers the runs are parsed by a pool of processes (see ParallelReader) and with use_mmap
+    the file is memory mapped and scanned in place (see MmapReader)
+
+    With a list of files they are read concurrently and merged in a single stream ordered by timestamp
+    (see MergedReader), the alarms and stats are computed over all the files and with per_source_stats
+    there is a StatsAggregator for each file too (add_source_stats_subscriber -> SourceStatsEvent)
+
+    With rules the RuleEngine evaluates them over a per second histogram shared by all the rules
+    (add_rule_state_change_subscriber -> RuleStateChangeEvent)
+
+    The rollups (RollupStore) keep the history of the traffic at many resolutions, for the screen and the report
+
+    With a clock (ReplayClock) each request waits for its timestamp on the virtual clock, so the log is
+    replayed at the speed of the clock instead of as fast as possible
+
+    With a time_range (from_timestamp, to_timestamp) only the lines of the range are read, the offsets of
+    the range are found on the TimestampIndex of the file (updated with the lines appended since the last time)
+
+    Compressed files (gzip, bz2 or xz) are decompressed by a background thread (see CompressedReader)
+
+    An error reading the input (e.g. a truncated archive) stops the agent and it is kept on error,
+    the caller checks it after join
+
+    With a reader the lines come from it instead of the file (e.g. a SyslogReader receiving them over
+    UDP and TCP), file_path only names the source, the reader has the batches() and stop() of the LogTail
+
+    With a checkpoint the agent saves periodically the line offset of the file and the state of the windows
+    and the state machine, and a new agent with the same checkpoint continues from there (see Checkpoint),
+    it is only available reading a single file line by line
+
+    With metrics the agent registers its counters and gauges on the Metrics registry (they are read
+    only when the metrics are exported) and times the read and the processing of each batch
     """
+    INTERVAL_CACHES = {
+        'heap': TTLIntervalCache,
+        'ring': TTLBucketIntervalCache,
+    }
+    STATS_AGGREGATORS = {
+        'exact': StatsAggregator,
+        'space_saving': SketchStatsAggregator,
+    }
+    WINDOW_EMISSIONS = ('arrival', 'watermark')
 
-    def __init__(self, file_path: str, server_state_machine: ServerStateMachine):
+    def __init__(self, file_path: Union[str, List[str]], server_state_machine: ServerStateMachine,
+                 follow: bool = False, batch: bool = False, workers: int = 0, use_mmap: bool = False,
+                 metrics: Metrics = None, per_source_stats: bool = False, checkpoint: Checkpoint = None,
+                 time_range: Tuple[Optional[int], Optional[int]] = None, rules: List[AlertRule] = None,
+                 reader: SyslogReader = None, clock: Clock = None, window_emission: str = None):
         self.server_state_machine = server_state_machine
-        self._interval_cache = TTLIntervalCache(ALERT_INTERVAL, LOG_DELAY, self.server_state_machine)
+        self.event_bus = server_state_machine.get_event_bus()
+        interval_cache_class = self.INTERVAL_CACHES[ALERT_WINDOW_ENGINE]
+        self._interval_cache = interval_cache_class(ALERT_INTERVAL, LOG_DELAY, self.server_state_machine)
         self.requests = TTLRequestCache(DISPLAY_INTERVAL, LOG_DELAY)
+        window_emission = window_emission or WINDOW_EMISSION
+        if window_emission not in self.WINDOW_EMISSIONS:
+            raise ValueError(f'Unknown window emission {window_emission}')
+        stats_aggregator_class = self.STATS_AGGREGATORS[TOP_K_ENGINE]
+        if window_emission == 'watermark' and TOP_K_ENGINE != 'exact':
+            raise ValueError('The watermark windows count the sections exactly, they can not be used with '
+                             f'TOP_K_ENGINE = {TOP_K_ENGINE!r}')
+        if window_emission == 'watermark':
+            stats_aggregator_class = WatermarkStatsAggregator
+        self.stats = stats_aggregator_class(DISPLAY_INTERVAL, LOG_DELAY)
+        self.requests.set_event_bus(self.event_bus)
+        self.stats.set_event_bus(self.event_bus)
+        self._has_data_subscribers = False
+        self.rollups = RollupStore(log_delay=LOG_DELAY)
+        self.rule_engine = RuleEngine(rules, LOG_DELAY) if rules else None
+        if self.rule_engine:
+            self.rule_engine.set_event_bus(self.event_bus)
 
-        self._file_path = file_path
+        self._file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        self._file_path = self._file_paths[0]
+        self._merged_reader = None
+        if len(self._file_paths) > 1 and not reader:
+            self._merged_reader = MergedReader(self._file_paths, follow=follow,
+                                               idle_batches=window_emission == 'watermark')
+        self.source_stats = []
+        if per_source_stats:
+            self.source_stats = [stats_aggregator_class(DISPLAY_INTERVAL, LOG_DELAY, source=source_file)
+                                 for source_file in self._file_paths]
+            for source_stats in self.source_stats:
+                source_stats.set_event_bus(self.event_bus)
+        self._batch = batch
+        self._workers = workers
+        self._use_mmap = use_mmap
+        self._runs_reader = None
+        self.total_requests = 0
+        self.total_lines = 0
+        self.rejected_lines = 0
+        self.error: Optional[Exception] = None
         self._alert_message = ''
         self._agent_thread = threading.Thread(target=self._read_file)
+        self.done = threading.Event()
+        self.clock = clock
         self._high_traffic_recovered = True
 
+        self._checkpoint = checkpoint
+        self._time_range = time_range
+        start_offset, end_offset = 0, None
+        if sum(bool(engine) for engine in (batch, workers, use_mmap)) > 1:
+            raise ValueError('Only one of batch, workers and use_mmap can be used')
+        if reader and (len(self._file_paths) > 1 or batch or workers or use_mmap or checkpoint or time_range):
+            raise ValueError('A reader can only be read line by line without a checkpoint or a time range')
+        if checkpoint or time_range:
+            if len(self._file_paths) > 1 or batch or workers or use_mmap or (follow and time_range) or \
+                    CompressedReader.is_compressed(self._file_path):
+                raise ValueError('A checkpoint or a time range can only be used reading a single plain file '
+                                 'line by line')
+        if checkpoint:
+            start_offset = self._restore(checkpoint.load())
+        if time_range:
+            start_offset, end_offset = self._get_range_offsets(start_offset)
+        self._log_tail = reader or get_log_reader(self._file_path, follow=follow, start_offset=start_offset,
+                                                  end_offset=end_offset, idle_batches=window_emission == 'watermark')
+
+        self.metrics = metrics
+        self._last_read_time = time.monotonic()
+        if metrics:
+            self._register_metrics(metrics)
+
     def run(self):
         self._agent_thread.start()
 
-    def add_data_subscriber(self, function):
-        self.requests.add_subscriber(function)
+    def join(self, timeout: float = None) -> bool:
+        self._agent_thread.join(timeout)
+        if self._agent_thread.is_alive():
+            return False
+
+        self.event_bus.close()
+        return True
+
+    def stop(self):
+        self._log_tail.stop()
+        if self._merged_reader:
+            self._merged_reader.stop()
+
+    def add_data_subscriber(self, function, queue_size: int = 0, overflow: str = 'block'):
+        self._has_data_subscribers = True
+        self.requests.add_subscriber(NewRequestsEvent, function, queue_size, overflow)
+
+    def add_stats_subscriber(self, function, queue_size: int = 0, overflow: str = 'block'):
+        self.stats.add_subscriber(StatsEvent, function, queue_size, overflow)
+
+    def add_state_change_subscriber(self, function, queue_size: int = 0, overflow: str = 'block'):
+        self.server_state_machine.add_subscriber(StateChangeEvent, function, queue_size, overflow)
+
+    def add_source_stats_subscriber(self, function, queue_size: int = 0, overflow: str = 'block'):
+        self.event_bus.subscribe(SourceStatsEvent, function, queue_size, overflow)
+
+    def add_rule_state_change_subscriber(self, function, queue_size: int = 0, overflow: str = 'block'):
+        self.event_bus.subscribe(RuleStateChangeEvent, function, queue_size, overflow)
+
+    def _register_metrics(self, metrics: Metrics):
+        metrics.register('log_monitor_lines_read_total', lambda: self.total_lines, 'counter',
+                         'Lines read from the log file')
+        metrics.register('log_monitor_lines_rejected_total', lambda: self.rejected_lines, 'counter',
+                         'Lines that are not a valid request')
+        metrics.register('log_monitor_requests_total', lambda: self.total_requests, 'counter',
+                         'Requests processed')
+        metrics.register('log_monitor_request_cache_depth', lambda: len(self.requests), 'gauge',
+                         'Requests kept in the TTLRequestCache heap')
+        metrics.register('log_monitor_stats_seconds_depth', lambda: len(self.stats), 'gauge',
+                         'Seconds kept by the StatsAggregator')
+        metrics.register('log_monitor_late_records_total', lambda: self.stats.late_records, 'counter',
+                         'Requests dropped because their stats window was already closed')
+        metrics.register('log_monitor_delay_queue_depth', lambda: self._interval_cache.delay_queue_depth, 'gauge',
+                         'Entries waiting in the delay queue of the alert window')
+        metrics.register('log_monitor_delay_queue_flushes_total', lambda: self._interval_cache.delay_queue_flushes,
+                         'counter', 'Flushes of the delay queue of the alert window')
+        metrics.register('log_monitor_events_dispatched_total', lambda: dict(self.event_bus.dispatched), 'counter',
+                         'Events dispatched to each subscriber', label='subscriber')
+
+        if isinstance(self._log_tail, SyslogReader):
+            metrics.register('log_monitor_syslog_lines_received_total', lambda: self._log_tail.received_lines,
+                             'counter', 'Lines received over UDP and TCP')
+            metrics.register('log_monitor_syslog_lines_dropped_total', lambda: self._log_tail.dropped_lines,
+                             'counter', 'UDP lines dropped while the agent was overloaded')
 
-    def add_state_change_subscriber(self, function):
-        self.server_state_machine.add_subscriber(function)
+        self._read_seconds = metrics.histogram('log_monitor_batch_read_seconds', 'Seconds reading each batch')
+        self._process_seconds = metrics.histogram('log_monitor_batch_process_seconds',
+                                                  'Seconds parsing and processing each batch')
+        self._notify_latency = metrics.histogram('log_monitor_notify_latency_seconds',
+                                                 'Seconds from the read of a batch to the notification of its events')
+        self.event_bus.on_publish = self._observe_notify_latency
+
+    def _observe_notify_latency(self, event):
+        if isinstance(event, (StatsEvent, StateChangeEvent)):
+            self._notify_latency.observe(time.monotonic() - self._last_read_time)
 
     def _read_file(self):
-        with open(self._file_path, "r") as log_file:
-            log_lines = self._follow(log_file)
-            header = next(log_lines)
+        try:
+            self._read_input()
+        except READ_ERRORS as error:
+            self.error = error
+        finally:
+            self.done.set()
+
+    def _read_input(self):
+        self._runs_reader = self._get_runs_reader()
+        if self._runs_reader:
+            self._consume(self._runs_reader.runs(), self._process_runs)
+        elif self._merged_reader:
+            self._consume(self._merged_reader.batches(), self._process_merged_lines)
+        else:
+            self._consume(self._log_tail.batches(), self._process_lines)
+            if self._checkpoint:
+                self._save_checkpoint()
+
+        self._flush()
+
+    def _flush(self):
+        """
+        Closes the open windows at the end of the input, with a checkpoint the open stats window (when the
+        aggregator can keep it) and the open seconds of the rules are kept on it instead, they are closed
+        after the restart
+        """
+        if not self._checkpoint or not self.stats.keeps_window_state:
+            self.stats.flush()
+        for source_stats in self.source_stats:
+            source_stats.flush()
+        self.rollups.flush()
+        if self.rule_engine and not self._checkpoint:
+            self.rule_engine.flush()
+
+    def _get_range_offsets(self, start_offset: int) -> Tuple[int, Optional[int]]:
+        """
+        Updates the TimestampIndex of the file and returns the offsets of the time range
+        """
+        index = TimestampIndex(self._file_path)
+        index.update()
+        range_start_offset, end_offset = index.get_offsets(*self._time_range)
+        return max(start_offset, range_start_offset), end_offset
+
+    def _restore(self, state) -> int:
+        """
+        Restores the state of a checkpoint of the same file and returns the offset to continue reading
+        """
+        if not state or state['file']['path'] != os.path.abspath(self._file_path):
+            return 0
 
-            for log_line in log_lines:
-                self._process_request(log_line)
+        self.total_requests = state['total_requests']
+        self.total_lines = state.get('total_lines', 0)
+        self.rejected_lines = state.get('rejected_lines', 0)
+        self.server_state_machine.set_state(state['server'])
+        self._interval_cache.set_state(state['alert_window'])
+        self.stats.set_state(state['stats'])
+        if 'rollups' in state:
+            self.rollups.set_state(state['rollups'])
+        if self.rule_engine and state.get('rules'):
+            self.rule_engine.set_state(state['rules'])
+        return Checkpoint.get_resume_offset(state, self._file_path)
 
-    def _follow(self, log_file):
+    def _save_checkpoint(self):
+        self._checkpoint.save({
+            'file': {'path': os.path.abspath(self._file_path), 'offset': self._log_tail.line_offset,
+                     **self._log_tail.get_fingerprint()},
+            'total_requests': self.total_requests,
+            'total_lines': self.total_lines,
+            'rejected_lines': self.rejected_lines,
+            'server': self.server_state_machine.get_state(),
+            'alert_window': self._interval_cache.get_state(),
+            'stats': self.stats.get_state(),
+            'rollups': self.rollups.get_state(),
+            'rules': self.rule_engine.get_state() if self.rule_engine else None,
+        })
+
+    def _consume(self, batches, process):
+        if not self.metrics:
+            for batch in batches:
+                process(batch)
+            return
+
+        batches = iter(batches)
         while True:
-            line = log_file.readline()
-            if not line:
-                # end of file, we can set continue instead of break if we want to wait for new lines in real time
-                break
-            yield line
+            start = time.monotonic()
+            batch = next(batches, None)
+            if batch is None:
+                return
+            self._last_read_time = time.monotonic()
+            self._read_seconds.observe(self._last_read_time - start)
+            process(batch)
+            self._process_seconds.observe(time.monotonic() - self._last_read_time)
 
-    def _process_request(self, log_line: str):
-        if not self._is_valid_line(log_line):
+    def _get_runs_reader(self):
+        if self._workers:
+            return ParallelReader(self._file_path, self._workers)
+        if self._batch:
+            return BatchReader(self._file_path)
+        if self._use_mmap:
+            return MmapReader(self._file_path)
+        return None
+
+    def _process_lines(self, log_lines):
+        if not log_lines:
+            # the LogTail is waiting for new lines
+            self._advance_idle(self.stats, *self.source_stats)
+            return
+
+        self.total_lines += len(log_lines)
+        for log_line in log_lines:
+            self._process_request(log_line)
+
+        if self._checkpoint and self._checkpoint.is_due():
+            self._save_checkpoint()
+
+    def _process_merged_lines(self, sourced_lines):
+        if not sourced_lines:
+            # every file is waiting for new lines
+            self._advance_idle(self.stats, *self.source_stats)
             return
 
-        request = Request(log_line)
-        self.requests.append(request)
+        self.total_lines += len(sourced_lines)
+        for source_index, log_line in sourced_lines:
+            request = self._process_request(log_line)
+            if request and self.source_stats:
+                self.source_stats[source_index].append(request)
+
+    @staticmethod
+    def _advance_idle(*stats_aggregators):
+        now = time.monotonic()
+        for stats in stats_aggregators:
+            stats.advance_idle(now)
+
+    def _process_runs(self, runs):
+        for unix_timestamp, hits, hits_by_section in runs:
+            if self.clock:
+                self.clock.wait_until(unix_timestamp)
+            self.total_requests += hits
+            self.stats.append_run(unix_timestamp, hits, hits_by_section)
+            self._interval_cache.append_run(unix_timestamp, hits)
+            self.rollups.append_run(unix_timestamp, hits_by_section)
+            if self.rule_engine:
+                self.rule_engine.append_run(unix_timestamp, hits_by_section)
+
+        if self._runs_reader:
+            # the runs only have the valid lines, the readers count the lines read and skipped
+            self.total_lines = self._runs_reader.total_lines
+            self.rejected_lines = self._runs_reader.rejected_lines
+
+    def _process_request(self, log_line: str) -> Optional[Request]:
+        if not self._is_valid_line(log_line):
+            self.rejected_lines += 1
+            return None
+
+        try:
+            request = Request(log_line)
+        except (ValueError, IndexError):
+            self.rejected_lines += 1
+            return None
+
+        if self._time_range and not self._is_in_time_range(request.timestamp):
+            return None
+        if self.clock:
+            self.clock.wait_until(request.timestamp)
+
+        self.total_requests += 1
+        if self._has_data_subscribers:
+            self.requests.append(request)
+        self.stats.append(request)
         self._interval_cache.append(request.timestamp)
+        self.rollups.append(request.timestamp, request.section, request.status)
+        if self.rule_engine:
+            self.rule_engine.append(request.timestamp, request.section, request.status)
+        return request
+
+    def _is_in_time_range(self, unix_timestamp: int) -> bool:
+        from_timestamp, to_timestamp = self._time_range
+        return (from_timestamp is None or unix_timestamp >= from_timestamp) and \
+            (to_timestamp is None or unix_timestamp <= to_timestamp)
 
     def _is_valid_line(self, log_line: str):
         return True if len(log_line.split(',')) == CSV_COLUMNS else False
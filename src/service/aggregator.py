@@ -0,0 +1,369 @@
+from src.config import TOP_SECTIONS, TOP_HOSTS, TOP_K_ERROR_RATE, ALERT_INTERVAL, WATERMARK_IDLE_TIMEOUT, \
+    BYTES_SKETCH_ACCURACY, BYTES_SKETCH_MAX_BUCKETS
+from src.event.event import SourceStatsEvent, StatsEvent
+from src.model.server import Observable, Request
+from src.model.stats import SectionTrafficStats
+from src.utils.sketch import DDSketch, SpaceSaving, merge_sketches
+from collections import deque
+from typing import Dict, List, Tuple
+import heapq
+import math
+
+
+class StatsAggregator(Observable):
+    """
+    This class will update the section stats as each request arrives
+    instead of keeping the requests until the DISPLAY_INTERVAL is over
+
+    - We'll keep one bucket per second with the hits by section and status
+    and a MIN HEAP of the seconds so the root will be always the oldest second,
+    the memory depends on the seconds and sections and not on the number of requests
+
+    The window is closed with the same rule of the TTLRequestCache, once a request
+    is higher than DISPLAY_INTERVAL + LOG_DELAY from the oldest second we'll merge
+    the buckets of the window and fire a StatsEvent with the top sections
+
+    append_run adds the hits of consecutive requests with the same timestamp,
+    the windows are the same as appending the requests one by one
+
+    Each second keeps the hits by section and response bytes too (a dict increment per request), when
+    the window is closed they are added to a DDSketch of each section so the top sections have their
+    p50, p95 and p99 response size and their bytes by second (the runs have no bytes, with append_run
+    the sections have no response_bytes)
+
+    With a source it fires a SourceStatsEvent (the stats of a single file of many merged files)
+
+    A window is only closed by a newer request, advance_idle does nothing here (see WatermarkStatsAggregator)
+    and flush closes the open windows at the end of the input, so the last seconds of a file are reported
+
+    keeps_window_state is False when get_state can not keep the open window for a checkpoint
+    """
+    late_records = 0
+    keeps_window_state = True
+
+    def __init__(self, ttl: int, log_delay: int, top_sections: int = TOP_SECTIONS, source: str = None):
+        self.ttl = ttl
+        self.log_delay = log_delay
+        self.top_sections = top_sections
+        self.source = source
+        self._seconds = {}
+        self._bytes = {}
+        self._heap = []
+
+    def append(self, request: Request):
+        self._resize(request.timestamp)
+        self._add(request.timestamp, request.section, request.status, 1, request.bytes)
+
+    def append_run(self, unix_timestamp: int, hits: int, hits_by_section: Dict[str, Dict[str, int]]):
+        while hits and not self._is_empty() and self._is_outside_interval(unix_timestamp):
+            self._trigger_stats_event()
+            hits -= 1
+
+        for section, section_hits in hits_by_section.items():
+            for status, status_hits in section_hits.items():
+                self._add(unix_timestamp, section, status, status_hits)
+
+    def advance_idle(self, now: float):
+        pass
+
+    def flush(self):
+        while not self._is_empty():
+            self._trigger_stats_event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def get_state(self) -> dict:
+        """
+        The buckets of the seconds of the open window for a checkpoint (without the response bytes)
+        """
+        return {'seconds': self._seconds}
+
+    def set_state(self, state: dict):
+        self._seconds = {int(second): bucket for second, bucket in state['seconds'].items()}
+        self._bytes = {}
+        self._heap = list(self._seconds)
+        heapq.heapify(self._heap)
+
+    def _add(self, unix_timestamp: int, section: str, status: str, hits: int = 1, response_bytes: int = None):
+        bucket = self._seconds.get(unix_timestamp)
+        if bucket is None:
+            bucket = self._seconds[unix_timestamp] = {}
+            heapq.heappush(self._heap, unix_timestamp)
+
+        hits_by_status = bucket.setdefault(section, {})
+        hits_by_status[status] = hits_by_status.get(status, 0) + hits
+
+        if response_bytes is not None:
+            bytes_by_section = self._bytes.get(unix_timestamp)
+            if bytes_by_section is None:
+                bytes_by_section = self._bytes[unix_timestamp] = {}
+            hits_by_bytes = bytes_by_section.get(section)
+            if hits_by_bytes is None:
+                hits_by_bytes = bytes_by_section[section] = {}
+            hits_by_bytes[response_bytes] = hits_by_bytes.get(response_bytes, 0) + hits
+
+    def _resize(self, unix_timestamp: int):
+        if self._is_empty():
+            return
+
+        if self._is_outside_interval(unix_timestamp):
+            self._trigger_stats_event()
+
+    def _is_outside_interval(self, unix_timestamp: int) -> bool:
+        return unix_timestamp - self._get_head() > (self.ttl + self.log_delay)
+
+    def _get_head(self):
+        return self._heap[0]
+
+    def _is_empty(self):
+        return len(self._heap) == 0
+
+    def _trigger_stats_event(self):
+        self.notify(self._get_stats())
+
+    def _get_stats(self) -> StatsEvent:
+        sections = {}
+        hits_by_status = {}
+        total_hits = 0
+        oldest, newest, buckets, bytes_buckets = self._pop_window()
+
+        for bucket in buckets:
+            for section, section_hits in bucket.items():
+                section_stats = sections.get(section)
+                if section_stats is None:
+                    section_stats = sections[section] = SectionTrafficStats(section)
+                section_stats.add_hits(section_hits)
+
+                for status, hits in section_hits.items():
+                    hits_by_status[status] = hits_by_status.get(status, 0) + hits
+                    total_hits += hits
+
+        sketches = {}
+        for bytes_by_section in bytes_buckets:
+            for section, hits_by_bytes in bytes_by_section.items():
+                sketch = sketches.get(section)
+                if sketch is None:
+                    sketch = sketches[section] = DDSketch(BYTES_SKETCH_ACCURACY, BYTES_SKETCH_MAX_BUCKETS)
+                for response_bytes, hits in hits_by_bytes.items():
+                    sketch.add(response_bytes, hits)
+        for section, sketch in sketches.items():
+            sections[section].response_bytes = sketch
+
+        top_sections = heapq.nsmallest(self.top_sections, sections.values())
+
+        return self._get_event(oldest, newest, total_hits, top_sections, hits_by_status)
+
+    def _pop_window(self) -> Tuple[int, int, list, list]:
+        """
+        Removes the seconds of the oldest window and returns its first and last seconds, their buckets
+        and their hits by response bytes of each section
+        """
+        buckets = []
+        bytes_buckets = []
+        oldest = self._get_head()
+        newest = oldest
+
+        while self._heap:
+            second = self._get_head()
+            if second > oldest + self.ttl - 1:
+                break
+
+            heapq.heappop(self._heap)
+            newest = second
+            buckets.append(self._seconds.pop(second))
+            if second in self._bytes:
+                bytes_buckets.append(self._bytes.pop(second))
+
+        return oldest, newest, buckets, bytes_buckets
+
+    def _get_event(self, oldest: int, newest: int, total_hits: int, top_sections, hits_by_status, **top) -> StatsEvent:
+        if self.source is not None:
+            return SourceStatsEvent(self.source, oldest, newest, total_hits, top_sections, hits_by_status, **top)
+        return StatsEvent(oldest, newest, total_hits, top_sections, hits_by_status, **top)
+
+
+class WatermarkStatsAggregator(StatsAggregator):
+    """
+    Event time version of the StatsAggregator, the windows are closed by a watermark instead of the next request
+
+    - The windows are aligned to ttl seconds ([0, ttl - 1], [ttl, 2 * ttl - 1], ...) and each window keeps
+    a single bucket with the hits by section and status (one bucket per window instead of one per second)
+    - watermark = newest timestamp - log_delay (the allowed lateness), every window that ends at or before
+    the watermark is closed and fires its StatsEvent
+    - A request of a window already closed is late, it is dropped and counted on late_records
+    (sent on each StatsEvent)
+    - advance_idle is called while there are no new lines, after idle_timeout seconds without requests
+    the event time is assumed to go on with the wall clock, so the watermark moves forward and the
+    last window is closed without new traffic
+    - flush closes every open window (at the end of the input)
+    """
+    def __init__(self, ttl: int, log_delay: int, top_sections: int = TOP_SECTIONS, source: str = None,
+                 idle_timeout: float = WATERMARK_IDLE_TIMEOUT):
+        super().__init__(ttl, log_delay, top_sections, source)
+        self.idle_timeout = idle_timeout
+        self.watermark = None
+        self.late_records = 0
+        self._newest = None
+        self._closed_until = None
+        self._idle_since = None
+
+    def append(self, request: Request):
+        unix_timestamp = request.timestamp
+        self._idle_since = None
+        if self._closed_until is not None and unix_timestamp < self._closed_until:
+            self.late_records += 1
+            return
+
+        self._add(unix_timestamp, request.section, request.status, 1, request.bytes)
+        if self._newest is None or unix_timestamp > self._newest:
+            self._newest = unix_timestamp
+            self._advance(unix_timestamp - self.log_delay)
+
+    def append_run(self, unix_timestamp: int, hits: int, hits_by_section: Dict[str, Dict[str, int]]):
+        self._idle_since = None
+        if self._closed_until is not None and unix_timestamp < self._closed_until:
+            self.late_records += hits
+            return
+
+        for section, section_hits in hits_by_section.items():
+            for status, status_hits in section_hits.items():
+                self._add(unix_timestamp, section, status, status_hits)
+        if self._newest is None or unix_timestamp > self._newest:
+            self._newest = unix_timestamp
+            self._advance(unix_timestamp - self.log_delay)
+
+    def advance_idle(self, now: float):
+        if self._newest is None:
+            return
+        if self._idle_since is None:
+            self._idle_since = now
+            return
+
+        idle_seconds = now - self._idle_since
+        if idle_seconds >= self.idle_timeout:
+            self._advance(self._newest + int(idle_seconds) - self.log_delay)
+
+    def flush(self):
+        if self._heap:
+            self._advance(max(self._heap) + self.ttl - 1)
+
+    def get_state(self) -> dict:
+        return {'seconds': self._seconds, 'watermark': self.watermark, 'newest': self._newest,
+                'late_records': self.late_records}
+
+    def set_state(self, state: dict):
+        super().set_state(state)
+        self._newest = state.get('newest')
+        self.late_records = state.get('late_records', 0)
+        if state.get('watermark') is not None:
+            self._advance(state['watermark'])
+
+    def _get_window(self, unix_timestamp: int) -> int:
+        return unix_timestamp - unix_timestamp % self.ttl
+
+    def _add(self, unix_timestamp: int, section: str, status: str, hits: int = 1, response_bytes: int = None):
+        super()._add(self._get_window(unix_timestamp), section, status, hits, response_bytes)
+
+    def _advance(self, watermark: int):
+        if self.watermark is not None and watermark <= self.watermark:
+            return
+
+        self.watermark = watermark
+        while self._heap and self._get_head() + self.ttl - 1 <= watermark:
+            self._trigger_stats_event()
+        self._closed_until = self._get_window(watermark + 1)
+
+    def _pop_window(self) -> Tuple[int, int, list, list]:
+        window = heapq.heappop(self._heap)
+        bytes_buckets = [self._bytes.pop(window)] if window in self._bytes else []
+        return window, window + self.ttl - 1, [self._seconds.pop(window)], bytes_buckets
+
+    def _get_event(self, oldest: int, newest: int, total_hits: int, top_sections, hits_by_status, **top) -> StatsEvent:
+        return super()._get_event(oldest, newest, total_hits, top_sections, hits_by_status,
+                                  late_records=self.late_records, **top)
+
+
+class SketchStatsAggregator(StatsAggregator):
+    """
+    Approximate version of the StatsAggregator for logs with many distinct sections or remote hosts
+
+    - Each second keeps a SpaceSaving sketch of the sections (with their hits by status) and one of the
+    remote hosts instead of a dict of every section, so the memory is fixed whatever the number of
+    distinct keys, the counts are at most error_rate * hits of the window higher than the real ones
+    - The sketches of the seconds are merged when the window is closed, the top sections and top hosts
+    of the window are sent on the StatsEvent with the top sections and top hosts of the last
+    alert_interval seconds (the sketches of the last alert_interval / ttl windows merged)
+
+    The hits by status and the total hits are exact, the runs of the batch readers have no remote hosts
+
+    The sketches are not kept on a checkpoint, the open window is closed at the end of the input instead
+    """
+    keeps_window_state = False
+
+    def __init__(self, ttl: int, log_delay: int, top_sections: int = TOP_SECTIONS, source: str = None,
+                 error_rate: float = TOP_K_ERROR_RATE, top_hosts: int = TOP_HOSTS,
+                 alert_interval: int = ALERT_INTERVAL):
+        super().__init__(ttl, log_delay, top_sections, source)
+        self.capacity = math.ceil(1 / error_rate)
+        self.top_hosts = top_hosts
+        self._alert_windows = deque([], maxlen=max(alert_interval // ttl, 1))
+
+    def append(self, request: Request):
+        self._resize(request.timestamp)
+        self._add_host_hit(request.timestamp, request.section, request.status, request.remotehost)
+
+    def get_state(self) -> dict:
+        """
+        The sketches are not saved, the window starts again after a restore
+        """
+        return {'seconds': {}}
+
+    def set_state(self, state: dict):
+        pass
+
+    def _add(self, unix_timestamp: int, section: str, status: str, hits: int = 1, response_bytes: int = None):
+        """
+        The response bytes are not kept by the sketches
+        """
+        bucket = self._seconds.get(unix_timestamp)
+        if bucket is None:
+            bucket = self._seconds[unix_timestamp] = (SpaceSaving(self.capacity), SpaceSaving(self.capacity), {})
+            heapq.heappush(self._heap, unix_timestamp)
+
+        sections, _, hits_by_status = bucket
+        sections.add(section, hits, status)
+        hits_by_status[status] = hits_by_status.get(status, 0) + hits
+
+    def _add_host_hit(self, unix_timestamp: int, section: str, status: str, host: str):
+        self._add(unix_timestamp, section, status)
+        self._seconds[unix_timestamp][1].add(host, 1)
+
+    def _get_stats(self) -> StatsEvent:
+        oldest, newest, buckets, _ = self._pop_window()
+        sections = merge_sketches((bucket[0] for bucket in buckets), self.capacity)
+        hosts = merge_sketches((bucket[1] for bucket in buckets), self.capacity)
+
+        hits_by_status = {}
+        for _, _, bucket_hits_by_status in buckets:
+            for status, hits in bucket_hits_by_status.items():
+                hits_by_status[status] = hits_by_status.get(status, 0) + hits
+
+        self._alert_windows.append((sections, hosts))
+        alert_sections = merge_sketches((window[0] for window in self._alert_windows), self.capacity)
+        alert_hosts = merge_sketches((window[1] for window in self._alert_windows), self.capacity)
+
+        return self._get_event(oldest, newest, sum(hits_by_status.values()), self._get_top_sections(sections),
+                               hits_by_status, top_hosts=hosts.top(self.top_hosts),
+                               alert_top_sections=self._get_top_sections(alert_sections),
+                               alert_top_hosts=alert_hosts.top(self.top_hosts))
+
+    def _get_top_sections(self, sections: SpaceSaving) -> List[SectionTrafficStats]:
+        top_sections = []
+        for heavy_hitter in sections.top(self.top_sections):
+            section_stats = SectionTrafficStats(heavy_hitter.key)
+            section_stats.hits_by_status = heavy_hitter.details
+            section_stats.total_hits = heavy_hitter.count
+            section_stats.error = heavy_hitter.error
+            top_sections.append(section_stats)
+        return top_sections
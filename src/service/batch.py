@@ -0,0 +1,215 @@
+from src.config import BATCH_CHUNK_SIZE, BATCH_MAX_FIELD_WIDTH, CSV_COLUMNS
+from src.model.server import get_section
+from src.service.tail import is_csv_header
+from typing import Dict, Iterator, List, Tuple
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# (timestamp, hits, {section: {status: hits}}) of consecutive lines with the same timestamp
+Run = Tuple[int, int, Dict[str, Dict[str, int]]]
+
+NEWLINE = ord('\n')
+COMMA = ord(',')
+ZERO = ord('0')
+# The longest timestamp that fits on an int64
+MAX_INTEGER_DIGITS = 18
+
+
+class BatchReader:
+    """
+    Optional bulk ingestion engine (requires numpy)
+
+    Instead of handling one line at a time the file is read in chunks of BATCH_CHUNK_SIZE bytes
+    split at the last line boundary, the offsets of the newlines and commas of the whole chunk
+    are found with numpy and the timestamp, request and status columns are parsed with vectorized
+    operations (the distinct requests and statuses are decoded only once with np.unique)
+
+    Each chunk is returned as a list of runs, a run is the hits of consecutive lines
+    with the same timestamp grouped by section and status, feeding the runs in order with
+    TTLBucketIntervalCache.append_run and StatsAggregator.append_run raises the same
+    StateChangeEvent and StatsEvent as the line by line path
+
+    The columns are parsed on matrices as wide as the longest column (up to BATCH_MAX_FIELD_WIDTH bytes,
+    the few longer requests or statuses are decoded one by one and timestamps longer than
+    MAX_INTEGER_DIGITS digits are not valid)
+
+    Lines that don't have CSV_COLUMNS columns, a numeric timestamp or a valid request are skipped,
+    total_lines and rejected_lines count the lines read and skipped so far
+    """
+    def __init__(self, file_path: str, chunk_size: int = BATCH_CHUNK_SIZE, skip_header: bool = True):
+        if not self.is_available():
+            raise ImportError('numpy is required for the batch engine, please install it with `pip install numpy`')
+
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.skip_header = skip_header
+        self.total_lines = 0
+        self.rejected_lines = 0
+
+    @staticmethod
+    def is_available() -> bool:
+        return np is not None
+
+    def runs(self) -> Iterator[List[Run]]:
+        with open(self.file_path, 'rb') as log_file:
+            for data in self.chunks(log_file):
+                runs = parse_runs(data)
+                self.count_lines(data.count(b'\n'), runs)
+                yield runs
+
+    def count_lines(self, total_lines: int, runs: List[Run]):
+        self.total_lines += total_lines
+        self.rejected_lines += total_lines - sum(hits for _, hits, _ in runs)
+
+    def chunks(self, log_file) -> Iterator[bytes]:
+        pending = b''
+        header_pending = self.skip_header
+
+        while True:
+            chunk = log_file.read(self.chunk_size)
+            if not chunk:
+                break
+
+            data = pending + chunk
+            end = data.rfind(b'\n') + 1
+            pending = data[end:]
+            data = data[:end]
+
+            if header_pending and data:
+                header_pending = False
+                if is_csv_header(data):
+                    data = data[data.find(b'\n') + 1:]
+
+            if data:
+                yield data
+
+        if pending and not (header_pending and is_csv_header(pending)):
+            yield pending + b'\n'
+
+
+def parse_runs(data: bytes) -> List[Run]:
+    """
+    Parses a chunk of complete lines (ending with a newline) into runs
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(buffer == NEWLINE)
+    if not len(newlines):
+        return []
+
+    line_starts = np.concatenate(([0], newlines[:-1] + 1))
+    commas = np.flatnonzero(buffer == COMMA)
+
+    commas_by_line = np.bincount(np.searchsorted(newlines, commas), minlength=len(newlines))
+    first_commas = np.searchsorted(commas, line_starts)[commas_by_line == CSV_COLUMNS - 1]
+    if not len(first_commas):
+        return []
+
+    timestamps, valid_timestamps = _parse_integers(buffer, commas[first_commas + 2] + 1, commas[first_commas + 3])
+    requests, request_codes = _get_distinct_fields(buffer, commas[first_commas + 3] + 1, commas[first_commas + 4])
+    statuses, status_codes = _get_distinct_fields(buffer, commas[first_commas + 4] + 1, commas[first_commas + 5])
+
+    sections, section_by_request = _get_sections(requests)
+    section_codes = section_by_request[request_codes]
+
+    valid = valid_timestamps & (section_codes >= 0)
+    timestamps = timestamps[valid]
+    section_codes = section_codes[valid]
+    status_codes = status_codes[valid]
+
+    return _get_runs(timestamps, sections, section_codes, statuses, status_codes)
+
+
+def _get_field_matrix(buffer, starts, ends):
+    lengths = ends - starts
+    width = max(int(lengths.max(initial=0)), 1)
+    columns = np.arange(width)
+    mask = columns < lengths[:, None]
+    positions = np.minimum(starts[:, None] + columns, len(buffer) - 1)
+    matrix = np.where(mask, buffer[positions], 0).astype(np.uint8)
+    return matrix, mask, lengths
+
+
+def _parse_integers(buffer, starts, ends):
+    # the longer fields would overflow the int64, only their first digits are read and they are not valid
+    too_long = ends - starts > MAX_INTEGER_DIGITS
+    matrix, mask, lengths = _get_field_matrix(buffer, starts, np.minimum(ends, starts + MAX_INTEGER_DIGITS))
+    digits = matrix.astype(np.int64) - ZERO
+    is_digit = (digits >= 0) & (digits <= 9)
+    valid = (is_digit | ~mask).all(axis=1) & (lengths > 0) & ~too_long
+
+    exponents = np.where(mask, lengths[:, None] - 1 - np.arange(matrix.shape[1]), 0)
+    values = (np.where(mask & is_digit, digits, 0) * (10 ** exponents)).sum(axis=1)
+    return values, valid
+
+
+def _get_distinct_fields(buffer, starts, ends):
+    """
+    Returns the distinct fields and the code of the field of each line, the fields longer than
+    BATCH_MAX_FIELD_WIDTH are decoded one by one instead of widening the matrix of every line
+    """
+    short = ends - starts <= BATCH_MAX_FIELD_WIDTH
+    matrix, _, _ = _get_field_matrix(buffer, starts[short], ends[short])
+    keys = np.ascontiguousarray(matrix).view(f'V{matrix.shape[1]}').ravel()
+    distinct, short_codes = np.unique(keys, return_inverse=True)
+    fields = [sys.intern(bytes(field).rstrip(b'\0').decode('utf-8', errors='replace')) for field in distinct]
+    if short.all():
+        return fields, short_codes.ravel()
+
+    codes = np.empty(len(starts), dtype=np.int64)
+    codes[short] = short_codes.ravel()
+    field_codes = {field: code for code, field in enumerate(fields)}
+    for line in np.flatnonzero(~short).tolist():
+        field = buffer[starts[line]:ends[line]].tobytes().decode('utf-8', errors='replace')
+        code = field_codes.get(field)
+        if code is None:
+            code = field_codes[field] = len(fields)
+            fields.append(sys.intern(field))
+        codes[line] = code
+    return fields, codes
+
+
+def _get_sections(requests: List[str]):
+    sections = []
+    section_codes = {}
+    section_by_request = np.empty(len(requests), dtype=np.int64)
+
+    for index, request in enumerate(requests):
+        try:
+            section = get_section(request)
+        except IndexError:
+            section_by_request[index] = -1
+            continue
+
+        if section not in section_codes:
+            section_codes[section] = len(sections)
+            sections.append(section)
+        section_by_request[index] = section_codes[section]
+
+    return sections, section_by_request
+
+
+def _get_runs(timestamps, sections, section_codes, statuses, status_codes) -> List[Run]:
+    if not len(timestamps):
+        return []
+
+    run_starts = np.concatenate(([0], np.flatnonzero(timestamps[1:] != timestamps[:-1]) + 1))
+    run_hits = np.diff(np.append(run_starts, len(timestamps)))
+    run_ids = np.repeat(np.arange(len(run_starts)), run_hits)
+
+    total_statuses = len(statuses)
+    total_keys = len(sections) * total_statuses
+    keys, hits = np.unique(run_ids * total_keys + section_codes * total_statuses + status_codes, return_counts=True)
+
+    runs = [(timestamp, run_total, {}) for timestamp, run_total in zip(timestamps[run_starts].tolist(), run_hits.tolist())]
+    for key, key_hits in zip(keys.tolist(), hits.tolist()):
+        run_id, section_key = divmod(key, total_keys)
+        section_code, status_code = divmod(section_key, total_statuses)
+        hits_by_section = runs[run_id][2]
+        section_hits = hits_by_section.setdefault(sections[section_code], {})
+        section_hits[statuses[status_code]] = key_hits
+
+    return runs
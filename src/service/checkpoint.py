@@ -0,0 +1,64 @@
+from src.config import CHECKPOINT_INTERVAL
+from typing import Optional
+import json
+import os
+import time
+
+
+class Checkpoint:
+    """
+    Saves and loads the state of an agent as JSON, so a restarted monitor continues where it stopped
+
+    - The file is written to a temporary file and renamed, a crash while saving keeps the previous checkpoint
+    - The agent saves it after a batch when is_due (every interval seconds) and when it finishes
+
+    The state has the line offset of the log file with its inode and size (fingerprint), the per second
+    counters of the alert window, the buckets of the open stats window and the ServerState
+    """
+    VERSION = 1
+
+    def __init__(self, file_path: str, interval: float = CHECKPOINT_INTERVAL):
+        self.file_path = file_path
+        self.interval = interval
+        self.saves = 0
+        self._last_save = time.monotonic()
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.file_path, 'r') as checkpoint_file:
+                state = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return None
+
+        if state.get('version') != self.VERSION:
+            return None
+        return state
+
+    def save(self, state: dict):
+        temporary_path = f'{self.file_path}.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump({'version': self.VERSION, **state}, checkpoint_file)
+        os.replace(temporary_path, self.file_path)
+        self.saves += 1
+        self._last_save = time.monotonic()
+
+    def is_due(self) -> bool:
+        return time.monotonic() - self._last_save >= self.interval
+
+    @staticmethod
+    def get_resume_offset(state: dict, file_path: str) -> int:
+        """
+        The offset to continue reading the file, 0 when the file was rotated or truncated after the checkpoint
+        """
+        log_file = state.get('file', {})
+        if log_file.get('path') != os.path.abspath(file_path):
+            return 0
+
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return 0
+
+        if stat.st_ino != log_file.get('inode') or stat.st_size < log_file.get('offset', 0):
+            return 0
+        return log_file.get('offset', 0)
@@ -0,0 +1,136 @@
+from src.config import READ_CHUNK_SIZE, DECOMPRESS_QUEUE_SIZE
+from src.service.tail import LogTail, is_csv_header
+from typing import Callable, Iterator, List, Optional
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import threading
+import zlib
+
+_END = object()
+# The errors of a file that can not be read or decompressed (e.g. a truncated or corrupt archive)
+READ_ERRORS = (OSError, EOFError, lzma.LZMAError, zlib.error)
+
+
+class CompressedReader:
+    """
+    Reads a gzip, bz2 or xz log file in batches of lines, like the LogTail for plain files
+
+    - The format is found by the magic bytes of the file (or its extension when it is too short)
+    - The file is decompressed and split in lines by its own thread, the batches of lines wait
+    in a queue of queue_size batches, so the decompression of the next chunks runs while the agent
+    parses the current batch (zlib, bz2 and lzma release the GIL while they decompress)
+    - An error of the decompression (e.g. a truncated archive) is raised by batches()
+    """
+    MAGIC_NUMBERS = {
+        b'\x1f\x8b': gzip.open,
+        b'BZh': bz2.open,
+        b'\xfd7zXZ\x00': lzma.open,
+    }
+    EXTENSIONS = {
+        '.gz': gzip.open,
+        '.bz2': bz2.open,
+        '.xz': lzma.open,
+    }
+
+    def __init__(self, file_path: str, skip_header: bool = True, chunk_size: int = READ_CHUNK_SIZE,
+                 queue_size: int = DECOMPRESS_QUEUE_SIZE):
+        self.file_path = file_path
+        self.skip_header = skip_header
+        self.chunk_size = chunk_size
+        self._opener = self.get_opener(file_path)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+
+    @classmethod
+    def get_opener(cls, file_path: str) -> Optional[Callable]:
+        try:
+            with open(file_path, 'rb') as log_file:
+                head = log_file.read(6)
+        except OSError:
+            head = b''
+
+        for magic_number, opener in cls.MAGIC_NUMBERS.items():
+            if head.startswith(magic_number):
+                return opener
+        return cls.EXTENSIONS.get(os.path.splitext(file_path)[1].lower()) if len(head) < 6 else None
+
+    @classmethod
+    def is_compressed(cls, file_path: str) -> bool:
+        return cls.get_opener(file_path) is not None
+
+    def stop(self):
+        self._stopped.set()
+
+    def batches(self) -> Iterator[List[str]]:
+        thread = threading.Thread(target=self._decompress, daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is _END:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            self._stopped.set()
+            thread.join()
+
+    def _decompress(self):
+        try:
+            with self._opener(self.file_path, 'rb') as log_file:
+                pending = b''
+                header_pending = self.skip_header
+
+                while not self._stopped.is_set():
+                    chunk = log_file.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    data = pending + chunk
+                    end = data.rfind(b'\n') + 1
+                    pending = data[end:]
+                    lines = self._decode(data[:end])
+                    if header_pending and lines:
+                        header_pending = False
+                        if is_csv_header(lines[0]):
+                            lines = lines[1:]
+                    if lines:
+                        self._put(lines)
+
+                lines = self._decode(pending)
+                if header_pending and lines and is_csv_header(lines[0]):
+                    lines = lines[1:]
+                if lines:
+                    self._put(lines)
+        except READ_ERRORS as error:
+            self._put(error)
+        finally:
+            self._put(_END)
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def _decode(data: bytes) -> List[str]:
+        return data.decode('utf-8', errors='replace').splitlines() if data else []
+
+
+def get_log_reader(file_path: str, follow: bool = False, start_offset: int = 0, end_offset: int = None,
+                   idle_batches: bool = False):
+    """
+    The CompressedReader for compressed files and the LogTail otherwise
+    """
+    if CompressedReader.is_compressed(file_path):
+        return CompressedReader(file_path)
+    return LogTail(file_path, follow=follow, start_offset=start_offset, end_offset=end_offset,
+                   idle_batches=idle_batches)
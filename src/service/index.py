@@ -0,0 +1,152 @@
+from src.config import INDEX_EVERY_LINES, LOG_DELAY, READ_CHUNK_SIZE
+from typing import Optional, Tuple
+import bisect
+import json
+import os
+
+
+class TimestampIndex:
+    """
+    Sparse index of a log file saved next to it (FILE.idx), every INDEX_EVERY_LINES lines
+    it keeps the offset of the line and the max timestamp of the lines before it
+
+    - The max timestamps never decrease so the offsets of a time range are found with a binary search
+    - The lines are out of order up to LOG_DELAY seconds, a line can be LOG_DELAY seconds older than
+    the lines before it, so the range starts at the last entry whose max timestamp is LOG_DELAY seconds
+    older than from_timestamp and ends at the first entry whose max timestamp is LOG_DELAY seconds
+    newer than to_timestamp, the lines out of the range are dropped by the agent
+    - update() only reads the lines appended since the last update, the index is built again
+    when the file was replaced (inode) or truncated
+    - When the index can not be saved (e.g. a read only directory) it is only kept in memory,
+    the error is kept on error and the next run builds it again
+    """
+    VERSION = 1
+
+    def __init__(self, file_path: str, every: int = INDEX_EVERY_LINES, log_delay: int = LOG_DELAY,
+                 chunk_size: int = READ_CHUNK_SIZE):
+        self.file_path = file_path
+        self.index_path = f'{file_path}.idx'
+        self.every = every
+        self.log_delay = log_delay
+        self.chunk_size = chunk_size
+        self.error: Optional[OSError] = None
+        self._reset()
+        self._load()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def update(self) -> int:
+        """
+        Indexes the lines appended since the last update and saves the index, returns the lines read
+        """
+        stat = os.stat(self.file_path)
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reset()
+            self._inode = stat.st_ino
+
+        lines = self._read_from(self._offset)
+        self._save()
+        return lines
+
+    def get_offsets(self, from_timestamp: Optional[int] = None,
+                    to_timestamp: Optional[int] = None) -> Tuple[int, Optional[int]]:
+        """
+        The offset to start reading and the offset to stop reading (None for the end of the file)
+        """
+        start_offset = 0
+        if from_timestamp is not None:
+            position = bisect.bisect_left(self._max_timestamps, from_timestamp - self.log_delay) - 1
+            if position >= 0:
+                start_offset = self._offsets[position]
+
+        end_offset = None
+        if to_timestamp is not None:
+            position = bisect.bisect_right(self._max_timestamps, to_timestamp + self.log_delay)
+            if position < len(self._offsets):
+                end_offset = self._offsets[position]
+
+        return start_offset, end_offset
+
+    def _reset(self):
+        self._inode = None
+        self._offset = 0
+        self._lines = 0
+        self._max_timestamp = None
+        self._offsets = []
+        self._max_timestamps = []
+
+    def _read_from(self, offset: int) -> int:
+        lines = 0
+        with open(self.file_path, 'rb') as log_file:
+            log_file.seek(offset)
+            pending = b''
+
+            while True:
+                chunk = log_file.read(self.chunk_size)
+                if not chunk:
+                    break
+
+                data = pending + chunk
+                end = data.rfind(b'\n') + 1
+                pending = data[end:]
+
+                line_offset = offset
+                for line in data[:end].splitlines(keepends=True):
+                    self._add_line(line, line_offset)
+                    line_offset += len(line)
+                    lines += 1
+                offset += end
+
+        self._offset = offset
+        return lines
+
+    def _add_line(self, line: bytes, offset: int):
+        if self._lines and self._lines % self.every == 0 and self._max_timestamp is not None:
+            self._offsets.append(offset)
+            self._max_timestamps.append(self._max_timestamp)
+        self._lines += 1
+
+        try:
+            timestamp = int(line.split(b',', 4)[3])
+        except (ValueError, IndexError):
+            return
+
+        if self._max_timestamp is None or timestamp > self._max_timestamp:
+            self._max_timestamp = timestamp
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            return
+
+        if index.get('version') != self.VERSION or index.get('every') != self.every:
+            return
+
+        self._inode = index['inode']
+        self._offset = index['offset']
+        self._lines = index['lines']
+        self._max_timestamp = index['max_timestamp']
+        self._offsets = [offset for _, offset in index['entries']]
+        self._max_timestamps = [max_timestamp for max_timestamp, _ in index['entries']]
+
+    def _save(self):
+        temporary_path = f'{self.index_path}.tmp'
+        try:
+            with open(temporary_path, 'w') as index_file:
+                json.dump({
+                    'version': self.VERSION,
+                    'every': self.every,
+                    'inode': self._inode,
+                    'offset': self._offset,
+                    'lines': self._lines,
+                    'max_timestamp': self._max_timestamp,
+                    'entries': list(zip(self._max_timestamps, self._offsets)),
+                }, index_file)
+            os.replace(temporary_path, self.index_path)
+        except OSError as error:
+            self.error = error
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
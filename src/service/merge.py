@@ -0,0 +1,183 @@
+from src.config import LOG_DELAY, MERGE_QUEUE_SIZE, MERGE_BATCH_SIZE, FOLLOW_MAX_POLL
+from src.service.compressed import get_log_reader
+from collections import deque
+from typing import Iterator, List, Tuple
+import heapq
+import os
+import threading
+
+
+class MergeSource:
+    """
+    Reads one log file with a LogTail (or a CompressedReader) in its own thread and keeps at most
+    queue_size batches of lines waiting to be merged
+    """
+    def __init__(self, index: int, file_path: str, condition: threading.Condition, follow: bool = False,
+                 queue_size: int = MERGE_QUEUE_SIZE):
+        self.index = index
+        self.file_path = file_path
+        self.name = os.path.basename(file_path)
+        self.queue_size = queue_size
+        self.finished = False
+        self._stopped = threading.Event()
+        self._condition = condition
+        self._batches = deque([])
+        self._lines = deque([])
+        self._log_tail = get_log_reader(file_path, follow=follow)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._log_tail.stop()
+        with self._condition:
+            self._condition.notify_all()
+
+    def next_line(self):
+        """
+        Returns the next line or None when there are no lines read yet (or the source finished)
+        """
+        if not self._lines:
+            with self._condition:
+                if not self._batches:
+                    return None
+                self._lines = deque(self._batches.popleft())
+                self._condition.notify_all()
+        return self._lines.popleft()
+
+    def is_drained(self) -> bool:
+        with self._condition:
+            return self.finished and not self._batches and not self._lines
+
+    def has_lines(self) -> bool:
+        """
+        True when next_line has a line to return, it must be called with the condition
+        """
+        return bool(self._lines or self._batches)
+
+    def is_ready(self) -> bool:
+        return self.has_lines() or self.finished
+
+    def _read(self):
+        try:
+            for lines in self._log_tail.batches():
+                with self._condition:
+                    self._condition.wait_for(lambda: len(self._batches) < self.queue_size or self._stopped.is_set())
+                    self._batches.append(lines)
+                    self._condition.notify_all()
+        finally:
+            with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+
+
+class MergedReader:
+    """
+    Reads many log files concurrently (one thread per file, see MergeSource) and merges them
+    into a single stream ordered by timestamp with a k-way merge
+
+    - A MIN HEAP keeps the next line of each file, the root is the oldest line of all the files,
+    so the memory depends on the number of files and not on the number of lines
+    - Each file is already ordered up to LOG_DELAY seconds, the merged stream keeps the same bound
+    - With follow a file without new lines doesn't stall the others, the other files are read ahead
+    and the lines older than the newest timestamp minus LOG_DELAY are released without waiting for it,
+    so the heap keeps at most LOG_DELAY seconds of lines
+    - The lines without a valid timestamp are released as they are read (the agent rejects them)
+
+    It returns batches of (source index, line), sources has the MergeSource of each index,
+    with idle_batches and follow it yields an empty batch each time it waits for new lines without holding
+    lines on the heap (like the LogTail)
+    """
+    def __init__(self, file_paths: List[str], follow: bool = False, log_delay: int = LOG_DELAY,
+                 batch_size: int = MERGE_BATCH_SIZE, queue_size: int = MERGE_QUEUE_SIZE,
+                 poll: float = FOLLOW_MAX_POLL, idle_batches: bool = False):
+        self.follow = follow
+        self.idle_batches = idle_batches
+        self.log_delay = log_delay
+        self.batch_size = batch_size
+        self.poll = poll
+        self._condition = threading.Condition()
+        self._newest_timestamp = None
+        self._sequence = 0
+        self.sources = [MergeSource(index, file_path, self._condition, follow, queue_size)
+                        for index, file_path in enumerate(file_paths)]
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+
+    def batches(self) -> Iterator[List[Tuple[int, str]]]:
+        for source in self.sources:
+            source.start()
+
+        heap = []
+        batch = []
+        lines_in_heap = [0] * len(self.sources)
+        waiting = list(self.sources)
+        self._newest_timestamp = None
+
+        while waiting or heap:
+            still_waiting = []
+            for source in waiting:
+                if self._push_next_line(source, heap, batch):
+                    lines_in_heap[source.index] += 1
+                elif not source.is_drained():
+                    still_waiting.append(source)
+            waiting = still_waiting
+
+            released = False
+            read_ahead = False
+            if heap and (not waiting or self._is_late(heap[0][0])):
+                _, index, _, line = heapq.heappop(heap)
+                batch.append((index, line))
+                lines_in_heap[index] -= 1
+                if not lines_in_heap[index]:
+                    waiting.append(self.sources[index])
+                released = True
+            elif waiting and self.follow:
+                for source in self.sources:
+                    if lines_in_heap[source.index] and self._push_next_line(source, heap, batch):
+                        lines_in_heap[source.index] += 1
+                        read_ahead = True
+
+            if len(batch) >= self.batch_size or (batch and not released):
+                yield batch
+                batch = []
+
+            if waiting and not released and not read_ahead:
+                with self._condition:
+                    if not any(source.is_ready() for source in waiting) and \
+                            not (self.follow and any(source.has_lines() for source in self.sources)):
+                        self._condition.wait(self.poll)
+                if self.follow and self.idle_batches and not heap:
+                    yield []
+
+        if batch:
+            yield batch
+
+    def _push_next_line(self, source: MergeSource, heap: list, batch: list) -> bool:
+        """
+        Pushes the next line of the source with a valid timestamp to the heap,
+        returns False when the source has no lines to push
+        """
+        while True:
+            line = source.next_line()
+            if line is None:
+                return False
+
+            try:
+                timestamp = int(line.split(',', 4)[3])
+            except (ValueError, IndexError):
+                batch.append((source.index, line))
+                continue
+
+            self._sequence += 1
+            heapq.heappush(heap, (timestamp, source.index, self._sequence, line))
+            if self._newest_timestamp is None or timestamp > self._newest_timestamp:
+                self._newest_timestamp = timestamp
+            return True
+
+    def _is_late(self, timestamp: int) -> bool:
+        return self.follow and timestamp <= self._newest_timestamp - self.log_delay
@@ -0,0 +1,160 @@
+from src.config import METRICS_INTERVAL
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+import bisect
+import json
+import os
+import threading
+
+DEFAULT_BUCKETS = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1, 10]
+
+
+class Histogram:
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class Metrics:
+    """
+    Registry of the metrics of the pipeline
+
+    - Counters and gauges are registered with a function that is only called when the metrics
+    are exported, so the pipeline keeps its own counters and pays nothing per line
+    - Histograms are observed by the agent once per batch (not per line)
+
+    The metrics can be exported as a dict (JSON) or in the Prometheus text format
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, function: Callable, metric_type: str = 'gauge', help_text: str = '',
+                 label: str = None):
+        """
+        The function returns the value, or a dict of {label value: value} when a label is given
+        """
+        self._metrics[name] = (function, metric_type, help_text, label)
+
+    def histogram(self, name: str, help_text: str = '', buckets: List[float] = None) -> Histogram:
+        histogram = Histogram(buckets)
+        self._histograms[name] = (histogram, help_text)
+        return histogram
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            snapshot = {name: function() for name, (function, _, _, _) in self._metrics.items()}
+            for name, (histogram, _) in self._histograms.items():
+                snapshot[name] = histogram.to_dict()
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, (_, metric_type, help_text, label) in self._metrics.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if label:
+                for label_value, value in snapshot[name].items():
+                    lines.append(f'{name}{{{label}="{label_value}"}} {value}')
+            else:
+                lines.append(f'{name} {snapshot[name]}')
+
+        for name, (_, help_text) in self._histograms.items():
+            histogram = snapshot[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for bound, count in histogram['buckets'].items():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{name}_sum {histogram['sum']}")
+            lines.append(f"{name}_count {histogram['count']}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsFileExporter:
+    """
+    Writes the metrics as JSON to a file every interval seconds (and when it is stopped)
+    """
+    def __init__(self, metrics: Metrics, file_path: str, interval: float = METRICS_INTERVAL):
+        self._metrics = metrics
+        self._file_path = file_path
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._export, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.write()
+
+    def write(self):
+        temporary_path = f'{self._file_path}.tmp'
+        with open(temporary_path, 'w') as metrics_file:
+            json.dump(self._metrics.snapshot(), metrics_file, indent=2)
+        os.replace(temporary_path, self._file_path)
+
+    def _export(self):
+        while not self._stopped.wait(self._interval):
+            self.write()
+
+
+class MetricsHttpServer:
+    """
+    Serves the metrics in the Prometheus text format on http://host:port/metrics
+    """
+    def __init__(self, metrics: Metrics, port: int, host: str = '127.0.0.1'):
+        handler = self._get_handler(metrics)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _get_handler(metrics: Metrics):
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return MetricsHandler
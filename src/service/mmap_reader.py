@@ -0,0 +1,126 @@
+from src.config import SECTION_CACHE_SIZE, MMAP_RUNS_BATCH
+from src.model.server import get_section
+from src.service.batch import Run
+from src.service.tail import CSV_HEADER_PREFIX, is_csv_header
+from typing import Iterator, List, Optional
+import mmap
+import os
+import re
+import sys
+
+# A valid line has CSV_COLUMNS (7) columns, the timestamp, request and status columns are captured
+LINE_PATTERN = re.compile(rb'^[^,\n]*,[^,\n]*,[^,\n]*,([^,\n]*),([^,\n]*),([^,\n]*),[^,\n]*$', re.MULTILINE)
+
+
+class MmapReader:
+    """
+    Zero copy reader for local files
+
+    - The file is memory mapped and scanned in place with a compiled regex, so there is no str
+    for each line and no substrings for the columns that are not used
+    - Only the timestamp, request and status columns are taken, the section of each distinct request
+    and each distinct status are decoded once and cached
+
+    It returns the same runs (hits of consecutive lines with the same timestamp by section and status)
+    as the BatchReader, so it can feed the append_run of the heap or ring caches and the StatsAggregator
+
+    total_lines and rejected_lines count the lines read and skipped so far, the lines that don't match
+    are counted from the newlines between the matches (they are rare, so it doesn't scan the whole file again)
+    """
+    def __init__(self, file_path: str, runs_batch: int = MMAP_RUNS_BATCH, skip_header: bool = True):
+        self.file_path = file_path
+        self.runs_batch = runs_batch
+        self.skip_header = skip_header
+        self._sections = {}
+        self._statuses = {}
+        self.total_lines = 0
+        self.rejected_lines = 0
+
+    def runs(self) -> Iterator[List[Run]]:
+        if not os.path.getsize(self.file_path):
+            return
+
+        with open(self.file_path, 'rb') as log_file, \
+                mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+            start = 0
+            if self.skip_header and is_csv_header(log_map[:len(CSV_HEADER_PREFIX)]):
+                start = log_map.find(b'\n') + 1
+                if not start:
+                    return
+
+            yield from self._get_runs(log_map, start)
+
+    def _get_runs(self, log_map, start: int) -> Iterator[List[Run]]:
+        runs = []
+        run_timestamp = None
+        hits_by_section = None
+        line_start = start
+        total_lines = rejected_lines = 0
+
+        for match in LINE_PATTERN.finditer(log_map, start):
+            timestamp, request, status = match.groups()
+            if match.start() != line_start:
+                skipped_lines = log_map[line_start:match.start()].count(b'\n')
+                total_lines += skipped_lines
+                rejected_lines += skipped_lines
+            line_start = match.end() + 1
+            total_lines += 1
+
+            section = self._sections.get(request)
+            if section is None:
+                section = self._get_section(request)
+                if section is None:
+                    rejected_lines += 1
+                    continue
+
+            try:
+                timestamp = int(timestamp)
+            except ValueError:
+                rejected_lines += 1
+                continue
+
+            if timestamp != run_timestamp:
+                if len(runs) >= self.runs_batch:
+                    self._count_lines(total_lines - 1, rejected_lines)
+                    total_lines, rejected_lines = 1, 0
+                    yield runs
+                    runs = []
+                run_timestamp = timestamp
+                hits_by_section = {}
+                runs.append([timestamp, 0, hits_by_section])
+
+            runs[-1][1] += 1
+            status = self._statuses.get(status) or self._get_status(status)
+            section_hits = hits_by_section.get(section)
+            if section_hits is None:
+                section_hits = hits_by_section[section] = {}
+            section_hits[status] = section_hits.get(status, 0) + 1
+
+        if line_start < len(log_map):
+            remaining = log_map[line_start:]
+            skipped_lines = remaining.count(b'\n') + (not remaining.endswith(b'\n'))
+            total_lines += skipped_lines
+            rejected_lines += skipped_lines
+        self._count_lines(total_lines, rejected_lines)
+        if runs:
+            yield runs
+
+    def _count_lines(self, total_lines: int, rejected_lines: int):
+        self.total_lines += total_lines
+        self.rejected_lines += rejected_lines
+
+    def _get_section(self, request: bytes) -> Optional[str]:
+        try:
+            section = get_section(request.decode('utf-8', errors='replace'))
+        except IndexError:
+            return None
+
+        if len(self._sections) < SECTION_CACHE_SIZE:
+            self._sections[request] = section
+        return section
+
+    def _get_status(self, status: bytes) -> str:
+        interned = sys.intern(status.decode('utf-8', errors='replace'))
+        if len(self._statuses) < SECTION_CACHE_SIZE:
+            self._statuses[status] = interned
+        return interned
@@ -0,0 +1,114 @@
+from src.config import PARALLEL_CHUNK_SIZE, CSV_COLUMNS
+from src.model.server import Request
+from src.service.batch import BatchReader, Run, parse_runs
+from src.service.tail import is_csv_header
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Iterator, List, Tuple
+import os
+
+
+class ParallelReader:
+    """
+    Reads a large file with a pool of processes
+
+    - The file is split in byte ranges of PARALLEL_CHUNK_SIZE aligned to the line boundaries
+    - Each process parses its range into runs (the hits of consecutive lines with the same timestamp
+    by section and status), with numpy when it is installed
+    - The runs are returned in the order of the file, feeding them to the append_run of the caches
+    gives the same alarms and stats as the sequential read, also for the lines out of order
+    within the LOG_DELAY on the borders of the ranges
+
+    Only `workers * 2` ranges are in flight so the memory doesn't depend on the size of the file,
+    total_lines and rejected_lines count the lines read and skipped by the processes so far
+    """
+    def __init__(self, file_path: str, workers: int = None, chunk_size: int = PARALLEL_CHUNK_SIZE):
+        self.file_path = file_path
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.total_lines = 0
+        self.rejected_lines = 0
+
+    def runs(self) -> Iterator[List[Run]]:
+        pending = deque([])
+
+        with ProcessPoolExecutor(self.workers) as pool:
+            for start, end in self.get_ranges():
+                pending.append(pool.submit(read_range_runs, self.file_path, start, end))
+                if len(pending) >= self.workers * 2:
+                    yield self._get_runs(pending.popleft().result())
+
+            while pending:
+                yield self._get_runs(pending.popleft().result())
+
+    def _get_runs(self, range_runs: Tuple[List[Run], int]) -> List[Run]:
+        runs, total_lines = range_runs
+        self.total_lines += total_lines
+        self.rejected_lines += total_lines - sum(hits for _, hits, _ in runs)
+        return runs
+
+    def get_ranges(self) -> List[Tuple[int, int]]:
+        ranges = []
+        size = os.path.getsize(self.file_path)
+
+        with open(self.file_path, 'rb') as log_file:
+            first_line = log_file.readline()
+            start = len(first_line) if is_csv_header(first_line) else 0
+
+            while start < size:
+                log_file.seek(min(start + self.chunk_size, size))
+                log_file.readline()
+                end = min(log_file.tell(), size)
+                ranges.append((start, end))
+                start = end
+
+        return ranges
+
+
+def read_range(file_path: str, start: int, end: int) -> bytes:
+    with open(file_path, 'rb') as log_file:
+        log_file.seek(start)
+        data = log_file.read(end - start)
+
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    return data
+
+
+def read_range_runs(file_path: str, start: int, end: int) -> Tuple[List[Run], int]:
+    """
+    Returns the runs of the range and the number of lines read
+    """
+    data = read_range(file_path, start, end)
+
+    if BatchReader.is_available():
+        return parse_runs(data), data.count(b'\n')
+
+    return parse_runs_from_lines(data), data.count(b'\n')
+
+
+def parse_runs_from_lines(data: bytes) -> List[Run]:
+    """
+    Parses the runs with the Request class, used when numpy is not installed
+    """
+    runs = []
+    hits_by_section = None
+
+    for log_line in data.decode('utf-8', errors='replace').splitlines():
+        if len(log_line.split(',')) != CSV_COLUMNS:
+            continue
+
+        try:
+            request = Request(log_line)
+        except (ValueError, IndexError):
+            continue
+
+        if not runs or runs[-1][0] != request.timestamp:
+            hits_by_section = {}
+            runs.append([request.timestamp, 0, hits_by_section])
+
+        runs[-1][1] += 1
+        section_hits = hits_by_section.setdefault(request.section, {})
+        section_hits[request.status] = section_hits.get(request.status, 0) + 1
+
+    return [tuple(run) for run in runs]
@@ -0,0 +1,172 @@
+from src.config import TOP_SECTIONS
+from src.event.event import RuleStateChangeEvent, SourceStatsEvent, StateChangeEvent, StatsEvent
+from src.service.rollup import RollupBucket
+from datetime import datetime
+from typing import List
+import csv
+import json
+
+
+class Report:
+    """
+    Headless subscriber that writes each StatsEvent and StateChangeEvent as soon as it is raised,
+    as JSON lines or CSV rows, so the Agent can run as fast as the CPU allows without a Screen
+
+    With per_source the SourceStatsEvent of each file are written as source_stats rows with the file name,
+    write_history writes the buckets of the RollupStore as history rows
+    """
+    FORMATS = ('json', 'csv')
+    CSV_HEADERS = ['type', 'from_timestamp', 'to_timestamp', 'total_hits', 'top_sections', 'hits_by_status',
+                   'server_state', 'average_hits']
+
+    def __init__(self, output, output_format: str = 'json', per_source: bool = False):
+        if output_format not in self.FORMATS:
+            raise ValueError(f'Unknown report format {output_format}')
+
+        self._output = output
+        self._output_format = output_format
+        self._csv_writer = None
+        if output_format == 'csv':
+            headers = self.CSV_HEADERS + ['source'] if per_source else self.CSV_HEADERS
+            self._csv_writer = csv.DictWriter(output, headers)
+            self._csv_writer.writeheader()
+
+    def on_new_stats(self, event: StatsEvent):
+        seconds = event.to_timestamp - event.from_timestamp + 1
+        top_sections = [{'section': stats.section, 'total_hits': stats.total_hits,
+                         'hits_by_status': stats.hits_by_status, 'hits_by_class': stats.get_hits_by_class(),
+                         **self._get_bytes(stats, seconds)} for stats in event.top_sections]
+        source = {'source': event.source} if isinstance(event, SourceStatsEvent) else {}
+        row_type = 'source_stats' if source else 'stats'
+
+        if self._csv_writer:
+            self._csv_writer.writerow({
+                'type': row_type,
+                'from_timestamp': event.from_timestamp,
+                'to_timestamp': event.to_timestamp,
+                'total_hits': event.total_hits,
+                'top_sections': ';'.join(f"{stats['section']}:{stats['total_hits']}" for stats in top_sections),
+                'hits_by_status': self._join_hits(event.hits_by_status.items()),
+                **source,
+            })
+            return
+
+        self._write_json({
+            'type': row_type,
+            **source,
+            'from_timestamp': event.from_timestamp,
+            'to_timestamp': event.to_timestamp,
+            'from_date': event.from_date,
+            'to_date': event.to_date,
+            'total_hits': event.total_hits,
+            'hits_by_status': event.hits_by_status,
+            'top_sections': top_sections,
+            **self._get_heavy_hitters(event),
+            **({'late_records': event.late_records} if event.late_records is not None else {}),
+        })
+
+    @staticmethod
+    def _get_bytes(stats, seconds: int):
+        """
+        The response size quantiles of a section (not available with the runs of the batch readers)
+        """
+        if stats.response_bytes is None:
+            return {}
+
+        return {'bytes': {
+            'total': stats.response_bytes.sum,
+            'per_second': stats.get_bytes_per_second(seconds),
+            'p50': stats.get_bytes_quantile(0.5),
+            'p95': stats.get_bytes_quantile(0.95),
+            'p99': stats.get_bytes_quantile(0.99),
+        }}
+
+    @staticmethod
+    def _get_heavy_hitters(event: StatsEvent):
+        """
+        The approximate top hosts and the top of the alert window (only with the space_saving engine)
+        """
+        if not event.top_hosts and not event.alert_top_sections:
+            return {}
+
+        return {
+            'top_hosts': [{'host': host.key, 'total_hits': host.count, 'error': host.error}
+                          for host in event.top_hosts],
+            'alert_top_sections': [{'section': stats.section, 'total_hits': stats.total_hits, 'error': stats.error}
+                                   for stats in event.alert_top_sections],
+            'alert_top_hosts': [{'host': host.key, 'total_hits': host.count, 'error': host.error}
+                                for host in event.alert_top_hosts],
+        }
+
+    def on_server_state_change(self, event: StateChangeEvent):
+        if self._csv_writer:
+            self._csv_writer.writerow({
+                'type': 'alert',
+                'from_timestamp': event.timestamp,
+                'server_state': event.server_state.name,
+                'average_hits': f'{event.average_hits:.2f}',
+            })
+            return
+
+        self._write_json({
+            'type': 'alert',
+            'timestamp': event.timestamp,
+            'date': datetime.utcfromtimestamp(event.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            'server_state': event.server_state.name,
+            'average_hits': event.average_hits,
+        })
+
+    def on_rule_state_change(self, event: RuleStateChangeEvent):
+        if self._csv_writer:
+            self._csv_writer.writerow({
+                'type': f'rule:{event.rule_name}',
+                'from_timestamp': event.timestamp,
+                'server_state': event.rule_state.name,
+                'average_hits': f'{event.value:.2f}',
+            })
+            return
+
+        self._write_json({
+            'type': 'rule',
+            'rule': event.rule_name,
+            'timestamp': event.timestamp,
+            'date': datetime.utcfromtimestamp(event.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            'rule_state': event.rule_state.name,
+            'value': event.value,
+        })
+
+    def write_history(self, buckets: List[RollupBucket]):
+        """
+        Writes a history row by bucket of the RollupStore (e.g. at the end of the report)
+        """
+        for bucket in buckets:
+            top_sections = bucket.get_top_sections(TOP_SECTIONS)
+            if self._csv_writer:
+                self._csv_writer.writerow({
+                    'type': 'history',
+                    'from_timestamp': bucket.start,
+                    'to_timestamp': bucket.end,
+                    'total_hits': bucket.hits,
+                    'top_sections': self._join_hits(top_sections),
+                    'hits_by_status': self._join_hits(bucket.hits_by_status.items()),
+                })
+                continue
+
+            self._write_json({
+                'type': 'history',
+                'from_timestamp': bucket.start,
+                'to_timestamp': bucket.end,
+                'total_hits': bucket.hits,
+                'hits_by_status': bucket.hits_by_status,
+                'top_sections': [{'section': section, 'total_hits': hits} for section, hits in top_sections],
+            })
+
+    @staticmethod
+    def _join_hits(hits) -> str:
+        """
+        The (key, hits) pairs of a CSV column, e.g. 200:5;404:1
+        """
+        return ';'.join(f'{key}:{key_hits}' for key, key_hits in hits)
+
+    def _write_json(self, row):
+        self._output.write(json.dumps(row) + '\n')
@@ -0,0 +1,312 @@
+from src.config import LOG_DELAY, ROLLUP_RESOLUTIONS, ROLLUP_TOP_SECTIONS
+from typing import Dict, List, Optional, Tuple
+import heapq
+import threading
+
+
+class RollupBucket:
+    """
+    The hits, hits by status and hits by section of resolution seconds from start
+    """
+    __slots__ = ('start', 'resolution', 'hits', 'hits_by_status', 'hits_by_section')
+
+    def __init__(self, start: int, resolution: int):
+        self.start = start
+        self.resolution = resolution
+        self.hits = 0
+        self.hits_by_status: Dict[str, int] = {}
+        self.hits_by_section: Dict[str, int] = {}
+
+    @property
+    def end(self) -> int:
+        return self.start + self.resolution - 1
+
+    def add(self, other: 'RollupBucket'):
+        self.hits += other.hits
+        for status, hits in other.hits_by_status.items():
+            self.hits_by_status[status] = self.hits_by_status.get(status, 0) + hits
+        for section, hits in other.hits_by_section.items():
+            self.hits_by_section[section] = self.hits_by_section.get(section, 0) + hits
+
+    def truncate(self, top_sections: int):
+        """
+        Keeps only the top_sections sections with more hits (the hits and hits by status are kept)
+        """
+        if len(self.hits_by_section) > top_sections:
+            self.hits_by_section = dict(heapq.nlargest(top_sections, self.hits_by_section.items(),
+                                                       key=lambda item: (item[1], item[0])))
+
+    def get_state(self) -> list:
+        return [self.start, self.hits, self.hits_by_status, self.hits_by_section]
+
+    @classmethod
+    def from_state(cls, state: list, resolution: int) -> 'RollupBucket':
+        start, hits, hits_by_status, hits_by_section = state
+        bucket = cls(start, resolution)
+        bucket.hits = hits
+        bucket.hits_by_status = hits_by_status
+        bucket.hits_by_section = hits_by_section
+        return bucket
+
+    def get_top_sections(self, limit: int) -> List[Tuple[str, int]]:
+        return heapq.nsmallest(limit, self.hits_by_section.items(), key=lambda item: (-item[1], item[0]))
+
+
+class RollupRing:
+    """
+    Ring of size buckets of resolution seconds, the bucket of a timestamp is on the slot
+    (timestamp // resolution) % size so a new bucket replaces the one of size * resolution seconds before
+    """
+    def __init__(self, resolution: int, size: int):
+        self.resolution = resolution
+        self.size = size
+        self._slots: List[Optional[RollupBucket]] = [None] * size
+
+    @property
+    def retention(self) -> int:
+        return self.resolution * self.size
+
+    def set_bucket(self, bucket: RollupBucket):
+        self._slots[(bucket.start // self.resolution) % self.size] = bucket
+
+    def get_bucket(self, timestamp: int) -> RollupBucket:
+        start = timestamp - timestamp % self.resolution
+        index = (start // self.resolution) % self.size
+        bucket = self._slots[index]
+        if bucket is None or bucket.start != start:
+            bucket = self._slots[index] = RollupBucket(start, self.resolution)
+        return bucket
+
+    def get_bucket_at(self, start: int) -> Optional[RollupBucket]:
+        """
+        The bucket that starts at start when the ring still keeps it
+        """
+        bucket = self._slots[(start // self.resolution) % self.size]
+        return bucket if bucket is not None and bucket.start == start else None
+
+    def get_state(self) -> list:
+        return [bucket.get_state() for bucket in self._slots if bucket is not None]
+
+    def set_state(self, state: list):
+        self._slots = [None] * self.size
+        for bucket_state in state:
+            self.set_bucket(RollupBucket.from_state(bucket_state, self.resolution))
+
+    def get_buckets(self, from_timestamp: int, to_timestamp: int) -> List[RollupBucket]:
+        """
+        The buckets with hits between both timestamps in order, O(buckets of the range)
+        """
+        first = from_timestamp - from_timestamp % self.resolution
+        last = to_timestamp - to_timestamp % self.resolution
+        first = max(first, last - (self.size - 1) * self.resolution)
+
+        buckets = []
+        for start in range(first, last + 1, self.resolution):
+            bucket = self._slots[(start // self.resolution) % self.size]
+            if bucket is not None and bucket.start == start and bucket.hits:
+                buckets.append(bucket)
+        return buckets
+
+
+class RollupStore:
+    """
+    Bounded memory history of the traffic at many resolutions (1 second for an hour, 1 minute for a day
+    and 1 hour for a month by default, see ROLLUP_RESOLUTIONS)
+
+    - The requests are counted on open seconds by section and status, a second is closed once a request
+    is log_delay seconds newer (a request older than the closed seconds is counted on the next
+    open second, like the RuleEngine)
+    - A closed second is written on the finest ring and added to its bucket of the next ring, once a bucket
+    is complete (a newer bucket is opened on its ring) it is added to its bucket of the next coarser ring
+    (downsampling as the buckets close, a coarser ring lags by one bucket of the finer ring)
+    - Once a bucket is added to the coarser ring only its top_sections sections are kept, the hits and hits
+    by status are exact
+    - flush closes the open seconds and buckets (at the end of the input)
+    - get_state / set_state keep the rings (by resolution), the open seconds and the open buckets on a
+    checkpoint, the rings of a resolution that is not on the checkpoint start empty
+
+    get_buckets and get_summary read the finest ring that still keeps the start of the range,
+    in O(buckets of the range), they can be called from other threads (e.g. the screen), the rings
+    are locked while the seconds are closed and while they are read (not on each request)
+    """
+    def __init__(self, resolutions: List[Tuple[int, int]] = ROLLUP_RESOLUTIONS, log_delay: int = LOG_DELAY,
+                 top_sections: int = ROLLUP_TOP_SECTIONS):
+        self.rings = [RollupRing(resolution, size) for resolution, size in sorted(resolutions)]
+        self.log_delay = log_delay
+        self.top_sections = top_sections
+        self.newest: Optional[int] = None
+        self._open_seconds: Dict[int, Dict[str, Dict[str, int]]] = {}
+        self._closed: Optional[int] = None
+        self._open_buckets: List[Optional[RollupBucket]] = [None] * len(self.rings)
+        self._lock = threading.Lock()
+
+    def append(self, unix_timestamp: int, section: str, status: str, hits: int = 1):
+        hits_by_section = self._open_seconds.get(unix_timestamp)
+        if hits_by_section is None:
+            hits_by_section = self._open_second(unix_timestamp)
+
+        hits_by_status = hits_by_section.get(section)
+        if hits_by_status is None:
+            hits_by_status = hits_by_section[section] = {}
+        hits_by_status[status] = hits_by_status.get(status, 0) + hits
+
+    def append_run(self, unix_timestamp: int, hits_by_section: Dict[str, Dict[str, int]]):
+        for section, section_hits in hits_by_section.items():
+            for status, hits in section_hits.items():
+                self.append(unix_timestamp, section, status, hits)
+
+    def flush(self):
+        if self.newest is None:
+            return
+
+        self._close_until(self.newest)
+        with self._lock:
+            for index, bucket in enumerate(self._open_buckets):
+                if bucket is not None:
+                    self._open_buckets[index] = None
+                    self._close_bucket(index, bucket)
+
+    def get_state(self) -> dict:
+        with self._lock:
+            return {
+                'rings': {ring.resolution: ring.get_state() for ring in self.rings},
+                'open_buckets': {ring.resolution: bucket.start for ring, bucket in zip(self.rings, self._open_buckets)
+                                 if bucket is not None},
+                'open_seconds': self._open_seconds,
+                'closed': self._closed,
+                'newest': self.newest,
+            }
+
+    def set_state(self, state: dict):
+        rings = {int(resolution): ring_state for resolution, ring_state in state['rings'].items()}
+        open_buckets = {int(resolution): start for resolution, start in state['open_buckets'].items()}
+        with self._lock:
+            for index, ring in enumerate(self.rings):
+                ring.set_state(rings.get(ring.resolution, []))
+                start = open_buckets.get(ring.resolution)
+                self._open_buckets[index] = None if start is None else ring.get_bucket_at(start)
+            self._open_seconds = {int(second): hits_by_section
+                                  for second, hits_by_section in state['open_seconds'].items()}
+            self._closed = state['closed']
+            self.newest = state['newest']
+
+    def get_ring(self, from_timestamp: int) -> RollupRing:
+        """
+        The finest ring that keeps from_timestamp (the coarsest one when none keeps it)
+        """
+        newest = self.newest or 0
+        for ring in self.rings:
+            if newest - from_timestamp < ring.retention:
+                return ring
+        return self.rings[-1]
+
+    def get_ring_by_resolution(self, resolution: int) -> RollupRing:
+        ring = next((ring for ring in self.rings if ring.resolution == resolution), None)
+        if ring is None:
+            raise ValueError(f'There is no rollup with a resolution of {resolution} seconds')
+        return ring
+
+    def get_buckets(self, from_timestamp: int, to_timestamp: int = None,
+                    resolution: int = None) -> List[RollupBucket]:
+        """
+        The buckets of the range at a resolution (by default the finest one that keeps from_timestamp)
+        """
+        if to_timestamp is None:
+            to_timestamp = self.newest or 0
+        if resolution is None:
+            ring = self.get_ring(from_timestamp)
+        else:
+            ring = self.get_ring_by_resolution(resolution)
+        with self._lock:
+            return ring.get_buckets(from_timestamp, to_timestamp)
+
+    def get_history(self, resolution: int) -> List[RollupBucket]:
+        """
+        All the buckets kept at a resolution, up to the newest request
+        """
+        ring = self.get_ring_by_resolution(resolution)
+        if self.newest is None:
+            return []
+        return self.get_buckets(self.newest - ring.retention + 1, self.newest, resolution)
+
+    def get_summary(self, from_timestamp: int, to_timestamp: int = None) -> RollupBucket:
+        """
+        The hits, hits by status and top sections of the range merged in a single bucket
+        """
+        if to_timestamp is None:
+            to_timestamp = self.newest or 0
+        summary = RollupBucket(from_timestamp, to_timestamp - from_timestamp + 1)
+        ring = self.get_ring(from_timestamp)
+        with self._lock:
+            for bucket in ring.get_buckets(from_timestamp, to_timestamp):
+                summary.add(bucket)
+        return summary
+
+    def get_hits(self, from_timestamp: int, to_timestamp: int) -> int:
+        return self.get_summary(from_timestamp, to_timestamp).hits
+
+    def _open_second(self, unix_timestamp: int) -> Dict[str, Dict[str, int]]:
+        """
+        Opens the second of a new timestamp (the next open second for a timestamp already closed)
+        and closes the seconds that are now log_delay seconds older than the newest one
+        """
+        if self._closed is not None and unix_timestamp <= self._closed:
+            unix_timestamp = self._closed + 1
+            hits_by_section = self._open_seconds.get(unix_timestamp)
+            if hits_by_section is not None:
+                return hits_by_section
+
+        if self.newest is None or unix_timestamp > self.newest:
+            self.newest = unix_timestamp
+            self._close_until(unix_timestamp - self.log_delay)
+        hits_by_section = self._open_seconds[unix_timestamp] = {}
+        return hits_by_section
+
+    def _close_until(self, last_second: int):
+        if self._closed is None:
+            if not self._open_seconds:
+                return
+            self._closed = min(self._open_seconds) - 1
+
+        if last_second <= self._closed:
+            return
+
+        with self._lock:
+            for second in sorted(second for second in self._open_seconds if second <= last_second):
+                self._close_second(second, self._open_seconds.pop(second))
+        self._closed = last_second
+
+    def _close_second(self, second: int, hits_by_section: Dict[str, Dict[str, int]]):
+        closed = RollupBucket(second, 1)
+        hits_by_status = closed.hits_by_status
+        for section, section_hits in hits_by_section.items():
+            for status, hits in section_hits.items():
+                hits_by_status[status] = hits_by_status.get(status, 0) + hits
+            closed.hits_by_section[section] = sum(section_hits.values())
+        closed.hits = sum(closed.hits_by_section.values())
+
+        self._add_bucket(0, closed)
+
+    def _add_bucket(self, index: int, bucket: RollupBucket):
+        """
+        Adds a complete bucket to the ring of index, when it opens a new bucket of the ring
+        the previous one is complete too and it is added to the next coarser ring
+        """
+        ring = self.rings[index]
+        if bucket.resolution == ring.resolution:
+            ring.set_bucket(bucket)
+            self._close_bucket(index, bucket)
+            return
+
+        ring_bucket = ring.get_bucket(bucket.start)
+        ring_bucket.add(bucket)
+        open_bucket = self._open_buckets[index]
+        if open_bucket is not ring_bucket:
+            self._open_buckets[index] = ring_bucket
+            if open_bucket is not None:
+                self._close_bucket(index, open_bucket)
+
+    def _close_bucket(self, index: int, bucket: RollupBucket):
+        if index + 1 < len(self.rings):
+            self._add_bucket(index + 1, bucket)
+        bucket.truncate(self.top_sections)
@@ -0,0 +1,218 @@
+from src.config import LOG_DELAY
+from src.event.event import RuleStateChangeEvent
+from src.model.server import Observable
+from src.state_machine.state import RuleState
+from typing import Dict, List, Optional
+import json
+
+
+class AlertRule:
+    """
+    A rule evaluated each second over the last window seconds
+
+    - metric: hits -> average hits by second, errors -> average 5xx hits by second,
+    error_ratio -> 5xx hits / hits
+    - section: only the hits of this section (all the sections by default)
+    - condition: above -> alert while the value >= threshold, below -> alert while the value < threshold
+    (e.g. low traffic), a below rule is only evaluated once its first window is complete
+    """
+    METRICS = ('hits', 'errors', 'error_ratio')
+    CONDITIONS = ('above', 'below')
+
+    def __init__(self, name: str, window: int, threshold: float, metric: str = 'hits', section: str = None,
+                 condition: str = 'above'):
+        if metric not in self.METRICS:
+            raise ValueError(f'Unknown metric {metric} on rule {name}')
+        if condition not in self.CONDITIONS:
+            raise ValueError(f'Unknown condition {condition} on rule {name}')
+        if not isinstance(window, int) or isinstance(window, bool):
+            raise ValueError(f'The window of rule {name} must be an integer number of seconds')
+        if not isinstance(threshold, (int, float)) or isinstance(threshold, bool):
+            raise ValueError(f'The threshold of rule {name} must be a number')
+        if window < 1:
+            raise ValueError(f'The window of rule {name} must be at least 1 second')
+
+        self.name = name
+        self.window = window
+        self.threshold = threshold
+        self.metric = metric
+        self.section = section
+        self.condition = condition
+
+    def get_value(self, hits: int, errors: int) -> float:
+        if self.metric == 'hits':
+            return hits / self.window
+        if self.metric == 'errors':
+            return errors / self.window
+        return errors / hits if hits else 0
+
+    def is_triggered(self, value: float) -> bool:
+        if self.condition == 'above':
+            return value >= self.threshold
+        return value < self.threshold
+
+
+def load_rules(file_path: str) -> List[AlertRule]:
+    """
+    Loads the rules of a JSON file:
+        {"rules": [{"name": "high_traffic", "window": 120, "threshold": 10}, ...]}
+    """
+    with open(file_path, 'r') as rules_file:
+        config = json.load(rules_file)
+
+    rules = [AlertRule(**rule) for rule in config.get('rules', [])]
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError('The names of the rules must be unique')
+    return rules
+
+
+class RuleEngine(Observable):
+    """
+    Evaluates many AlertRule at once over a single histogram of hits and 5xx hits by second
+
+    - Each request only increments the counters of its second (and of its section when a rule uses it),
+    the cost by request doesn't depend on the number of rules
+    - A second is closed when a request is LOG_DELAY seconds newer (the lines out of order within LOG_DELAY
+    are counted on their second), a request older than the closed seconds is counted on the next open second
+    - When a second is closed its counters are added to a ring of prefix sums (as long as the longest window),
+    so the hits of any window are prefix[second] - prefix[second - window] and each rule is evaluated in O(1)
+    - Each rule keeps its own state (GOOD or ALERT) and a RuleStateChangeEvent is fired on each transition
+    - get_state / set_state keep the states, the ring and the open seconds on a checkpoint (the sections are
+    kept as [section, counters] pairs, the counters of all the sections have no section)
+    """
+    def __init__(self, rules: List[AlertRule], log_delay: int = LOG_DELAY):
+        if not rules:
+            raise ValueError('The rule engine needs at least one rule')
+
+        self.rules = rules
+        self.log_delay = log_delay
+        self.states = {rule.name: RuleState.GOOD for rule in rules}
+        self._size = max(rule.window for rule in rules) + 1
+        self._sections = {rule.section for rule in rules if rule.section is not None}
+        self._hits_prefix = {key: [0] * self._size for key in self._sections | {None}}
+        self._errors_prefix = {key: [0] * self._size for key in self._sections | {None}}
+        self._open_seconds: Dict[int, Dict[Optional[str], List[int]]] = {}
+        self._first = None
+        self._closed = None
+        self._newest = None
+
+    def append(self, unix_timestamp: int, section: str, status: str, hits: int = 1):
+        if self._closed is not None and unix_timestamp <= self._closed:
+            unix_timestamp = self._closed + 1
+
+        counters = self._open_seconds.get(unix_timestamp)
+        if counters is None:
+            counters = self._open_seconds[unix_timestamp] = {}
+
+        errors = hits if status[:1] == '5' else 0
+        self._add(counters, None, hits, errors)
+        if section in self._sections:
+            self._add(counters, section, hits, errors)
+
+        if self._newest is None or unix_timestamp > self._newest:
+            self._newest = unix_timestamp
+            self._close_until(unix_timestamp - self.log_delay)
+
+    def append_run(self, unix_timestamp: int, hits_by_section: Dict[str, Dict[str, int]]):
+        for section, section_hits in hits_by_section.items():
+            for status, hits in section_hits.items():
+                self.append(unix_timestamp, section, status, hits)
+
+    def flush(self):
+        """
+        Closes the open seconds (at the end of the input)
+        """
+        if self._newest is not None:
+            self._close_until(self._newest)
+
+    def get_state(self) -> dict:
+        return {
+            'states': {name: rule_state.name for name, rule_state in self.states.items()},
+            'hits_prefix': [[key, list(prefix)] for key, prefix in self._hits_prefix.items()],
+            'errors_prefix': [[key, list(prefix)] for key, prefix in self._errors_prefix.items()],
+            'open_seconds': {second: [[key, list(key_counters)] for key, key_counters in counters.items()]
+                             for second, counters in self._open_seconds.items()},
+            'first': self._first,
+            'closed': self._closed,
+            'newest': self._newest,
+        }
+
+    def set_state(self, state: dict):
+        """
+        Restores a checkpoint of the same rules (the rules that are not on it start GOOD)
+        """
+        for name, rule_state in state['states'].items():
+            if name in self.states:
+                self.states[name] = RuleState[rule_state]
+        for prefixes, saved_prefixes in ((self._hits_prefix, state['hits_prefix']),
+                                         (self._errors_prefix, state['errors_prefix'])):
+            for key, prefix in saved_prefixes:
+                if key in prefixes and len(prefix) == self._size:
+                    prefixes[key] = prefix
+        self._open_seconds = {int(second): {key: key_counters for key, key_counters in counters}
+                              for second, counters in state['open_seconds'].items()}
+        self._first = state['first']
+        self._closed = state['closed']
+        self._newest = state['newest']
+
+    @staticmethod
+    def _add(counters: dict, key: Optional[str], hits: int, errors: int):
+        key_counters = counters.get(key)
+        if key_counters is None:
+            counters[key] = [hits, errors]
+        else:
+            key_counters[0] += hits
+            key_counters[1] += errors
+
+    def _close_until(self, last_second: int):
+        if self._closed is None:
+            if not self._open_seconds:
+                return
+            self._first = min(self._open_seconds)
+            self._closed = self._first - 1
+
+        empty_seconds = 0
+        second = self._closed + 1
+        while second <= last_second:
+            counters = self._open_seconds.pop(second, None)
+            empty_seconds = 0 if counters else empty_seconds + 1
+            self._close_second(second, counters or {})
+
+            if empty_seconds >= self._size:
+                # every window is empty, the ring doesn't change until the next second with hits
+                next_second = min((open_second for open_second in self._open_seconds if open_second <= last_second),
+                                  default=last_second + 1)
+                second = max(second, next_second - 1)
+                empty_seconds = 0
+                self._closed = second
+            second += 1
+
+        self._closed = max(self._closed, last_second)
+
+    def _close_second(self, second: int, counters: dict):
+        index = second % self._size
+        previous_index = (second - 1) % self._size
+        for key, hits_prefix in self._hits_prefix.items():
+            hits, errors = counters.get(key, (0, 0))
+            errors_prefix = self._errors_prefix[key]
+            hits_prefix[index] = hits_prefix[previous_index] + hits
+            errors_prefix[index] = errors_prefix[previous_index] + errors
+
+        for rule in self.rules:
+            if rule.condition == 'below' and second - self._first + 1 < rule.window:
+                continue
+
+            hits_prefix = self._hits_prefix[rule.section]
+            errors_prefix = self._errors_prefix[rule.section]
+            window_index = (second - rule.window) % self._size
+            value = rule.get_value(hits_prefix[index] - hits_prefix[window_index],
+                                   errors_prefix[index] - errors_prefix[window_index])
+            self._set_rule_state(rule, RuleState.ALERT if rule.is_triggered(value) else RuleState.GOOD, value, second)
+
+    def _set_rule_state(self, rule: AlertRule, rule_state: RuleState, value: float, second: int):
+        if self.states[rule.name] == rule_state:
+            return
+
+        self.states[rule.name] = rule_state
+        self.notify(RuleStateChangeEvent(rule.name, rule_state, value, second))
@@ -0,0 +1,313 @@
+from src.config import STORE_BATCH_SIZE, STORE_FLUSH_INTERVAL, STORE_JSONL_MAX_BYTES, STORE_JSONL_BACKUPS
+from src.event.event import RuleStateChangeEvent, SourceStatsEvent, StateChangeEvent, StatsEvent
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import closing
+from typing import List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import urllib.request
+
+HIGH_TRAFFIC_ALERT = 'high_traffic'
+MIN_TIMESTAMP = 0
+MAX_TIMESTAMP = 2 ** 62
+
+
+def get_range(from_timestamp: Optional[int], to_timestamp: Optional[int]) -> Tuple[int, int]:
+    return (MIN_TIMESTAMP if from_timestamp is None else from_timestamp,
+            MAX_TIMESTAMP if to_timestamp is None else to_timestamp)
+
+
+def get_window_row(event: StatsEvent) -> dict:
+    return {
+        'type': 'stats',
+        'source': event.source if isinstance(event, SourceStatsEvent) else None,
+        'from_timestamp': event.from_timestamp,
+        'to_timestamp': event.to_timestamp,
+        'total_hits': event.total_hits,
+        'hits_by_status': event.hits_by_status,
+        'top_sections': [{
+            'section': stats.section,
+            'total_hits': stats.total_hits,
+            'hits_by_status': stats.hits_by_status,
+            'total_bytes': stats.response_bytes.sum if stats.response_bytes else None,
+            'p50_bytes': stats.get_bytes_quantile(0.5),
+            'p95_bytes': stats.get_bytes_quantile(0.95),
+            'p99_bytes': stats.get_bytes_quantile(0.99),
+        } for stats in event.top_sections],
+    }
+
+
+def get_alert_row(event) -> dict:
+    if isinstance(event, RuleStateChangeEvent):
+        return {'type': 'alert', 'name': event.rule_name, 'timestamp': event.timestamp,
+                'state': event.rule_state.name, 'value': event.value}
+    return {'type': 'alert', 'name': HIGH_TRAFFIC_ALERT, 'timestamp': event.timestamp,
+            'state': event.server_state.name, 'value': event.average_hits}
+
+
+class StatsStore(ABC):
+    """
+    Subscriber that keeps the windows (StatsEvent) and the alert transitions (StateChangeEvent and
+    RuleStateChangeEvent) on disk, so they can be queried after the screen has shown them
+
+    - The subscriber methods only append the event to a queue, a writer thread takes up to batch_size
+    events (or the events of flush_interval seconds) and writes them at once (a single transaction
+    with SQLite), so the agent never waits for the disk
+    - close() writes the pending events and stops the writer, an error of the disk stops the writer
+    and it is kept on error
+
+    query_alerts and query_top_sections read the stored rows of a time range, the top sections
+    are the sum of the top sections of each window of the range, they raise a ValueError when the
+    path is not a store
+    """
+    def __init__(self, path: str, batch_size: int = STORE_BATCH_SIZE, flush_interval: float = STORE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written_rows = 0
+        self.written_batches = 0
+        self.error: Optional[Exception] = None
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._writer_thread = None
+
+    def start(self):
+        self._writer_thread = threading.Thread(target=self._write)
+        self._writer_thread.start()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._writer_thread:
+            self._writer_thread.join()
+
+    def on_new_stats(self, event: StatsEvent):
+        self._put(event)
+
+    def on_server_state_change(self, event: StateChangeEvent):
+        self._put(event)
+
+    def on_rule_state_change(self, event: RuleStateChangeEvent):
+        self._put(event)
+
+    @abstractmethod
+    def query_alerts(self, from_timestamp: int = None, to_timestamp: int = None) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def query_top_sections(self, from_timestamp: int = None, to_timestamp: int = None,
+                           limit: int = 5) -> List[Tuple[str, int]]:
+        pass
+
+    def _put(self, event):
+        if self.error:
+            return
+
+        with self._condition:
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _write(self):
+        try:
+            self._open()
+        except (OSError, sqlite3.Error) as error:
+            self.error = error
+            return
+
+        try:
+            while True:
+                with self._condition:
+                    if not self._closed and len(self._pending) < self.batch_size:
+                        self._condition.wait(self.flush_interval)
+                    events = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+                    done = self._closed and not self._pending
+
+                if events:
+                    self._write_rows([get_window_row(event) if isinstance(event, StatsEvent) else get_alert_row(event)
+                                      for event in events])
+                    self.written_rows += len(events)
+                    self.written_batches += 1
+                if done:
+                    return
+        except (OSError, sqlite3.Error) as error:
+            self.error = error
+        finally:
+            self._close_storage()
+
+    @abstractmethod
+    def _open(self):
+        pass
+
+    @abstractmethod
+    def _write_rows(self, rows: List[dict]):
+        pass
+
+    @abstractmethod
+    def _close_storage(self):
+        pass
+
+
+class SQLiteStore(StatsStore):
+    """
+    Keeps the rows on a SQLite database, a row by window (windows), a row by top section of each
+    window (sections) and a row by alert transition (alerts), indexed by timestamp
+
+    The queries open the database read only, so they never create the file or the tables
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS windows (
+            from_timestamp INTEGER, to_timestamp INTEGER, source TEXT, total_hits INTEGER, hits_by_status TEXT);
+        CREATE TABLE IF NOT EXISTS sections (
+            from_timestamp INTEGER, to_timestamp INTEGER, source TEXT, section TEXT, total_hits INTEGER,
+            hits_by_status TEXT, total_bytes INTEGER, p50_bytes REAL, p95_bytes REAL, p99_bytes REAL);
+        CREATE TABLE IF NOT EXISTS alerts (timestamp INTEGER, name TEXT, state TEXT, value REAL);
+        CREATE INDEX IF NOT EXISTS windows_timestamp ON windows (from_timestamp);
+        CREATE INDEX IF NOT EXISTS sections_timestamp ON sections (from_timestamp);
+        CREATE INDEX IF NOT EXISTS alerts_timestamp ON alerts (timestamp);
+    '''
+
+    def __init__(self, path: str, batch_size: int = STORE_BATCH_SIZE, flush_interval: float = STORE_FLUSH_INTERVAL):
+        super().__init__(path, batch_size, flush_interval)
+        self._connection = None
+
+    def query_alerts(self, from_timestamp: int = None, to_timestamp: int = None) -> List[dict]:
+        rows = self._query('SELECT timestamp, name, state, value FROM alerts WHERE timestamp BETWEEN ? AND ? '
+                           'ORDER BY timestamp, rowid', get_range(from_timestamp, to_timestamp))
+        return [{'timestamp': timestamp, 'name': name, 'state': state, 'value': value}
+                for timestamp, name, state, value in rows]
+
+    def query_top_sections(self, from_timestamp: int = None, to_timestamp: int = None,
+                           limit: int = 5) -> List[Tuple[str, int]]:
+        return self._query('SELECT section, SUM(total_hits) AS hits FROM sections '
+                           'WHERE from_timestamp >= ? AND to_timestamp <= ? AND source IS NULL '
+                           'GROUP BY section ORDER BY hits DESC, section LIMIT ?',
+                           (*get_range(from_timestamp, to_timestamp), limit))
+
+    def _query(self, sql: str, parameters: tuple) -> list:
+        uri = f'file:{urllib.request.pathname2url(os.path.abspath(self.path))}?mode=ro'
+        try:
+            with closing(sqlite3.connect(uri, uri=True)) as connection:
+                return connection.execute(sql, parameters).fetchall()
+        except sqlite3.Error as error:
+            raise ValueError(f'{self.path} is not a store: {error}') from error
+
+    def _open(self):
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript(self.SCHEMA)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+
+    def _write_rows(self, rows: List[dict]):
+        windows, sections, alerts = [], [], []
+        for row in rows:
+            if row['type'] == 'alert':
+                alerts.append((row['timestamp'], row['name'], row['state'], row['value']))
+                continue
+
+            window = (row['from_timestamp'], row['to_timestamp'], row['source'])
+            windows.append((*window, row['total_hits'], json.dumps(row['hits_by_status'])))
+            sections.extend((*window, section['section'], section['total_hits'], json.dumps(section['hits_by_status']),
+                             section['total_bytes'], section['p50_bytes'], section['p95_bytes'],
+                             section['p99_bytes']) for section in row['top_sections'])
+
+        with self._connection:
+            self._connection.executemany('INSERT INTO windows VALUES (?, ?, ?, ?, ?)', windows)
+            self._connection.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', sections)
+            self._connection.executemany('INSERT INTO alerts VALUES (?, ?, ?, ?)', alerts)
+
+    def _close_storage(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+
+class JsonlStore(StatsStore):
+    """
+    Keeps the rows as JSON lines, when the file is bigger than max_bytes it is renamed to path.1
+    (path.1 to path.2 ...) and at most backups old files are kept
+    """
+    def __init__(self, path: str, batch_size: int = STORE_BATCH_SIZE, flush_interval: float = STORE_FLUSH_INTERVAL,
+                 max_bytes: int = STORE_JSONL_MAX_BYTES, backups: int = STORE_JSONL_BACKUPS):
+        super().__init__(path, batch_size, flush_interval)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+
+    def query_alerts(self, from_timestamp: int = None, to_timestamp: int = None) -> List[dict]:
+        from_timestamp, to_timestamp = get_range(from_timestamp, to_timestamp)
+        return [{key: row[key] for key in ('timestamp', 'name', 'state', 'value')} for row in self._read_rows()
+                if row['type'] == 'alert' and from_timestamp <= row['timestamp'] <= to_timestamp]
+
+    def query_top_sections(self, from_timestamp: int = None, to_timestamp: int = None,
+                           limit: int = 5) -> List[Tuple[str, int]]:
+        from_timestamp, to_timestamp = get_range(from_timestamp, to_timestamp)
+        hits_by_section = {}
+        for row in self._read_rows():
+            if row['type'] != 'stats' or row['source'] is not None or \
+                    row['from_timestamp'] < from_timestamp or row['to_timestamp'] > to_timestamp:
+                continue
+            for section in row['top_sections']:
+                hits_by_section[section['section']] = hits_by_section.get(section['section'], 0) + section['total_hits']
+
+        return sorted(hits_by_section.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def _get_file_paths(self) -> List[str]:
+        """
+        The files from the oldest to the newest
+        """
+        file_paths = [f'{self.path}.{backup}' for backup in range(self.backups, 0, -1)] + [self.path]
+        return [file_path for file_path in file_paths if os.path.exists(file_path)]
+
+    def _read_rows(self):
+        for file_path in self._get_file_paths():
+            with open(file_path, 'r') as store_file:
+                for line in store_file:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError as error:
+                        raise ValueError(f'{file_path} is not a store: {error}') from error
+                    if not isinstance(row, dict) or row.get('type') not in ('stats', 'alert'):
+                        raise ValueError(f'{file_path} is not a store: unknown row {line.strip()[:80]}')
+                    yield row
+
+    def _open(self):
+        self._file = open(self.path, 'a')
+
+    def _write_rows(self, rows: List[dict]):
+        self._file.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        for backup in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{backup}'):
+                os.replace(f'{self.path}.{backup}', f'{self.path}.{backup + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a')
+
+    def _close_storage(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def get_store(path: str) -> StatsStore:
+    """
+    A JsonlStore for a .jsonl path and a SQLiteStore otherwise
+    """
+    if path.endswith('.jsonl'):
+        return JsonlStore(path)
+    return SQLiteStore(path)
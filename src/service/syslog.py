@@ -0,0 +1,308 @@
+from src.config import SYSLOG_BATCH_SIZE, SYSLOG_FLUSH_INTERVAL, SYSLOG_QUEUE_SIZE
+from typing import Iterator, List, Optional, Tuple
+import asyncio
+import queue
+import re
+import socket
+import threading
+
+_END = object()
+# <PRI>VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID, followed by the structured data and the message
+RFC5424_HEADER = re.compile(rb'<\d{1,3}>\d{1,2} \S+ \S+ \S+ \S+ \S+ ')
+BOM = b'\xef\xbb\xbf'
+
+
+def get_log_line(message: bytes) -> Optional[str]:
+    """
+    The access log line of a syslog message (RFC 3164 or RFC 5424), the priority and the header
+    are dropped
+
+    - RFC 5424: the PRI, the VERSION and the five fields of the header are skipped, then the structured
+    data (`-` or one or more [SD-ID PARAM="VALUE" ...] elements, the values can have quotes and brackets
+    escaped), the message is the line
+    - RFC 3164 (or a line without header): the header has no double quotes, the line starts at the first
+    double quote (the quoted remotehost)
+    """
+    message = message.rstrip(b'\r\n')
+    header = RFC5424_HEADER.match(message)
+    if header:
+        start = _skip_structured_data(message, header.end())
+        if start is None:
+            return None
+        log_line = message[start:]
+        if log_line.startswith(b' '):
+            log_line = log_line[1:]
+        if log_line.startswith(BOM):
+            log_line = log_line[len(BOM):]
+        return log_line.decode('utf-8', errors='replace') if log_line.startswith(b'"') else None
+
+    start = message.find(b'"')
+    if start < 0:
+        return None
+    return message[start:].decode('utf-8', errors='replace')
+
+
+def _skip_structured_data(message: bytes, start: int) -> Optional[int]:
+    """
+    Returns the offset after the structured data of a RFC 5424 message, None when it is not valid
+    """
+    if message[start:start + 1] == b'-':
+        return start + 1
+    if message[start:start + 1] != b'[':
+        return None
+
+    in_value = False
+    escaped = False
+    for offset in range(start, len(message)):
+        character = message[offset:offset + 1]
+        if escaped:
+            escaped = False
+        elif character == b'\\':
+            escaped = in_value
+        elif character == b'"':
+            in_value = not in_value
+        elif character == b']' and not in_value and message[offset + 1:offset + 2] != b'[':
+            return offset + 1
+    return None
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, reader: 'SyslogReader'):
+        self._reader = reader
+
+    def datagram_received(self, data: bytes, address):
+        self._reader.add_messages(data.split(b'\n'), udp=True)
+
+
+class _TcpProtocol(asyncio.Protocol):
+    """
+    Splits the stream in messages, with octet counting framing ("LENGTH MESSAGE", RFC 6587)
+    when a frame starts with a digit and by new lines otherwise
+    """
+    def __init__(self, reader: 'SyslogReader'):
+        self._reader = reader
+        self._buffer = b''
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._reader.add_transport(transport)
+
+    def connection_lost(self, error):
+        if self._buffer:
+            self._reader.add_messages([self._buffer])
+        self._reader.remove_transport(self._transport)
+
+    def data_received(self, data: bytes):
+        buffer = self._buffer + data
+        messages = []
+        position = 0
+
+        while position < len(buffer):
+            if buffer[position:position + 1].isdigit():
+                space = buffer.find(b' ', position)
+                if space < 0 or not buffer[position:space].isdigit():
+                    break
+                end = space + 1 + int(buffer[position:space])
+                if end > len(buffer):
+                    break
+                messages.append(buffer[space + 1:end])
+                position = end
+                continue
+
+            end = buffer.find(b'\n', position)
+            if end < 0:
+                break
+            messages.append(buffer[position:end])
+            position = end + 1
+
+        self._buffer = buffer[position:]
+        self._reader.add_messages(messages)
+
+
+class SyslogReader:
+    """
+    Receives access log lines as syslog messages over UDP and TCP and returns them in batches
+    like the LogTail, so the agent processes them on the same pipeline as the lines of a file
+
+    - The sockets are served by an asyncio event loop on its own thread, the lines are grouped in
+    batches of batch_size lines (or the lines received in flush_interval seconds) and put on a queue
+    of queue_size batches read by the agent
+    - When the queue is full (the agent is slower than the senders) the TCP connections stop being
+    read, so the senders are slowed down by TCP flow control, and the UDP lines are dropped
+    and counted on dropped_lines (UDP has no backpressure)
+    - batches() yields an empty batch each flush_interval without lines, so the reader can act
+    while there is no traffic (e.g. advance the watermark of the stats windows)
+
+    start() binds the ports (0 for a free port, None to not listen), the bound addresses are
+    udp_address and tcp_address, the UDP socket asks for a receive buffer of UDP_RECEIVE_BUFFER bytes
+    so the bursts are not dropped by the kernel before the event loop reads them
+    """
+    UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, host: str = '127.0.0.1', udp_port: Optional[int] = None, tcp_port: Optional[int] = None,
+                 batch_size: int = SYSLOG_BATCH_SIZE, flush_interval: float = SYSLOG_FLUSH_INTERVAL,
+                 queue_size: int = SYSLOG_QUEUE_SIZE):
+        if udp_port is None and tcp_port is None:
+            raise ValueError('The syslog reader needs an UDP or a TCP port')
+
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.udp_address: Optional[Tuple[str, int]] = None
+        self.tcp_address: Optional[Tuple[str, int]] = None
+        self.received_lines = 0
+        self.dropped_lines = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending: List[str] = []
+        self._transports = set()
+        self._paused = False
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self._stopped = threading.Event()
+        self._error = None
+
+    @property
+    def name(self) -> str:
+        return f'syslog://{self.host}'
+
+    def start(self):
+        if self._thread:
+            return
+
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error:
+            raise self._error
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+
+        self._stopped.set()
+        if self._loop and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            except RuntimeError:
+                # the loop was closed meanwhile
+                pass
+
+    def batches(self) -> Iterator[List[str]]:
+        self.start()
+
+        try:
+            while True:
+                try:
+                    batch = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    if self._stopped.is_set():
+                        return
+                    yield []
+                    continue
+
+                if batch is _END:
+                    return
+                yield batch
+        finally:
+            self.stop()
+            self._thread.join()
+
+    def add_messages(self, messages: List[bytes], udp: bool = False):
+        """
+        Called by the protocols on the event loop thread
+        """
+        lines = [line for line in map(get_log_line, messages) if line is not None]
+        if not lines:
+            return
+
+        self.received_lines += len(lines)
+        if self._paused and udp:
+            self.dropped_lines += len(lines)
+            return
+
+        self._pending.extend(lines)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def add_transport(self, transport):
+        self._transports.add(transport)
+        if self._paused:
+            transport.pause_reading()
+
+    def remove_transport(self, transport):
+        self._transports.discard(transport)
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        try:
+            self._queue.put_nowait(self._pending)
+        except queue.Full:
+            if not self._paused:
+                self._paused = True
+                for transport in self._transports:
+                    transport.pause_reading()
+            return
+
+        self._pending = []
+        if self._paused:
+            self._paused = False
+            for transport in self._transports:
+                transport.resume_reading()
+
+    def _flush_periodically(self):
+        self._flush()
+        self._loop.call_later(self.flush_interval, self._flush_periodically)
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        servers = []
+        try:
+            try:
+                if self.udp_port is not None:
+                    transport, _ = self._loop.run_until_complete(self._loop.create_datagram_endpoint(
+                        lambda: _UdpProtocol(self), local_addr=(self.host, self.udp_port)))
+                    self.udp_address = transport.get_extra_info('sockname')[:2]
+                    transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                                                  self.UDP_RECEIVE_BUFFER)
+                    servers.append(transport)
+                if self.tcp_port is not None:
+                    server = self._loop.run_until_complete(self._loop.create_server(
+                        lambda: _TcpProtocol(self), self.host, self.tcp_port))
+                    self.tcp_address = server.sockets[0].getsockname()[:2]
+                    servers.append(server)
+            except OSError as error:
+                self._error = error
+                return
+            finally:
+                self._started.set()
+
+            self._loop.call_later(self.flush_interval, self._flush_periodically)
+            if not self._stopped.is_set():
+                self._loop.run_forever()
+        finally:
+            for server in servers:
+                server.close()
+            for transport in list(self._transports):
+                transport.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+            self._put_last_batches()
+
+    def _put_last_batches(self):
+        """
+        Queues the pending lines and the end of the batches, the agent drains the queue
+        when there is no room for the end
+        """
+        try:
+            if self._pending:
+                self._queue.put_nowait(self._pending)
+                self._pending = []
+            self._queue.put_nowait(_END)
+        except queue.Full:
+            self.dropped_lines += len(self._pending)
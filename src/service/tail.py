@@ -0,0 +1,261 @@
+from src.config import READ_CHUNK_SIZE, FOLLOW_MIN_POLL, FOLLOW_MAX_POLL
+from ctypes.util import find_library
+from typing import Iterator, List, Optional, Union
+import ctypes
+import os
+import select
+import threading
+import time
+
+CSV_HEADER_PREFIX = '"remotehost"'
+
+
+def is_csv_header(line: Union[str, bytes]) -> bool:
+    """
+    True when the (first) line is the CSV header of the log, every reader skips the first line of
+    a file only when it is the header so a file without header keeps its first request
+    """
+    if isinstance(line, bytes):
+        return line.startswith(CSV_HEADER_PREFIX.encode())
+    return line.startswith(CSV_HEADER_PREFIX)
+
+
+class Inotify:
+    """
+    Minimal inotify binding (Linux only) used to wake up the LogTail when the
+    directory of the log file changes, is_available() returns False on other platforms
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    _libc = None
+
+    def __init__(self, directory: str):
+        self._fd = self._get_libc().inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        if self._get_libc().inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            libc = cls._get_libc()
+        except OSError:
+            return False
+        return hasattr(libc, 'inotify_init1')
+
+    @classmethod
+    def _get_libc(cls):
+        if cls._libc is None:
+            cls._libc = ctypes.CDLL(find_library('c'), use_errno=True)
+        return cls._libc
+
+    def wait(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class LogTail:
+    """
+    This class will read a log file in batches of lines, reading chunks of READ_CHUNK_SIZE bytes
+    instead of one readline() per line
+
+    - Without follow it will stop when reach the end of the file
+    - With follow it will wait for new lines like `tail -F`, using inotify where available
+    and an adaptive poll otherwise (from FOLLOW_MIN_POLL doubling up to FOLLOW_MAX_POLL)
+
+    The file is checked when there is no new data:
+        - logrotate rename/create -> the inode of the path changed, we finish the old file and open the new one
+        - copytruncate -> the size is lower than our offset, we read again from the beginning
+
+    start_offset starts reading from a line offset (e.g. the line_offset of a checkpoint) instead of the beginning
+    and end_offset stops at a line offset (e.g. the offsets of a TimestampIndex) instead of the end of the file
+
+    With skip_header the first line of the file (also after a rotation or a truncation) is dropped only
+    when it is the CSV header (it starts with CSV_HEADER_PREFIX)
+
+    With idle_batches and follow it yields an empty batch each time it waits for new lines,
+    so the reader can act while the file is quiet (e.g. advance the watermark of the stats windows)
+    """
+    def __init__(self, file_path: str, follow: bool = False, skip_header: bool = True,
+                 chunk_size: int = READ_CHUNK_SIZE, min_poll: float = FOLLOW_MIN_POLL, max_poll: float = FOLLOW_MAX_POLL,
+                 start_offset: int = 0, end_offset: int = None, idle_batches: bool = False):
+        self.file_path = file_path
+        self.follow = follow
+        self.skip_header = skip_header
+        self.chunk_size = chunk_size
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.idle_batches = idle_batches
+        self.offset = 0
+        self._file = None
+        self._pending = b''
+        self._header_pending = False
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def line_offset(self) -> int:
+        """
+        The offset after the last complete line returned
+        """
+        return self.offset - len(self._pending)
+
+    def get_fingerprint(self) -> dict:
+        """
+        The inode and size of the file being read (or of the path when it is not open)
+        """
+        try:
+            stat = os.fstat(self._file.fileno()) if self._file else os.stat(self.file_path)
+        except OSError:
+            return {'inode': None, 'size': 0}
+        return {'inode': stat.st_ino, 'size': stat.st_size}
+
+    def batches(self) -> Iterator[List[str]]:
+        self._open(self.start_offset)
+        watcher = self._get_watcher()
+        poll = self.min_poll
+
+        try:
+            while not self._stopped.is_set():
+                lines = self._read_lines()
+                if lines is not None:
+                    poll = self.min_poll
+                    if lines:
+                        yield lines
+                    continue
+
+                if not self.follow:
+                    break
+
+                if self._is_rotated():
+                    lines = self._flush_pending()
+                    self._open()
+                    if lines:
+                        yield lines
+                    continue
+
+                if self._is_truncated():
+                    self._seek(0)
+                    continue
+
+                if self.idle_batches:
+                    yield []
+
+                if watcher:
+                    watcher.wait(self.max_poll)
+                else:
+                    self._stopped.wait(poll)
+                    poll = min(poll * 2, self.max_poll)
+
+            lines = self._flush_pending()
+            if lines and not self._stopped.is_set():
+                yield lines
+        finally:
+            if watcher:
+                watcher.close()
+            self._close()
+
+    def _get_watcher(self):
+        if not self.follow or not Inotify.is_available():
+            return None
+
+        try:
+            return Inotify(os.path.dirname(os.path.abspath(self.file_path)))
+        except OSError:
+            return None
+
+    def _open(self, offset: int = 0):
+        self._close()
+
+        while True:
+            try:
+                self._file = open(self.file_path, 'rb')
+                break
+            except FileNotFoundError:
+                if not self.follow or self._stopped.is_set():
+                    raise
+                time.sleep(self.min_poll)
+
+        self._seek(offset)
+
+    def _seek(self, offset: int):
+        self._file.seek(offset)
+        self.offset = offset
+        self._pending = b''
+        self._header_pending = self.skip_header and not offset
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self) -> Optional[List[str]]:
+        chunk_size = self.chunk_size
+        if self.end_offset is not None:
+            chunk_size = min(chunk_size, self.end_offset - self.offset)
+            if chunk_size <= 0:
+                return None
+
+        chunk = self._file.read(chunk_size)
+        if not chunk:
+            return None
+
+        self.offset += len(chunk)
+        data = self._pending + chunk
+        end = data.rfind(b'\n') + 1
+        self._pending = data[end:]
+
+        return self._decode(data[:end])
+
+    def _flush_pending(self) -> List[str]:
+        data, self._pending = self._pending, b''
+        return self._decode(data)
+
+    def _decode(self, data: bytes) -> List[str]:
+        if not data:
+            return []
+
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        if self._header_pending and lines:
+            self._header_pending = False
+            if is_csv_header(lines[0]):
+                lines = lines[1:]
+        return lines
+
+    def _is_rotated(self) -> bool:
+        try:
+            return os.stat(self.file_path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _is_truncated(self) -> bool:
+        try:
+            return os.fstat(self._file.fileno()).st_size < self.offset
+        except OSError:
+            return False
@@ -3,4 +3,8 @@ from enum import Enum, auto
 
 class ServerState(Enum):
     GOOD = auto()
-    HIGH_TRAFFIC = auto()
\ No newline at end of file
+    HIGH_TRAFFIC = auto()
+
+class RuleState(Enum):
+    GOOD = auto()
+    ALERT = auto()
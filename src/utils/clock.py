@@ -0,0 +1,67 @@
+from typing import Callable, Optional
+import time
+
+
+class Clock:
+    """
+    The wall clock, the lines are read as fast as possible and the screen waits real seconds
+    """
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def wait_until(self, unix_timestamp: int):
+        pass
+
+
+class ReplayClock(Clock):
+    """
+    Virtual clock driven by the timestamps of the log, the log is replayed speed times faster than it was written
+
+    - The first timestamp is anchored to the current wall time, wait_until blocks until the wall time of a
+    newer timestamp (the out of order lines, older than the newest one, don't wait)
+    - sleep waits seconds / speed, so the screen shows each window for SCREEN_INTERVAL seconds of the log
+    - With speed 0 (unbounded) nothing waits, the log is replayed as fast as possible and the screen
+    doesn't pause between the windows
+    - now() is the virtual time, the timestamp of the log that is being replayed
+
+    The monotonic and sleep functions can be replaced (e.g. a fake time on the tests)
+    """
+    def __init__(self, speed: float, monotonic: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if speed < 0:
+            raise ValueError('The replay speed can not be negative')
+
+        self.speed = speed
+        self.newest: Optional[int] = None
+        self.waited_seconds = 0.0
+        self._monotonic = monotonic
+        self._sleep = sleep
+        self._start = None
+
+    def now(self) -> Optional[float]:
+        if self._start is None or not self.speed:
+            return self.newest
+
+        log_start, wall_start = self._start
+        return log_start + (self._monotonic() - wall_start) * self.speed
+
+    def sleep(self, seconds: float):
+        if self.speed:
+            self._sleep(seconds / self.speed)
+
+    def wait_until(self, unix_timestamp: int):
+        if self.newest is not None and unix_timestamp <= self.newest:
+            return
+
+        self.newest = unix_timestamp
+        if self._start is None:
+            self._start = (unix_timestamp, self._monotonic())
+            return
+        if not self.speed:
+            return
+
+        log_start, wall_start = self._start
+        wait = wall_start + (unix_timestamp - log_start) / self.speed - self._monotonic()
+        if wait > 0:
+            self.waited_seconds += wait
+            self._sleep(wait)
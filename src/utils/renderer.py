@@ -0,0 +1,57 @@
+from src.config import SCREEN_FPS
+from typing import List
+import sys
+import time
+
+CURSOR_POSITION = '\x1b[{row};1H'
+CLEAR_LINE = '\x1b[K'
+CLEAR_BELOW = '\x1b[J'
+CLEAR_SCREEN = '\x1b[2J'
+
+
+class Renderer:
+    """
+    Draws frames (a list of lines) on the terminal
+
+    - Only the lines that changed since the last frame are rewritten, moving the cursor
+    to the line instead of clearing the whole screen
+    - A frame equal to the last one is not drawn
+    - The frames are drawn at most SCREEN_FPS times per second, render waits if needed
+    """
+    def __init__(self, output=None, fps: int = SCREEN_FPS):
+        self._output = output or sys.stdout
+        self._frame_interval = 1 / fps
+        self._last_frame = None
+        self._last_render = 0
+        self.rendered_frames = 0
+
+    def render(self, lines: List[str]):
+        if lines == self._last_frame:
+            return
+
+        wait = self._last_render + self._frame_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        self._output.write(self._get_diff(lines))
+        self._output.flush()
+        self._last_frame = list(lines)
+        self._last_render = time.monotonic()
+        self.rendered_frames += 1
+
+    def _get_diff(self, lines: List[str]) -> str:
+        if self._last_frame is None:
+            return CLEAR_SCREEN + CURSOR_POSITION.format(row=1) + \
+                ''.join(line + CLEAR_LINE + '\n' for line in lines)
+
+        output = []
+        for row, line in enumerate(lines):
+            if row < len(self._last_frame) and self._last_frame[row] == line:
+                continue
+            output.append(CURSOR_POSITION.format(row=row + 1) + line + CLEAR_LINE)
+
+        if len(lines) < len(self._last_frame):
+            output.append(CURSOR_POSITION.format(row=len(lines) + 1) + CLEAR_BELOW)
+
+        output.append(CURSOR_POSITION.format(row=len(lines) + 1))
+        return ''.join(output)
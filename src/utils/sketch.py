@@ -0,0 +1,220 @@
+from typing import Dict, Hashable, Iterable, List, Optional
+import heapq
+import math
+
+
+class HeavyHitter:
+    __slots__ = ('key', 'count', 'error', 'details')
+
+    def __init__(self, key: Hashable, count: int, error: int, details: Dict[str, int]):
+        self.key = key
+        self.count = count
+        self.error = error
+        self.details = details
+
+    def __repr__(self):
+        return f'HeavyHitter({self.key!r}, {self.count}, {self.error})'
+
+
+class SpaceSaving:
+    """
+    Space-Saving sketch, it keeps the counters of at most capacity keys whatever the number of distinct keys
+
+    - A key that is tracked is counted exactly from now on
+    - When a new key arrives and the sketch is full the key with the min count is replaced,
+    the new key starts with that count (error) so the counts are never lower than the real ones
+    and they are at most total / capacity higher (capacity = ceil(1 / error_rate))
+    - The min key is found with a MIN HEAP of the counts, the increments don't update the heap,
+    a stale entry (lower than its counter) is pushed again with its counter when it reaches the root,
+    so each update costs O(log capacity) amortized
+
+    Each key can keep the hits of its details (e.g. the hits by status of a section), they start
+    empty when the key replaces another one
+
+    The sketches can be merged (e.g. the sketches of each second of a window)
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._errors = {}
+        self._details = {}
+        self._heap = []
+
+    @classmethod
+    def from_error_rate(cls, error_rate: float) -> 'SpaceSaving':
+        return cls(math.ceil(1 / error_rate))
+
+    def add(self, key: Hashable, count: int = 1, detail: str = None):
+        self.total += count
+        counts = self._counts
+        current = counts.get(key)
+
+        if current is None:
+            error = 0
+            if len(counts) >= self.capacity:
+                error = self._evict_min()
+            current = counts[key] = error
+            self._errors[key] = error
+            self._details[key] = {}
+            heapq.heappush(self._heap, (error + count, key))
+
+        counts[key] = current + count
+        if detail is not None:
+            details = self._details[key]
+            details[detail] = details.get(detail, 0) + count
+
+    def merge(self, other: 'SpaceSaving'):
+        """
+        Adds the counters of other, a key missing on a full sketch could have been counted up to its min count,
+        so the min count is added to the count and error of the keys missing on the other sketch
+        """
+        own_min = self._get_min() if len(self._counts) >= self.capacity else 0
+        other_min = other._get_min() if len(other._counts) >= other.capacity else 0
+
+        merged = {}
+        for key in self._counts.keys() | other._counts.keys():
+            count = self._counts.get(key, own_min) + other._counts.get(key, other_min)
+            error = self._errors.get(key, own_min) + other._errors.get(key, other_min)
+            details = dict(self._details.get(key, {}))
+            for detail, hits in other._details.get(key, {}).items():
+                details[detail] = details.get(detail, 0) + hits
+            merged[key] = (count, error, details)
+
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0]))
+
+        self.total += other.total
+        self._counts = {key: count for key, (count, _, _) in merged.items()}
+        self._errors = {key: error for key, (_, error, _) in merged.items()}
+        self._details = {key: details for key, (_, _, details) in merged.items()}
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, k: int) -> List[HeavyHitter]:
+        """
+        The k keys with the highest counts, the ties are sorted by key
+        """
+        items = heapq.nsmallest(k, self._counts.items(), key=lambda item: (-item[1], item[0]))
+        return [HeavyHitter(key, count, self._errors[key], self._details[key]) for key, count in items]
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _get_min(self) -> int:
+        self._fix_root()
+        return self._heap[0][0]
+
+    def _evict_min(self) -> int:
+        self._fix_root()
+        count, key = heapq.heappop(self._heap)
+        del self._counts[key]
+        del self._errors[key]
+        del self._details[key]
+        return count
+
+    def _fix_root(self):
+        heap = self._heap
+        while True:
+            count, key = heap[0]
+            current = self._counts[key]
+            if current == count:
+                return
+            heapq.heapreplace(heap, (current, key))
+
+
+def merge_sketches(sketches: Iterable[SpaceSaving], capacity: int) -> SpaceSaving:
+    merged = SpaceSaving(capacity)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+class DDSketch:
+    """
+    DDSketch of positive values (e.g. the response bytes), the quantiles have a relative error of at most
+    relative_accuracy whatever the distribution and the number of values
+
+    - A value v is counted on the bucket ceil(log_gamma(v)) with gamma = (1 + accuracy) / (1 - accuracy),
+    every value of a bucket is within accuracy of its center so the quantile of any rank is too
+    - The values lower than min_value (e.g. 0 bytes) are counted apart
+    - When there are more than max_buckets buckets the lowest ones are collapsed in one, so the memory
+    is fixed and only the lowest quantiles lose their accuracy
+    - The sketches are merged adding the counts of the buckets (e.g. the seconds of a window,
+    the windows of an interval or the sketches of many workers)
+    """
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048, min_value: float = 1.0):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.zero_count = 0
+        self._buckets: Dict[int, int] = {}
+
+    def add(self, value: float, count: int = 1):
+        self.count += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value < self.min_value:
+            self.zero_count += count
+            return
+
+        index = math.ceil(math.log(value) * self._multiplier)
+        buckets = self._buckets
+        buckets[index] = buckets.get(index, 0) + count
+        if len(buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: 'DDSketch'):
+        if other.gamma != self.gamma:
+            raise ValueError('Only sketches with the same relative accuracy can be merged')
+        if not other.count:
+            return
+
+        self.count += other.count
+        self.sum += other.sum
+        self.zero_count += other.zero_count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        buckets = self._buckets
+        for index, count in other._buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        if len(buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        The value of rank q * (count - 1), None when the sketch is empty
+        """
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return self.min
+
+        seen = self.zero_count
+        value = self.max
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                break
+        return min(max(value, self.min), self.max)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _collapse(self):
+        indexes = sorted(self._buckets)
+        collapsed = indexes[:len(indexes) - self.max_buckets + 1]
+        self._buckets[collapsed[-1]] += sum(self._buckets.pop(index) for index in collapsed[:-1])
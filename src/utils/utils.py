@@ -1,153 +1,176 @@
-from src.config import SCREEN_INTERVAL, TOP_SECTIONS, THRESHOLD, ALERT_INTERVAL
-from src.event.event import StateChangeEvent, NewRequestsEvent
+from src.config import SCREEN_INTERVAL, SCREEN_QUEUE_SIZE, SCREEN_ALARMS_QUEUE_SIZE, SCREEN_IDLE_INTERVAL, THRESHOLD, ALERT_INTERVAL
+from src.event.event import StateChangeEvent, NewRequestsEvent, RuleStateChangeEvent, StatsEvent
 from src.model.server import Observable, Request, ServerStateMachine
-from src.state_machine.state import ServerState
+from src.model.stats import SectionTrafficStats
+from src.state_machine.state import RuleState, ServerState
+from src.utils.clock import Clock
+from src.utils.renderer import Renderer
 from collections import deque
 from columnar import columnar
-from typing import List, Dict
+from typing import Callable, List
 import click
 import heapq
-import time
+import math
 import threading
 from datetime import datetime
 
 
 class Screen:
-    class Stats:
-        class SectionTrafficStats:
-            def __init__(self, section: str):
-                self.hits_by_status = {}
-                self.section = section
-                self.total_hits = 0
-
-            def get_percentage_by_status(self, status):
-                status = str(status)
-                if status not in self.hits_by_status:
-                    return 0
-                total = (self.hits_by_status[status] / self.total_hits) * 100
-                return f"{total:.2f}%"
-
-            def add_request(self, request: Request):
-                self.hits_by_status.setdefault(request.status, 0)
-                self.hits_by_status[request.status] += 1
-                self.total_hits += 1
-
-            def __lt__(self, other):
-                return self.total_hits > other.total_hits
-
-        def __init__(self, requests: List[Request]):
-            self._requests = requests
-            self.from_request = requests[0] if self._requests else None
-            self.to_request = requests[-1] if self._requests else None
-            self._top_sections = []
-            self._process_stats()
-
-        def get_top_sections(self) -> List[SectionTrafficStats]:
-            return self._top_sections
-
-        def _process_stats(self):
-            stats = {}
-
-            for request in self._requests:
-                if request.section not in stats:
-                    section_stat = self.SectionTrafficStats(request.section)
-                    stats[request.section] = section_stat
-
-                section_stat = stats.get(request.section)
-                section_stat.add_request(request)
-
-            self._get_top_sections(stats)
-
-        def _get_top_sections(self, stats: Dict):
-            sections = [stat for stat in stats.values()]
-            heapq.heapify(sections)
-
-            self._top_sections = []
-            top_k = TOP_SECTIONS if len(sections) > TOP_SECTIONS else len(sections)
-
-            for i in range(top_k):
-                self._top_sections.append(heapq.heappop(sections))
-
-    def __init__(self):
+    """
+    Shows each StatsEvent during SCREEN_INTERVAL seconds with the alarms of its window
+
+    - The windows wait in a queue of SCREEN_QUEUE_SIZE, when the agent is faster than the
+    screen the oldest (stale) windows are dropped and counted on dropped_windows
+    - Every alarm of a window is shown with it (e.g. a HIGH_TRAFFIC alert and its recovery), the alarms
+    wait in a queue of SCREEN_ALARMS_QUEUE_SIZE, when it is full the oldest one is dropped and counted
+    on dropped_alarms
+    - The frames are drawn by the Renderer, rewriting only the changed lines at most SCREEN_FPS
+    times per second, while there is no data the thread waits instead of redrawing
+    - The rules of the RuleEngine in ALERT are shown under the alarm until they go back to GOOD
+    - dropped_lines returns the lines dropped by the input (e.g. the UDP lines of an overloaded SyslogReader)
+    - With history_hits (the hits between two timestamps, e.g. RollupStore.get_hits) each window shows
+    the hits of the last hour and day next to the ones before them
+    - Each window is shown SCREEN_INTERVAL seconds of the clock, a ReplayClock shortens them by its speed
+    (or doesn't wait at all with an unbounded speed)
+    """
+    def __init__(self, renderer: Renderer = None, start: bool = True, dropped_lines: Callable[[], int] = None,
+                 history_hits: Callable[[int, int], int] = None, clock: Clock = None):
         self._new_data_queue = deque([])
         self._alarms_queue = deque([])
-        self._progress_bar = [second for second in reversed(range(1, SCREEN_INTERVAL + 1))]
-        self._last_alarm = None
+        self.dropped_alarms = 0
+        self._new_data = threading.Condition()
+        self._renderer = renderer or Renderer()
         self._server_status = ServerState.GOOD
+        self._rule_alerts = {}
+        self.dropped_windows = 0
+        self._dropped_lines = dropped_lines
+        self._history_hits = history_hits
+        self._clock = clock or Clock()
         self._draw_thread = threading.Thread(target=self._draw)
-        self._draw_thread.start()
+        if start:
+            self._draw_thread.start()
 
-    def on_new_data(self, event: NewRequestsEvent):
-        if not isinstance(event, NewRequestsEvent):
-            return
+    def on_new_stats(self, event: StatsEvent):
+        with self._new_data:
+            if len(self._new_data_queue) >= SCREEN_QUEUE_SIZE:
+                self._new_data_queue.popleft()
+                self.dropped_windows += 1
 
-        stats = self.Stats(event.requests)
-        self._new_data_queue.append(stats)
+            self._new_data_queue.append(event)
+            self._new_data.notify()
 
     def on_server_state_change(self, event: StateChangeEvent):
-        if not isinstance(event, StateChangeEvent):
-            return
-
+        if len(self._alarms_queue) >= SCREEN_ALARMS_QUEUE_SIZE:
+            self._alarms_queue.popleft()
+            self.dropped_alarms += 1
         self._alarms_queue.append(event)
 
+    def on_rule_state_change(self, event: RuleStateChangeEvent):
+        if event.rule_state == RuleState.ALERT:
+            self._rule_alerts[event.rule_name] = event
+        else:
+            self._rule_alerts.pop(event.rule_name, None)
+
     def _draw(self):
         while True:
-            click.clear()
-            if self._new_data_queue:
-                self._print_data()
+            with self._new_data:
+                self._new_data.wait_for(lambda: self._new_data_queue, SCREEN_IDLE_INTERVAL)
+                stats = self._new_data_queue.popleft() if self._new_data_queue else None
+
+            if not stats:
+                self._renderer.render([click.style('No HTTP requests', fg='green')])
                 continue
 
-            click.secho('No HTTP requests', fg='green')
-            time.sleep(0.5)
-
-    def _print_data(self):
-        stats = self._new_data_queue.popleft()
-        traffic_stats = stats.get_top_sections()
-
-        alert_message = None
-        color_alert_message = 'blue'
-        if not self._last_alarm and self._alarms_queue:
-            self._last_alarm = self._alarms_queue.popleft()
-
-        if self._last_alarm:
-            if self._last_alarm.timestamp < stats.to_request.timestamp:
-                alert_message = self._get_alarm_message(self._last_alarm)
-                self._server_status = self._last_alarm.server_state
-                if self._last_alarm.server_state == ServerState.HIGH_TRAFFIC:
-                    color_alert_message = 'red'
-
-                self._last_alarm = None
-
-        with click.progressbar(self._progress_bar) as bar:
-            for x in bar:
-                print(f" for new interval ...")
-                if not traffic_stats:
-                    click.secho('No HTTP requests', fg='green')
-                    return
-
-                click.secho('*****LOG MONITOR*******', fg='green')
-                click.secho(f'From: {stats.from_request.date}', fg='green')
-                click.secho(f'To: {stats.to_request.date}', fg='green')
-                color_server_status = 'blue'
-                if self._server_status == ServerState.HIGH_TRAFFIC:
-                    color_server_status = 'red'
-                click.secho(f'Sever Status: {self._server_status.name}', fg=color_server_status)
-                table = []
-                headers = ['section', 'total hits', '200', '404', '500']
-                for traffic_stat in traffic_stats:
-                    row = [traffic_stat.section, traffic_stat.total_hits,\
-                           traffic_stat.get_percentage_by_status(200),\
-                           traffic_stat.get_percentage_by_status(404),\
-                           traffic_stat.get_percentage_by_status(500)]
-                    table.append(row)
-
-                table = columnar(table, headers, no_borders=True)
-                click.secho(str(table), fg='green')
-
-                if alert_message:
-                    click.secho(alert_message, fg=color_alert_message)
-                time.sleep(1)
-                click.clear()
+            self._print_data(stats)
+
+    def _print_data(self, stats: StatsEvent):
+        alarms = []
+        while self._alarms_queue and self._alarms_queue[0].timestamp < stats.to_timestamp:
+            alarms.append(self._alarms_queue.popleft())
+        if alarms:
+            self._server_status = alarms[-1].server_state
+
+        frame = self._get_stats_frame(stats)
+        for alarm in alarms:
+            color_alert_message = 'red' if alarm.server_state == ServerState.HIGH_TRAFFIC else 'blue'
+            frame.append(click.style(self._get_alarm_message(alarm), fg=color_alert_message))
+        for rule_alert in list(self._rule_alerts.values()):
+            frame.append(click.style(f'Rule {rule_alert.rule_name} alert - value {rule_alert.value:.2f} '
+                                     f'at {datetime.utcfromtimestamp(rule_alert.timestamp):%Y-%m-%d %H:%M:%S}',
+                                     fg='red'))
+
+        for seconds in reversed(range(1, SCREEN_INTERVAL + 1)):
+            self._renderer.render(frame + self._get_progress_lines(seconds))
+            self._clock.sleep(1)
+
+    def _get_stats_frame(self, stats: StatsEvent) -> List[str]:
+        if not stats.top_sections:
+            return [click.style('No HTTP requests', fg='green')]
+
+        color_server_status = 'blue'
+        if self._server_status == ServerState.HIGH_TRAFFIC:
+            color_server_status = 'red'
+
+        frame = [
+            click.style('*****LOG MONITOR*******', fg='green'),
+            click.style(f'From: {stats.from_date}', fg='green'),
+            click.style(f'To: {stats.to_date}', fg='green'),
+            click.style(f'Sever Status: {self._server_status.name}', fg=color_server_status),
+        ]
+
+        table = []
+        seconds = stats.to_timestamp - stats.from_timestamp + 1
+        headers = ['section', 'total hits', *SectionTrafficStats.STATUS_CLASSES, 'p50 bytes', 'p95 bytes', 'p99 bytes',
+                   'bytes/s']
+        for traffic_stat in stats.top_sections:
+            row = [traffic_stat.section, traffic_stat.total_hits,
+                   *(traffic_stat.get_percentage_by_class(status_class)
+                     for status_class in SectionTrafficStats.STATUS_CLASSES),
+                   *(self._format_bytes(traffic_stat.get_bytes_quantile(q)) for q in (0.5, 0.95, 0.99)),
+                   self._format_bytes(traffic_stat.get_bytes_per_second(seconds))]
+            table.append(row)
+
+        table = columnar(table, headers, no_borders=True)
+        frame.extend(click.style(line, fg='green') for line in str(table).splitlines())
+
+        if stats.top_hosts:
+            hosts = ', '.join(f'{host.key} ({host.count})' for host in stats.top_hosts)
+            frame.append(click.style(f'Top hosts: {hosts}', fg='green'))
+        if stats.late_records:
+            frame.append(click.style(f'Late records dropped: {stats.late_records}', fg='yellow'))
+        if self._history_hits is not None:
+            frame.append(click.style(self._get_history_line(stats.to_timestamp), fg='green'))
+        return frame
+
+    def _get_history_line(self, timestamp: int) -> str:
+        periods = []
+        for name, seconds in (('hour', 3600), ('day', 86400)):
+            last = self._history_hits(timestamp - seconds + 1, timestamp)
+            previous = self._history_hits(timestamp - 2 * seconds + 1, timestamp - seconds)
+            periods.append(f'last {name} {last} hits (previous {previous})')
+        return 'History: ' + ', '.join(periods)
+
+    @staticmethod
+    def _format_bytes(value) -> str:
+        if value is None:
+            return '-'
+        for unit in ('B', 'KB', 'MB'):
+            if value < 1024:
+                return f'{value:.0f}{unit}'
+            value /= 1024
+        return f'{value:.1f}GB'
+
+    def _get_progress_lines(self, seconds: int) -> List[str]:
+        done = SCREEN_INTERVAL - seconds
+        lines = [f"[{'#' * done}{'-' * seconds}] {seconds}s for new interval ..."]
+        if self.dropped_windows:
+            lines.append(click.style(f'Dropped windows: {self.dropped_windows}', fg='yellow'))
+        if self.dropped_alarms:
+            lines.append(click.style(f'Dropped alarms: {self.dropped_alarms}', fg='yellow'))
+        dropped_lines = self._dropped_lines() if self._dropped_lines else 0
+        if dropped_lines:
+            lines.append(click.style(f'Dropped lines: {dropped_lines}', fg='yellow'))
+        return lines
 
     def _get_alarm_message(self, event: StateChangeEvent) -> str:
         message = ""
@@ -180,6 +203,7 @@ class TTLIntervalCache(Observable):
         self.server_state_machine = server_state_machine
         self._heap = []
         self._delay_queue = deque([])
+        self.delay_queue_flushes = 0
         self._window_size = self.ttl - 1
 
     def append(self, unix_timestamp: int):
@@ -189,6 +213,29 @@ class TTLIntervalCache(Observable):
 
         self._insert(unix_timestamp)
 
+    def append_run(self, unix_timestamp: int, hits: int):
+        for _ in range(hits):
+            self.append(unix_timestamp)
+
+    @property
+    def delay_queue_depth(self) -> int:
+        return len(self._delay_queue)
+
+    def get_state(self) -> dict:
+        """
+        The timestamps of the window as hits by second (and the delay queue) for a checkpoint
+        """
+        hits_by_second = {}
+        for unix_timestamp in self._heap:
+            hits_by_second[unix_timestamp] = hits_by_second.get(unix_timestamp, 0) + 1
+        return {'hits_by_second': hits_by_second, 'delay_queue': list(self._delay_queue)}
+
+    def set_state(self, state: dict):
+        self._heap = [int(unix_timestamp) for unix_timestamp, hits in state['hits_by_second'].items()
+                      for _ in range(hits)]
+        heapq.heapify(self._heap)
+        self._delay_queue = deque(state['delay_queue'])
+
     def _insert(self, unix_timestamp: int):
         self._resize(unix_timestamp)
         heapq.heappush(self._heap, unix_timestamp)
@@ -203,6 +250,7 @@ class TTLIntervalCache(Observable):
         self._delay_queue.append(unix_timestamp)
 
         if self._is_outside_delay_interval(unix_timestamp):
+            self.delay_queue_flushes += 1
             while self._delay_queue:
                 self._insert(self._delay_queue.popleft())
 
@@ -254,6 +302,182 @@ class TTLIntervalCache(Observable):
         heapq.heappop(self._heap)
 
 
+class TTLBucketIntervalCache(Observable):
+    """
+    Alternative alert window engine to the TTLIntervalCache MIN HEAP
+
+    - Instead of storing every UNIX timestamp we keep a fixed ring of per-second
+    counters plus a running total, the ring has (ALERT_INTERVAL + LOG_DELAY) slots
+    so the memory depends only on the window length and not on the traffic,
+    APPEND and the average of hits are O(1)
+
+    The eviction rules and the delay queue are the same as the TTLIntervalCache
+    so the ServerStateMachine receives exactly the same transitions for lines that
+    are out of order within the LOG_DELAY, a line older than the ring can hold
+    is counted on the oldest second the ring can still represent
+
+    append_run adds the hits of consecutive lines with the same timestamp, the
+    state machine receives the same transitions as appending them one by one
+    """
+    def __init__(self, ttl: int, log_delay: int, server_state_machine: ServerStateMachine):
+        self.ttl = ttl
+        self.log_delay = log_delay
+        self.server_state_machine = server_state_machine
+        self._size = self.ttl + self.log_delay
+        self._buckets = [0] * self._size
+        self._total = 0
+        self._oldest = None
+        self._newest = None
+        self._delay_queue = deque([])
+        self.delay_queue_flushes = 0
+        self._window_size = self.ttl - 1
+        self._high_traffic_hits = self._get_high_traffic_hits()
+
+    def append(self, unix_timestamp: int):
+        if self._total and unix_timestamp > self._oldest + self._window_size:
+            self.append_run(unix_timestamp, 1)
+            return
+
+        self._insert(unix_timestamp)
+
+    def append_run(self, unix_timestamp: int, hits: int):
+        while hits:
+            if self._is_empty() or not self._is_outside_alert_interval(unix_timestamp):
+                self._insert(unix_timestamp, hits)
+                return
+
+            if not self._is_outside_delay_interval(unix_timestamp):
+                self._delay_queue.append((unix_timestamp, hits))
+                return
+
+            self._handle_delay_queue(unix_timestamp)
+            hits -= 1
+
+    def __len__(self):
+        return self._total
+
+    @property
+    def delay_queue_depth(self) -> int:
+        return len(self._delay_queue)
+
+    def get_state(self) -> dict:
+        """
+        The per second counters of the ring (and the delay queue) for a checkpoint
+        """
+        hits_by_second = {}
+        if not self._is_empty():
+            for second in range(self._oldest, self._newest + 1):
+                hits = self._buckets[second % self._size]
+                if hits:
+                    hits_by_second[second] = hits
+        return {'hits_by_second': hits_by_second, 'delay_queue': [list(run) for run in self._delay_queue]}
+
+    def set_state(self, state: dict):
+        self._buckets = [0] * self._size
+        self._total = 0
+        self._oldest = self._newest = None
+        for unix_timestamp, hits in sorted((int(second), hits) for second, hits in state['hits_by_second'].items()):
+            self._add(unix_timestamp, hits)
+        self._delay_queue = deque((unix_timestamp, hits) for unix_timestamp, hits in state['delay_queue'])
+
+    def _insert(self, unix_timestamp: int, hits: int = 1):
+        self._resize(unix_timestamp)
+        self._add(unix_timestamp)
+        self._set_state_machine(unix_timestamp)
+
+        if hits > 1:
+            self._add_run(unix_timestamp, hits - 1)
+
+    def _add_run(self, unix_timestamp: int, hits: int):
+        """
+        The average only grows while adding hits of the same second so the state can only
+        change once, when the total reaches the hits of the THRESHOLD
+        """
+        missing_hits = self._high_traffic_hits - self._total
+        if 0 < missing_hits <= hits:
+            self._add(unix_timestamp, missing_hits)
+            self._set_state_machine(unix_timestamp)
+            hits -= missing_hits
+
+        if hits:
+            self._add(unix_timestamp, hits)
+
+    def _handle_delay_queue(self, unix_timestamp):
+        self._delay_queue.append((unix_timestamp, 1))
+        self.delay_queue_flushes += 1
+
+        while self._delay_queue:
+            self._insert(*self._delay_queue.popleft())
+
+    def _is_outside_alert_interval(self, unix_timestamp: int) -> bool:
+        return unix_timestamp > self._oldest + self._window_size
+
+    def _is_outside_delay_interval(self, unix_timestamp: int) -> bool:
+        return unix_timestamp > self._oldest + (self._window_size + self.log_delay)
+
+    def _set_state_machine(self, unix_timestamp):
+        average_hits = self._get_average_hits_by_second()
+        server_state = ServerState.HIGH_TRAFFIC if average_hits >= THRESHOLD else ServerState.GOOD
+        self.server_state_machine.set_server_state(server_state, average_hits, unix_timestamp)
+
+    def _get_average_hits_by_second(self):
+        return self._total / ALERT_INTERVAL
+
+    def _get_high_traffic_hits(self) -> int:
+        hits = max(math.ceil(THRESHOLD * ALERT_INTERVAL), 0)
+        while hits and (hits - 1) / ALERT_INTERVAL >= THRESHOLD:
+            hits -= 1
+        while hits / ALERT_INTERVAL < THRESHOLD:
+            hits += 1
+        return hits
+
+    def _add(self, unix_timestamp: int, hits: int = 1):
+        if self._is_empty():
+            self._oldest = self._newest = unix_timestamp
+        elif unix_timestamp > self._newest:
+            self._newest = unix_timestamp
+        elif unix_timestamp < self._oldest:
+            unix_timestamp = max(unix_timestamp, self._newest - self._size + 1)
+            self._oldest = unix_timestamp
+
+        self._buckets[unix_timestamp % self._size] += hits
+        self._total += hits
+
+    def _resize(self, timestamp_to_compare: int):
+        if self._is_empty():
+            return
+
+        cutoff = timestamp_to_compare - self._window_size
+        if cutoff > self._newest:
+            self._clear()
+            return
+
+        while self._oldest < cutoff:
+            self._remove_oldest()
+
+    def _remove_oldest(self):
+        index = self._oldest % self._size
+        self._total -= self._buckets[index]
+        self._buckets[index] = 0
+
+        if self._total == 0:
+            self._oldest = self._newest = None
+            return
+
+        self._oldest += 1
+        while not self._buckets[self._oldest % self._size]:
+            self._oldest += 1
+
+    def _clear(self):
+        for second in range(self._oldest, self._newest + 1):
+            self._buckets[second % self._size] = 0
+        self._total = 0
+        self._oldest = self._newest = None
+
+    def _is_empty(self):
+        return self._total == 0
+
+
 class TTLRequestCache(Observable):
     """
     This class will store requests in a MIN heap data structure
@@ -0,0 +1,57 @@
+import os
+import random
+from src.config import LOG_DELAY
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+HEADER = '"remotehost","rfc931","authuser","date","request","status","bytes"\n'
+
+
+def get_events(agent_or_reader):
+    state_events = []
+    stats_events = []
+
+    if isinstance(agent_or_reader, Agent):
+        agent = agent_or_reader
+    else:
+        agent = Agent(agent_or_reader.file_path, ServerStateMachine())
+
+    agent.server_state_machine.notify = state_events.append
+    agent.stats.notify = stats_events.append
+
+    if hasattr(agent_or_reader, 'runs'):
+        for runs in agent_or_reader.runs():
+            agent._process_runs(runs)
+        agent._flush()
+    else:
+        agent._read_file()
+
+    return [(event.server_state, event.average_hits, event.timestamp) for event in state_events],\
+        [(event.from_timestamp, event.to_timestamp, event.total_hits, event.hits_by_status,
+          [(stats.section, stats.hits_by_status) for stats in event.top_sections]) for event in stats_events]
+
+
+def write_log(directory: str):
+    rand = random.Random(3)
+    file_path = os.path.join(directory, 'access.log')
+    sections = ['api', 'report', 'user', 'help']
+    statuses = ['200', '404', '500']
+    second = 1549573860
+
+    with open(file_path, 'w') as log_file:
+        log_file.write(HEADER)
+        for _ in range(1500):
+            second += rand.choice([0] + [1] * 30 + [200])
+            for _ in range(rand.choice([1, 4, 25, 40])):
+                timestamp = second - rand.randint(0, LOG_DELAY - 1)
+                log_file.write(f'"10.0.0.1","-","apache",{timestamp},"GET /{rand.choice(sections)}/x HTTP/1.0",'
+                               f'{rand.choice(statuses)},1234\n')
+        log_file.write('invalid line\n')
+        log_file.write(f'"10.0.0.1","-","apache",abc,"GET /api HTTP/1.0",200,1234\n')
+
+    return file_path
+
+
+def log_line(timestamp, section='api', status=200, response_bytes=1234):
+    return f'"10.0.0.1","-","apache",{timestamp},"GET /{section}/user HTTP/1.0",{status},{response_bytes}'
@@ -0,0 +1,222 @@
+import unittest
+import os
+import tempfile
+import time
+from unittest import mock
+from src.config import DISPLAY_INTERVAL, LOG_DELAY, CSV_COLUMNS
+from src.model.server import Request, ServerStateMachine
+from src.service.agent import Agent
+from src.service.aggregator import StatsAggregator, WatermarkStatsAggregator
+from src.utils.utils import TTLRequestCache
+from tests.helpers import HEADER, log_line
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), '..', 'sample_csv.txt')
+
+
+class TestStatsAggregator(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_CSV, 'r') as log_file:
+            next(log_file)
+            self.requests = [Request(line) for line in log_file if len(line.split(',')) == CSV_COLUMNS]
+
+    def test_should_close_the_same_windows_as_request_cache(self):
+        request_events = []
+        stats_events = []
+        request_cache = TTLRequestCache(DISPLAY_INTERVAL, LOG_DELAY)
+        request_cache.notify = request_events.append
+        aggregator = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY, top_sections=100)
+        aggregator.notify = stats_events.append
+
+        for request in self.requests:
+            request_cache.append(request)
+            aggregator.append(request)
+
+        self.assertGreater(len(stats_events), 0)
+        self.assertEqual(len(request_events), len(stats_events))
+
+        for request_event, stats_event in zip(request_events, stats_events):
+            requests = request_event.requests
+            self.assertEqual(stats_event.from_timestamp, requests[0].timestamp)
+            self.assertEqual(stats_event.to_timestamp, requests[-1].timestamp)
+            self.assertEqual(stats_event.total_hits, len(requests))
+
+            hits_by_section = {}
+            for request in requests:
+                hits_by_section[request.section] = hits_by_section.get(request.section, 0) + 1
+
+            self.assertEqual({stats.section: stats.total_hits for stats in stats_event.top_sections}, hits_by_section)
+
+    def test_should_sort_top_sections_by_hits(self):
+        stats_events = []
+        aggregator = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY, top_sections=2)
+        aggregator.notify = stats_events.append
+
+        for request in self.requests:
+            aggregator.append(request)
+
+        top_sections = stats_events[0].top_sections
+        self.assertEqual(len(top_sections), 2)
+        self.assertGreaterEqual(top_sections[0].total_hits, top_sections[1].total_hits)
+        self.assertEqual(top_sections[0].get_percentage_by_status(999), 0)
+    def test_should_keep_the_response_bytes_and_status_classes_of_each_section(self):
+        stats_events = []
+        aggregator = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        aggregator.notify = stats_events.append
+
+        for timestamp in range(100, 110):
+            aggregator.append(Request(log_line(timestamp, response_bytes=1000)))
+            aggregator.append(Request(log_line(timestamp, status=404, response_bytes=100)))
+        aggregator.append(Request(log_line(105, status=503, response_bytes='-')))
+        aggregator.append(Request(log_line(120)))
+
+        section_stats = stats_events[0].top_sections[0]
+        self.assertEqual(section_stats.get_hits_by_class(), {'2xx': 10, '3xx': 0, '4xx': 10, '5xx': 1})
+        self.assertEqual(section_stats.get_percentage_by_class('5xx'), '4.76%')
+        self.assertAlmostEqual(section_stats.get_bytes_quantile(0.5), 100, delta=1)
+        self.assertAlmostEqual(section_stats.get_bytes_quantile(0.99), 1000, delta=10)
+        self.assertEqual(section_stats.get_bytes_per_second(10), 1100)
+
+    def test_should_close_the_open_windows_on_flush(self):
+        stats_events = []
+        aggregator = StatsAggregator(10, 2)
+        aggregator.notify = stats_events.append
+        for timestamp in [100, 105, 113, 120]:
+            aggregator.append(Request(log_line(timestamp)))
+        self.assertEqual(len(stats_events), 1)
+
+        aggregator.flush()
+
+        self.assertEqual([(event.from_timestamp, event.total_hits) for event in stats_events],
+                         [(100, 2), (113, 2)])
+        self.assertEqual(len(aggregator), 0)
+
+    def test_should_not_have_response_bytes_with_runs(self):
+        stats_events = []
+        aggregator = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        aggregator.notify = stats_events.append
+
+        aggregator.append_run(100, 2, {'api': {'200': 2}})
+        aggregator.append_run(120, 1, {'api': {'200': 1}})
+
+        self.assertIsNone(stats_events[0].top_sections[0].response_bytes)
+        self.assertIsNone(stats_events[0].top_sections[0].get_bytes_quantile(0.5))
+
+
+class TestWatermarkStatsAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.stats_events = []
+        self.aggregator = WatermarkStatsAggregator(10, 2, idle_timeout=3)
+        self.aggregator.notify = self.stats_events.append
+
+    def test_should_close_aligned_windows_when_the_watermark_passes_their_end(self):
+        for timestamp in [100, 105, 103, 109, 110]:
+            self.aggregator.append(Request(log_line(timestamp)))
+        self.assertEqual(self.stats_events, [])
+
+        self.aggregator.append(Request(log_line(111)))
+        self.assertEqual(len(self.stats_events), 1)
+        self.assertEqual((self.stats_events[0].from_timestamp, self.stats_events[0].to_timestamp), (100, 109))
+        self.assertEqual(self.stats_events[0].total_hits, 4)
+        self.assertEqual(self.stats_events[0].late_records, 0)
+
+    def test_should_drop_and_count_late_records(self):
+        for timestamp in [100, 112, 108, 109, 113]:
+            self.aggregator.append(Request(log_line(timestamp)))
+        self.aggregator.flush()
+
+        self.assertEqual(self.aggregator.late_records, 2)
+        self.assertEqual([event.total_hits for event in self.stats_events], [1, 2])
+        self.assertEqual(self.stats_events[-1].late_records, 2)
+
+    def test_should_close_the_last_window_after_an_idle_timeout(self):
+        self.aggregator.append(Request(log_line(101)))
+        self.aggregator.advance_idle(1000.0)
+        self.aggregator.advance_idle(1002.0)
+        self.assertEqual(self.stats_events, [])
+
+        self.aggregator.advance_idle(1010.0)
+        self.assertEqual(len(self.stats_events), 1)
+        self.assertEqual(self.aggregator.watermark, 109)
+
+    def test_should_count_every_request_of_the_sample(self):
+        with open(SAMPLE_CSV, 'r') as log_file:
+            next(log_file)
+            requests = [Request(line) for line in log_file if len(line.split(',')) == CSV_COLUMNS]
+        aggregator = WatermarkStatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        aggregator.notify = self.stats_events.append
+
+        for request in requests:
+            aggregator.append(request)
+        aggregator.flush()
+
+        self.assertEqual(sum(event.total_hits for event in self.stats_events) + aggregator.late_records,
+                         len(requests))
+        self.assertTrue(all(event.from_timestamp % DISPLAY_INTERVAL == 0 for event in self.stats_events))
+        self.assertEqual(len(aggregator), 0)
+
+
+@mock.patch('src.service.agent.WINDOW_EMISSION', 'watermark')
+class TestWatermarkAgent(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._directory.name, 'access.log')
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(log_line(timestamp) + '\n' for timestamp in range(100, 109))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_close_the_last_window_at_the_end_of_the_file(self):
+        stats_events = []
+        agent = Agent(self.file_path, ServerStateMachine())
+        agent.stats.notify = stats_events.append
+        agent.run()
+        agent.join()
+
+        self.assertEqual([(event.from_timestamp, event.total_hits) for event in stats_events], [(100, 9)])
+
+    @mock.patch('src.service.agent.LOG_DELAY', 0)
+    def test_should_close_the_last_window_of_many_files_without_new_traffic(self):
+        other_path = os.path.join(self._directory.name, 'other.log')
+        with open(other_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(log_line(timestamp, 'user') + '\n' for timestamp in range(100, 109))
+        stats_events = []
+        agent = Agent([self.file_path, other_path], ServerStateMachine(), follow=True, per_source_stats=True)
+        for stats in (agent.stats, *agent.source_stats):
+            stats.idle_timeout = 0
+            stats.notify = stats_events.append
+        agent.run()
+
+        deadline = time.time() + 5
+        while len(stats_events) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        agent.stop()
+        agent.join()
+
+        self.assertEqual(sorted((event.from_timestamp, event.total_hits) for event in stats_events),
+                         [(100, 9), (100, 9), (100, 18)])
+
+    @mock.patch('src.service.agent.LOG_DELAY', 0)
+    def test_should_close_the_last_window_without_new_traffic(self):
+        stats_events = []
+        agent = Agent(self.file_path, ServerStateMachine(), follow=True)
+        agent.stats.idle_timeout = 0
+        agent.stats.notify = stats_events.append
+        agent.run()
+
+        deadline = time.time() + 5
+        while not stats_events and time.time() < deadline:
+            time.sleep(0.01)
+        agent.stop()
+        agent.join()
+
+        self.assertEqual([(event.from_timestamp, event.total_hits) for event in stats_events], [(100, 9)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import gzip
+import os
+import tempfile
+from src.config import ALERT_INTERVAL, LOG_DELAY
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.batch import BatchReader, parse_runs
+from src.utils.utils import TTLBucketIntervalCache
+from tests.helpers import TEST_HIGH_TRAFFIC_AND_RECOVERED, get_events, write_log
+
+
+@unittest.skipUnless(BatchReader.is_available(), 'numpy is not installed')
+class TestBatchReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_raise_the_same_events_as_line_by_line(self):
+        for file_path in [TEST_HIGH_TRAFFIC_AND_RECOVERED, write_log(self._directory.name)]:
+            line_events = get_events(Agent(file_path, ServerStateMachine()))
+            batch_events = get_events(Agent(file_path, ServerStateMachine(), batch=True))
+
+            self.assertGreater(len(line_events[0]), 0)
+            self.assertGreater(len(line_events[1]), 0)
+            self.assertEqual(line_events, batch_events)
+
+    def test_should_count_the_lines_read_and_rejected(self):
+        line_agent = Agent(write_log(self._directory.name), ServerStateMachine())
+        batch_agent = Agent(line_agent._file_path, ServerStateMachine(), batch=True)
+        get_events(line_agent)
+        get_events(batch_agent)
+
+        self.assertEqual(line_agent.rejected_lines, 2)
+        self.assertEqual((batch_agent.total_lines, batch_agent.rejected_lines),
+                         (line_agent.total_lines, line_agent.rejected_lines))
+
+    def test_should_parse_the_long_fields(self):
+        long_path = '/api/' + 'x' * 5000
+        data = (f'"10.0.0.1","-","apache",100,"GET {long_path} HTTP/1.0",200,1234\n'
+                f'"10.0.0.1","-","apache",100,"GET /user HTTP/1.0",200,1234\n'
+                f'"10.0.0.1","-","apache",100,"GET {long_path} HTTP/1.0",{"5" * 300},1234\n'
+                f'"10.0.0.1","-","apache",{"9" * 19},"GET /api HTTP/1.0",200,1234\n'
+                f'"10.0.0.1","-","apache",101,"GET {long_path}/y HTTP/1.0",404,1234\n').encode()
+
+        self.assertEqual(parse_runs(data), [(100, 3, {'api': {'200': 1, '5' * 300: 1}, 'user': {'200': 1}}),
+                                            (101, 1, {'api': {'404': 1}})])
+
+    def test_should_keep_the_first_line_of_a_file_without_header(self):
+        file_path = write_log(self._directory.name)
+        with open(file_path, 'r') as log_file:
+            lines = log_file.readlines()[1:]
+        with open(file_path, 'w') as log_file:
+            log_file.writelines(lines)
+        compressed_path = os.path.join(self._directory.name, 'access.log.gz')
+        with gzip.open(compressed_path, 'wt') as compressed_file:
+            compressed_file.writelines(lines)
+
+        expected = get_events(Agent(file_path, ServerStateMachine()))
+        # every line but the two invalid ones at the end
+        self.assertEqual(sum(event[2] for event in expected[1]), len(lines) - 2)
+        for options in ({'batch': True}, {'workers': 2}, {'use_mmap': True}):
+            self.assertEqual(get_events(Agent(file_path, ServerStateMachine(), **options)), expected)
+        self.assertEqual(get_events(Agent(compressed_path, ServerStateMachine())), expected)
+
+    def test_should_split_chunks_on_line_boundaries(self):
+        file_path = write_log(self._directory.name)
+
+        self.assertEqual(get_events(BatchReader(file_path)), get_events(BatchReader(file_path, chunk_size=997)))
+
+    def test_should_match_appending_hits_one_by_one(self):
+        runs_events = []
+        hits_events = []
+        runs_cache = TTLBucketIntervalCache(ALERT_INTERVAL, LOG_DELAY, ServerStateMachine())
+        runs_cache.server_state_machine.notify = runs_events.append
+        hits_cache = TTLBucketIntervalCache(ALERT_INTERVAL, LOG_DELAY, ServerStateMachine())
+        hits_cache.server_state_machine.notify = hits_events.append
+
+        for runs in BatchReader(write_log(self._directory.name)).runs():
+            for unix_timestamp, hits, _ in runs:
+                runs_cache.append_run(unix_timestamp, hits)
+                for _ in range(hits):
+                    hits_cache.append(unix_timestamp)
+
+        self.assertEqual([vars(event) for event in runs_events], [vars(event) for event in hits_events])
+
+
+if __name__ == '__main__':
+    unittest.main()
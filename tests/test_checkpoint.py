@@ -0,0 +1,117 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.checkpoint import Checkpoint
+from src.service.rules import AlertRule
+from src.state_machine.state import ServerState
+from src.utils.utils import TTLIntervalCache, TTLBucketIntervalCache
+from tests.helpers import get_events, write_log
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.full_path = write_log(self.directory.name)
+        with open(self.full_path, 'r') as log_file:
+            self.lines = log_file.readlines()
+        self.file_path = os.path.join(self.directory.name, 'resumed.log')
+        self.checkpoint_path = os.path.join(self.directory.name, 'checkpoint.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_lines(self, lines, mode='w'):
+        with open(self.file_path, mode) as log_file:
+            log_file.writelines(lines)
+
+    def test_should_raise_the_same_events_after_a_restart(self):
+        expected_state_events, expected_stats_events = get_events(Agent(self.full_path, ServerStateMachine()))
+
+        self.write_lines(self.lines[:len(self.lines) // 2])
+        first_state_events, first_stats_events = get_events(
+            Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path)))
+
+        self.write_lines(self.lines[len(self.lines) // 2:], 'a')
+        agent = Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path))
+        self.assertGreater(agent._log_tail.start_offset, 0)
+        second_state_events, second_stats_events = get_events(agent)
+
+        self.assertGreater(len(first_state_events), 0)
+        self.assertGreater(len(second_state_events), 0)
+        self.assertEqual(first_state_events + second_state_events, expected_state_events)
+        # with a checkpoint the last open window is kept on it for the next restart instead of being closed
+        self.assertEqual(first_stats_events + second_stats_events, expected_stats_events[:-1])
+
+    @mock.patch('src.service.agent.TOP_K_ENGINE', 'space_saving')
+    def test_should_close_the_window_that_the_aggregator_can_not_keep(self):
+        _, expected_stats_events = get_events(Agent(self.full_path, ServerStateMachine()))
+
+        self.write_lines(self.lines[:len(self.lines) // 2])
+        agent = Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path))
+        _, first_stats_events = get_events(agent)
+        first_lines = agent.total_lines
+
+        self.write_lines(self.lines[len(self.lines) // 2:], 'a')
+        agent = Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path))
+        _, second_stats_events = get_events(agent)
+
+        self.assertEqual(sum(event[2] for event in first_stats_events + second_stats_events),
+                         sum(event[2] for event in expected_stats_events))
+        self.assertGreater(agent.total_lines, first_lines)
+        self.assertEqual((agent.total_lines, agent.rejected_lines), (len(self.lines) - 1, 2))
+
+    def test_should_keep_the_rules_and_rollups_after_a_restart(self):
+        def run(file_path, checkpoint=None):
+            agent = Agent(file_path, ServerStateMachine(), checkpoint=checkpoint,
+                          rules=[AlertRule('high_traffic', 120, 10), AlertRule('errors', 30, 1, metric='errors')])
+            rule_events = []
+            agent.rule_engine.notify = rule_events.append
+            get_events(agent)
+            return agent, [(event.rule_name, event.rule_state, event.timestamp) for event in rule_events]
+
+        expected_agent, expected_rule_events = run(self.full_path)
+
+        self.write_lines(self.lines[:len(self.lines) // 2])
+        _, first_rule_events = run(self.file_path, Checkpoint(self.checkpoint_path))
+        self.write_lines(self.lines[len(self.lines) // 2:], 'a')
+        agent, second_rule_events = run(self.file_path, Checkpoint(self.checkpoint_path))
+        agent.rule_engine.flush()
+
+        self.assertGreater(len(first_rule_events), 0)
+        self.assertEqual(first_rule_events + second_rule_events, expected_rule_events)
+        self.assertEqual([(bucket.start, bucket.hits, bucket.hits_by_section) for bucket in agent.rollups.get_history(60)],
+                         [(bucket.start, bucket.hits, bucket.hits_by_section)
+                          for bucket in expected_agent.rollups.get_history(60)])
+
+    def test_should_read_from_the_beginning_when_the_file_was_replaced(self):
+        self.write_lines(self.lines[:100])
+        get_events(Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path)))
+
+        os.remove(self.file_path)
+        self.write_lines(self.lines[:50])
+        agent = Agent(self.file_path, ServerStateMachine(), checkpoint=Checkpoint(self.checkpoint_path))
+
+        self.assertEqual(agent._log_tail.start_offset, 0)
+
+    def test_should_restore_the_window_counters_of_both_engines(self):
+        for cache_class in (TTLIntervalCache, TTLBucketIntervalCache):
+            server_state_machine = ServerStateMachine()
+            cache = cache_class(120, 5, server_state_machine)
+            for unix_timestamp in [100, 100, 101, 103, 250, 251]:
+                cache.append(unix_timestamp)
+
+            restored = cache_class(120, 5, ServerStateMachine())
+            restored.set_state(cache.get_state())
+
+            self.assertEqual(restored.get_state(), cache.get_state())
+
+        server_state_machine.set_state({'server_state': 'HIGH_TRAFFIC'})
+        self.assertEqual(server_state_machine.get_server_state(), ServerState.HIGH_TRAFFIC)
+
+
+if __name__ == '__main__':
+    unittest.main()
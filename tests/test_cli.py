@@ -0,0 +1,73 @@
+import unittest
+import csv
+import json
+import os
+from unittest import mock
+from click.testing import CliRunner
+from src.cli import cli
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+
+
+class TestCli(unittest.TestCase):
+
+    def test_should_write_the_report_as_json_lines(self):
+        result = CliRunner(mix_stderr=False).invoke(cli, ['report', TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+        self.assertEqual(result.exit_code, 0)
+        rows = [json.loads(line) for line in result.stdout.splitlines()]
+        alerts = [row['server_state'] for row in rows if row['type'] == 'alert']
+        windows = [row for row in rows if row['type'] == 'stats']
+
+        self.assertEqual(alerts, ['HIGH_TRAFFIC', 'GOOD', 'HIGH_TRAFFIC', 'GOOD'])
+        self.assertGreater(len(windows), 0)
+        self.assertIn('requests/sec', result.stderr)
+
+    def test_should_write_the_report_as_csv(self):
+        result = CliRunner(mix_stderr=False).invoke(cli, ['report', '--format', 'csv', TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+        lines = result.stdout.splitlines()
+        self.assertEqual(lines[0], 'type,from_timestamp,to_timestamp,total_hits,top_sections,hits_by_status,'
+                                   'server_state,average_hits')
+        self.assertEqual(len([line for line in lines if line.startswith('alert,')]), 4)
+
+        rows = list(csv.DictReader(lines))
+        stats_row = next(row for row in rows if row['type'] == 'stats')
+        hits_by_status = dict(pair.split(':') for pair in stats_row['hits_by_status'].split(';'))
+        self.assertEqual(sum(int(hits) for hits in hits_by_status.values()), int(stats_row['total_hits']))
+
+    def test_should_write_the_metrics_file_at_the_end_of_the_report(self):
+        runner = CliRunner(mix_stderr=False)
+        with runner.isolated_filesystem():
+            result = runner.invoke(cli, ['report', '--metrics-file', 'metrics.json', TEST_HIGH_TRAFFIC_AND_RECOVERED])
+            with open('metrics.json', 'r') as metrics_file:
+                metrics = json.load(metrics_file)
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertGreater(metrics['log_monitor_requests_total'], 0)
+
+    def test_should_not_mix_the_engines(self):
+        for engines in (['--batch', '--mmap'], ['--workers', '2', '--mmap'], ['--batch', '--workers', '2']):
+            result = CliRunner().invoke(cli, ['report', *engines, TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+            self.assertEqual(result.output, 'Only one of --batch, --workers and --mmap can be used\n')
+
+    @mock.patch('src.service.agent.TOP_K_ENGINE', 'space_saving')
+    @mock.patch('src.cli.TOP_K_ENGINE', 'space_saving')
+    def test_should_not_use_the_watermark_windows_with_the_sketches(self):
+        result = CliRunner().invoke(cli, ['report', '--windows', 'watermark', TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+        self.assertIn('can not be used with TOP_K_ENGINE', result.output)
+        with self.assertRaises(ValueError):
+            Agent(TEST_HIGH_TRAFFIC_AND_RECOVERED, ServerStateMachine(), window_emission='watermark')
+
+    def test_should_run_the_monitor_by_default(self):
+        result = CliRunner().invoke(cli, ['file_not_found.csv'])
+
+        self.assertEqual(result.output, 'File not found\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import os
+import tempfile
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.utils.clock import ReplayClock
+from tests.helpers import HEADER, log_line
+
+
+class FakeTime:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestReplayClock(unittest.TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+
+    def test_should_wait_for_the_timestamps_at_the_speed_of_the_clock(self):
+        clock = ReplayClock(60, self.time.monotonic, self.time.sleep)
+
+        clock.wait_until(100)
+        clock.wait_until(160)
+        # the out of order lines don't wait
+        clock.wait_until(130)
+        self.time.now += 2
+        clock.wait_until(220)
+
+        self.assertEqual(self.time.sleeps, [1.0])
+        # the virtual time moves with the wall time since the first timestamp
+        self.assertEqual(clock.now(), 280)
+        clock.sleep(3)
+        self.assertEqual(self.time.sleeps[-1], 0.05)
+
+    def test_should_not_wait_with_an_unbounded_speed(self):
+        clock = ReplayClock(0, self.time.monotonic, self.time.sleep)
+
+        for timestamp in range(100, 200):
+            clock.wait_until(timestamp)
+        clock.sleep(3)
+
+        self.assertEqual(self.time.sleeps, [])
+        self.assertEqual(clock.now(), 199)
+
+    def test_should_not_accept_a_negative_speed(self):
+        with self.assertRaises(ValueError):
+            ReplayClock(-1)
+
+
+class TestReplayAgent(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._directory.name, 'access.log')
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(log_line(timestamp) + '\n' for timestamp in range(100, 221))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_replay_the_log_on_the_virtual_clock(self):
+        fake_time = FakeTime()
+        clock = ReplayClock(60, fake_time.monotonic, fake_time.sleep)
+        stats_events = []
+        agent = Agent(self.file_path, ServerStateMachine(), clock=clock)
+        agent.add_stats_subscriber(stats_events.append)
+
+        agent.run()
+        self.assertTrue(agent.join(timeout=5))
+
+        self.assertTrue(agent.done.is_set())
+        self.assertEqual(agent.total_requests, 121)
+        self.assertEqual(len(stats_events), 13)
+        # 120 seconds of the log at 60x
+        self.assertAlmostEqual(clock.waited_seconds, 2)
+        self.assertAlmostEqual(fake_time.now, 1002)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+from click.testing import CliRunner
+from src.cli import cli
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.compressed import CompressedReader
+from tests.helpers import get_events, write_log
+
+
+class TestCompressedReader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = write_log(self.directory.name)
+        with open(self.file_path, 'rb') as log_file:
+            self.data = log_file.read()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compress(self, opener, file_name: str) -> str:
+        file_path = os.path.join(self.directory.name, file_name)
+        with opener(file_path, 'wb') as compressed_file:
+            compressed_file.write(self.data)
+        return file_path
+
+    def test_should_raise_the_same_events_as_the_plain_file(self):
+        expected = get_events(Agent(self.file_path, ServerStateMachine()))
+
+        for opener, file_name in [(gzip.open, 'access.log.gz'), (bz2.open, 'access.log.bz2'),
+                                  (lzma.open, 'access.log.xz')]:
+            compressed_path = self.compress(opener, file_name)
+            self.assertEqual(get_events(Agent(compressed_path, ServerStateMachine())), expected)
+
+    def test_should_find_the_format_by_the_magic_bytes(self):
+        compressed_path = self.compress(gzip.open, 'access.1')
+        reader = CompressedReader(compressed_path, chunk_size=1024, queue_size=2)
+
+        lines = [line for batch in reader.batches() for line in batch]
+
+        self.assertTrue(CompressedReader.is_compressed(compressed_path))
+        self.assertFalse(CompressedReader.is_compressed(self.file_path))
+        self.assertEqual(lines, self.data.decode().splitlines()[1:])
+
+    def truncate(self, file_name: str) -> str:
+        compressed_path = self.compress(gzip.open, file_name)
+        with open(compressed_path, 'r+b') as compressed_file:
+            compressed_file.truncate(os.path.getsize(compressed_path) // 2)
+        return compressed_path
+
+    def test_should_raise_the_error_of_a_truncated_archive(self):
+        compressed_path = self.truncate('access.log.gz')
+
+        with self.assertRaises(EOFError):
+            for _ in CompressedReader(compressed_path).batches():
+                pass
+
+    def test_should_keep_the_error_on_the_agent_and_exit_with_it(self):
+        compressed_path = self.truncate('access.log.gz')
+        agent = Agent(compressed_path, ServerStateMachine())
+        agent.run()
+        agent.join()
+
+        self.assertIsInstance(agent.error, EOFError)
+        self.assertTrue(agent.done.is_set())
+
+        result = CliRunner(mix_stderr=False).invoke(cli, ['report', compressed_path])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Can not read the log', result.stderr)
+
+    def test_should_not_use_the_mmap_engine_with_compressed_files(self):
+        compressed_path = self.compress(gzip.open, 'access.log.gz')
+        result = CliRunner().invoke(cli, ['report', '--mmap', compressed_path])
+
+        self.assertIn('can not read compressed files', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
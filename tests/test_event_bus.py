@@ -0,0 +1,118 @@
+import unittest
+import os
+import threading
+from src.event.bus import EventBus
+from src.event.event import StateChangeEvent, StatsEvent
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+
+TEST_ONLY_HIGH_TRAFFIC = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_only_high_traffic_alarms.csv')
+
+
+class TestEventBus(unittest.TestCase):
+
+    def test_should_dispatch_by_event_type(self):
+        event_bus = EventBus()
+        stats_events = []
+        event_bus.subscribe(StatsEvent, stats_events.append)
+
+        event_bus.publish(StatsEvent(1, 2, 0, [], {}))
+        event_bus.publish(StateChangeEvent(None, 0, 1))
+
+        self.assertEqual(len(stats_events), 1)
+
+    def test_should_count_the_dispatches_of_each_subscriber(self):
+        event_bus = EventBus()
+        published = []
+        event_bus.subscribe(StatsEvent, [].append)
+        event_bus.subscribe(StatsEvent, [].append)
+        event_bus.on_publish = published.append
+
+        event_bus.publish(StatsEvent(1, 2, 0, [], {}))
+
+        self.assertEqual(event_bus.dispatched, {'list.append#1': 1, 'list.append#2': 1})
+        self.assertEqual(len(published), 1)
+
+    def test_should_not_share_subscribers_between_agents(self):
+        first_events = []
+        second_events = []
+        first_agent = Agent(TEST_ONLY_HIGH_TRAFFIC, ServerStateMachine())
+        second_agent = Agent(TEST_ONLY_HIGH_TRAFFIC, ServerStateMachine())
+        first_agent.add_state_change_subscriber(first_events.append)
+        second_agent.add_state_change_subscriber(second_events.append)
+
+        first_agent.run()
+        first_agent.join()
+
+        self.assertEqual(len(first_events), 2)
+        self.assertEqual(second_events, [])
+
+    def _publish_to_blocked_subscriber(self, overflow):
+        event_bus = EventBus()
+        received = []
+        delivering = threading.Event()
+        release = threading.Event()
+
+        def slow_subscriber(event):
+            delivering.set()
+            release.wait(timeout=5)
+            received.append(event)
+
+        subscriber = event_bus.subscribe(int, slow_subscriber, queue_size=2, overflow=overflow)
+        event_bus.publish(0)
+        # the first event is taken from the queue before it is delivered
+        self.assertTrue(delivering.wait(timeout=5))
+        for event in range(1, 6):
+            event_bus.publish(event)
+
+        release.set()
+        event_bus.close()
+        return received, subscriber.dropped
+
+    def test_should_drop_the_oldest_events_when_the_queue_is_full(self):
+        self.assertEqual(self._publish_to_blocked_subscriber('drop_oldest'), ([0, 4, 5], 3))
+
+    def test_should_coalesce_the_newest_events_when_the_queue_is_full(self):
+        self.assertEqual(self._publish_to_blocked_subscriber('coalesce'), ([0, 1, 5], 3))
+
+    def test_should_block_the_publisher_when_the_queue_is_full(self):
+        event_bus = EventBus()
+        received = []
+        event_bus.subscribe(int, received.append, queue_size=1)
+
+        for event in range(100):
+            event_bus.publish(event)
+        event_bus.close()
+
+        self.assertEqual(received, list(range(100)))
+
+    def test_should_drop_the_events_published_after_close(self):
+        event_bus = EventBus()
+        received = []
+        delivering = threading.Event()
+        release = threading.Event()
+
+        def slow_subscriber(event):
+            delivering.set()
+            release.wait(timeout=5)
+            received.append(event)
+
+        subscriber = event_bus.subscribe(int, slow_subscriber, queue_size=1)
+        event_bus.publish(0)
+        self.assertTrue(delivering.wait(timeout=5))
+        event_bus.publish(1)
+        publisher = threading.Thread(target=event_bus.publish, args=(2,))
+        publisher.start()
+
+        subscriber.close(timeout=0)
+        publisher.join(timeout=5)
+        event_bus.publish(3)
+        release.set()
+        subscriber.close()
+
+        self.assertFalse(publisher.is_alive())
+        self.assertEqual((received, subscriber.dropped), ([0, 1], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
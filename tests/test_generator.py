@@ -0,0 +1,29 @@
+import unittest
+from benchmarks.generator import LogGenerator
+from src.config import CSV_COLUMNS
+from src.model.server import Request
+
+
+class TestLogGenerator(unittest.TestCase):
+
+    def test_should_generate_valid_lines(self):
+        lines = list(LogGenerator(rate=50, sections=3).lines(10))
+        requests = [Request(line) for line in lines[1:]]
+
+        self.assertTrue(all(len(line.split(',')) == CSV_COLUMNS for line in lines))
+        self.assertEqual(len(requests), 500)
+        self.assertEqual({request.section for request in requests}, {'section0', 'section1', 'section2'})
+
+    def test_should_keep_late_lines_within_the_jitter(self):
+        generator = LogGenerator(rate=100, jitter=3, late_ratio=0.5, burst_every=10, burst_length=2, burst_factor=4)
+        timestamps = [Request(line).timestamp for line in list(generator.lines(20))[1:]]
+
+        newest = timestamps[0]
+        for timestamp in timestamps:
+            newest = max(newest, timestamp)
+            self.assertLessEqual(newest - timestamp, 3)
+        self.assertEqual(len(timestamps), 100 * 16 + 400 * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from click.testing import CliRunner
+from src.cli import cli
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.index import TimestampIndex
+from tests.helpers import HEADER, get_events, write_log
+
+
+class TestTimestampIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = write_log(self.directory.name)
+        with open(self.file_path, 'r') as log_file:
+            self.lines = log_file.readlines()[1:]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_timestamp(self, line: str) -> int:
+        return int(line.split(',')[3])
+
+    def test_should_process_only_the_lines_of_the_range(self):
+        timestamps = sorted(self.get_timestamp(line) for line in self.lines[:-2])
+        from_timestamp = timestamps[len(timestamps) // 3]
+        to_timestamp = timestamps[2 * len(timestamps) // 3]
+
+        range_path = os.path.join(self.directory.name, 'range.log')
+        with open(range_path, 'w') as range_file:
+            range_file.write(HEADER)
+            range_file.writelines(line for line in self.lines[:-2]
+                                  if from_timestamp <= self.get_timestamp(line) <= to_timestamp)
+
+        agent = Agent(self.file_path, ServerStateMachine(), time_range=(from_timestamp, to_timestamp))
+        start_offset, end_offset = agent._log_tail.start_offset, agent._log_tail.end_offset
+
+        self.assertGreater(start_offset, 0)
+        self.assertLess(end_offset, os.path.getsize(self.file_path))
+        self.assertEqual(get_events(agent), get_events(Agent(range_path, ServerStateMachine())))
+
+    def test_should_index_only_the_appended_lines(self):
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(self.lines[:1000])
+
+        index = TimestampIndex(self.file_path, every=100)
+        self.assertEqual(index.update(), 1001)
+
+        with open(self.file_path, 'a') as log_file:
+            log_file.writelines(self.lines[1000:])
+
+        index = TimestampIndex(self.file_path, every=100)
+        self.assertEqual(index.update(), len(self.lines) - 1000)
+
+        os.remove(index.index_path)
+        rebuilt_index = TimestampIndex(self.file_path, every=100)
+        rebuilt_index.update()
+        self.assertEqual(index.get_offsets(), rebuilt_index.get_offsets())
+        self.assertEqual((index._offsets, index._max_timestamps), (rebuilt_index._offsets, rebuilt_index._max_timestamps))
+
+    def test_should_build_the_index_again_when_the_file_is_truncated(self):
+        index = TimestampIndex(self.file_path, every=100)
+        index.update()
+
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(self.lines[:150])
+
+        index = TimestampIndex(self.file_path, every=100)
+        self.assertEqual(index.update(), 151)
+        self.assertEqual(len(index), 1)
+
+    @mock.patch('src.service.index.os.replace', side_effect=PermissionError(13, 'Permission denied'))
+    def test_should_keep_the_index_in_memory_when_it_can_not_be_saved(self, _):
+        index = TimestampIndex(self.file_path, every=100)
+        self.assertEqual(index.update(), len(self.lines) + 1)
+
+        self.assertIsInstance(index.error, PermissionError)
+        self.assertGreater(len(index), 0)
+        self.assertEqual(os.listdir(self.directory.name), ['access.log'])
+
+        agent = Agent(self.file_path, ServerStateMachine(), time_range=(None, None))
+        self.assertEqual(get_events(agent), get_events(Agent(self.file_path, ServerStateMachine())))
+
+    def test_should_build_the_index_from_the_cli(self):
+        result = CliRunner().invoke(cli, ['index', '--every', '500', self.file_path])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue(os.path.exists(f'{self.file_path}.idx'))
+
+        result = CliRunner(mix_stderr=False).invoke(cli, ['report', '--from', '2019-02-07 21:11:00', self.file_path])
+        self.assertEqual(result.exit_code, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import random
+from unittest import mock
+from src.config import ALERT_INTERVAL, LOG_DELAY
+from src.utils.utils import TTLIntervalCache, TTLBucketIntervalCache
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+
+
+class TestTTLBucketIntervalCache(unittest.TestCase):
+
+    def _get_state_calls(self, cache_class, timestamps):
+        server_state_machine = mock.Mock()
+        cache = cache_class(ALERT_INTERVAL, LOG_DELAY, server_state_machine)
+
+        for timestamp in timestamps:
+            cache.append(timestamp)
+
+        return server_state_machine.set_server_state.call_args_list
+
+    def test_should_match_heap_engine_on_fixture(self):
+        with open(TEST_HIGH_TRAFFIC_AND_RECOVERED, 'r') as log_file:
+            next(log_file)
+            timestamps = [int(line.split(',')[3]) for line in log_file]
+
+        self.assertEqual(self._get_state_calls(TTLIntervalCache, timestamps),
+                         self._get_state_calls(TTLBucketIntervalCache, timestamps))
+
+    def test_should_match_heap_engine_with_out_of_order_lines(self):
+        rand = random.Random(7)
+        timestamps = []
+        for second in range(1000, 2000):
+            hits = rand.choice([0, 2, 15, 30])
+            timestamps.extend(second + rand.randint(-LOG_DELAY + 1, 0) for _ in range(hits))
+
+        self.assertEqual(self._get_state_calls(TTLIntervalCache, timestamps),
+                         self._get_state_calls(TTLBucketIntervalCache, timestamps))
+
+    def test_should_use_fixed_memory(self):
+        cache = TTLBucketIntervalCache(ALERT_INTERVAL, LOG_DELAY, mock.Mock())
+
+        for second in range(1000, 1300):
+            for _ in range(50):
+                cache.append(second)
+
+        self.assertEqual(len(cache._buckets), ALERT_INTERVAL + LOG_DELAY)
+        self.assertLessEqual(len(cache), ALERT_INTERVAL * 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,6 @@ import os
 from src.service.agent import Agent
 from src.model.server import ServerStateMachine, ServerState
 from src.event.event import StateChangeEvent
-import time
 from unittest import mock
 
 TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
@@ -29,7 +28,7 @@ class TestLogMonitor(unittest.TestCase):
 
         agent.run()
 
-        time.sleep(1)
+        self.assertTrue(agent.join(timeout=5))
 
         self.assertEqual(len(state_events), 4)
 
@@ -56,7 +55,7 @@ class TestLogMonitor(unittest.TestCase):
 
         agent.run()
 
-        time.sleep(1)
+        self.assertTrue(agent.join(timeout=5))
 
         self.assertEqual(len(state_events), 2)
 
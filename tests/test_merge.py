@@ -0,0 +1,130 @@
+import unittest
+import os
+import tempfile
+import threading
+from click.testing import CliRunner
+from src.cli import cli
+from src.config import LOG_DELAY
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.merge import MergedReader
+from tests.helpers import HEADER, get_events, write_log
+
+
+def split_log(file_path: str, directory: str, parts: int) -> list:
+    with open(file_path, 'r') as log_file:
+        next(log_file)
+        lines = log_file.readlines()
+
+    file_paths = []
+    for part in range(parts):
+        part_path = os.path.join(directory, f'node{part}.log')
+        with open(part_path, 'w') as part_file:
+            part_file.write(HEADER)
+            part_file.writelines(lines[part::parts])
+        file_paths.append(part_path)
+    return file_paths
+
+
+def sort_log(file_path: str, directory: str) -> str:
+    with open(file_path, 'r') as log_file:
+        next(log_file)
+        lines = log_file.readlines()
+
+    sorted_path = os.path.join(directory, 'sorted.log')
+    with open(sorted_path, 'w') as sorted_file:
+        sorted_file.write(HEADER)
+        # the invalid lines are kept at the end
+        sorted_file.writelines(sorted(lines[:-2], key=lambda line: int(line.split(',')[3])) + lines[-2:])
+    return sorted_path
+
+
+class TestMergedReader(unittest.TestCase):
+
+    def test_should_merge_the_files_by_timestamp(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = []
+            for part, timestamps in enumerate([[1, 4, 4, 9], [2, 3, 10], [5]]):
+                file_path = os.path.join(directory, f'node{part}.log')
+                with open(file_path, 'w') as log_file:
+                    log_file.write(HEADER)
+                    for timestamp in timestamps:
+                        log_file.write(f'"10.0.0.1","-","apache",{timestamp},"GET /api HTTP/1.0",200,1234\n')
+                file_paths.append(file_path)
+
+            reader = MergedReader(file_paths, batch_size=2)
+            merged = [(index, int(line.split(',')[3])) for batch in reader.batches() for index, line in batch]
+
+        self.assertEqual(merged, [(0, 1), (1, 2), (1, 3), (0, 4), (0, 4), (2, 5), (0, 9), (1, 10)])
+
+    def test_should_raise_the_same_alarms_as_a_single_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # the files of a sorted log are merged in the order of the log, so the alarms are triggered
+            # by the same lines
+            file_path = sort_log(write_log(directory), directory)
+            events = get_events(Agent(file_path, ServerStateMachine()))
+            merged_events = get_events(Agent(split_log(file_path, directory, 3), ServerStateMachine()))
+
+        self.assertGreater(len(events[0]), 0)
+        # the same transitions, at the same timestamps and with the same average hits, and the same windows
+        self.assertEqual(merged_events, events)
+
+    def test_should_keep_the_stats_of_each_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = split_log(write_log(directory), directory, 2)
+            source_events = []
+            agent = Agent(file_paths, ServerStateMachine(), per_source_stats=True)
+            agent.add_source_stats_subscriber(source_events.append)
+            agent.run()
+            agent.join()
+
+            hits_by_source = {}
+            for event in source_events:
+                hits_by_source[event.source] = hits_by_source.get(event.source, 0) + event.total_hits
+
+        self.assertEqual(set(hits_by_source), set(file_paths))
+        self.assertLessEqual(sum(hits_by_source.values()), agent.total_requests)
+
+    def test_should_not_wait_for_an_idle_file_when_following(self):
+        with tempfile.TemporaryDirectory() as directory:
+            busy_path = os.path.join(directory, 'busy.log')
+            idle_path = os.path.join(directory, 'idle.log')
+            with open(busy_path, 'w') as busy_file:
+                busy_file.write(HEADER)
+                for timestamp in range(100, 121):
+                    busy_file.write(f'"10.0.0.1","-","apache",{timestamp},"GET /api HTTP/1.0",200,1234\n')
+            with open(idle_path, 'w') as idle_file:
+                idle_file.write(HEADER)
+
+            reader = MergedReader([busy_path, idle_path], follow=True, poll=0.05)
+            timestamps = []
+            released = threading.Event()
+
+            def read():
+                for batch in reader.batches():
+                    timestamps.extend(int(line.split(',')[3]) for _, line in batch)
+                    if timestamps and timestamps[-1] >= 120 - LOG_DELAY:
+                        released.set()
+
+            thread = threading.Thread(target=read)
+            thread.start()
+            released.wait(5)
+            released_timestamps = list(timestamps)
+            reader.stop()
+            thread.join(5)
+
+        self.assertEqual(released_timestamps, list(range(100, 121 - LOG_DELAY)))
+        self.assertEqual(timestamps, list(range(100, 121)))
+
+    def test_should_expand_the_globs_of_the_cli(self):
+        with tempfile.TemporaryDirectory() as directory:
+            split_log(write_log(directory), directory, 2)
+            result = CliRunner(mix_stderr=False).invoke(cli, ['report', '--per-source',
+                                                              os.path.join(directory, 'node*.log')])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('"type": "source_stats", "source": "', result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
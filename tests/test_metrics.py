@@ -0,0 +1,73 @@
+import unittest
+import json
+import os
+import tempfile
+import urllib.request
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.metrics import Metrics, MetricsFileExporter, MetricsHttpServer
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+
+
+def run_agent(**options) -> (Agent, Metrics):
+    metrics = Metrics()
+    agent = Agent(TEST_HIGH_TRAFFIC_AND_RECOVERED, ServerStateMachine(), metrics=metrics, **options)
+    agent.add_stats_subscriber(lambda event: None)
+    agent.add_state_change_subscriber(lambda event: None)
+    agent.run()
+    agent.join()
+    return agent, metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_should_count_the_lines_and_batches(self):
+        agent, metrics = run_agent()
+        snapshot = metrics.snapshot()
+
+        self.assertEqual(snapshot['log_monitor_requests_total'], agent.total_requests)
+        self.assertEqual(snapshot['log_monitor_lines_read_total'],
+                         agent.total_requests + snapshot['log_monitor_lines_rejected_total'])
+        self.assertGreater(snapshot['log_monitor_delay_queue_flushes_total'], 0)
+        self.assertGreater(snapshot['log_monitor_batch_process_seconds']['count'], 0)
+        self.assertEqual(snapshot['log_monitor_notify_latency_seconds']['count'],
+                         sum(snapshot['log_monitor_events_dispatched_total'].values()))
+
+    def test_should_export_the_prometheus_format(self):
+        _, metrics = run_agent(use_mmap=True)
+        text = metrics.to_prometheus()
+
+        self.assertIn('# TYPE log_monitor_lines_read_total counter', text)
+        self.assertIn('log_monitor_events_dispatched_total{subscriber="run_agent.<locals>.<lambda>#1"}', text)
+        self.assertIn('log_monitor_batch_read_seconds_bucket{le="+Inf"}', text)
+
+    def test_should_serve_the_metrics_over_http(self):
+        _, metrics = run_agent()
+        server = MetricsHttpServer(metrics, 0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                body = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn('log_monitor_requests_total', body)
+
+    def test_should_write_the_metrics_file(self):
+        _, metrics = run_agent()
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'metrics.json')
+            exporter = MetricsFileExporter(metrics, file_path, interval=60)
+            exporter.start()
+            exporter.stop()
+
+            with open(file_path, 'r') as metrics_file:
+                snapshot = json.load(metrics_file)
+
+        self.assertIn('log_monitor_request_cache_depth', snapshot)
+        self.assertIn('log_monitor_delay_queue_depth', snapshot)
+
+
+if __name__ == '__main__':
+    unittest.main()
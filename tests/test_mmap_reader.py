@@ -0,0 +1,53 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.mmap_reader import MmapReader
+from tests.helpers import get_events, write_log, TEST_HIGH_TRAFFIC_AND_RECOVERED
+
+
+class TestMmapReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_raise_the_same_events_as_line_by_line(self):
+        for file_path in [TEST_HIGH_TRAFFIC_AND_RECOVERED, write_log(self._directory.name)]:
+            line_events = get_events(Agent(file_path, ServerStateMachine()))
+
+            self.assertEqual(line_events, get_events(Agent(file_path, ServerStateMachine(), use_mmap=True)))
+            self.assertEqual(line_events, get_events(MmapReader(file_path, runs_batch=7)))
+
+    @mock.patch('src.service.agent.ALERT_WINDOW_ENGINE', 'heap')
+    def test_should_feed_the_heap_cache(self):
+        line_events = get_events(Agent(TEST_HIGH_TRAFFIC_AND_RECOVERED, ServerStateMachine()))
+
+        self.assertEqual(line_events, get_events(Agent(TEST_HIGH_TRAFFIC_AND_RECOVERED, ServerStateMachine(), use_mmap=True)))
+
+    def test_should_count_the_lines_read_and_rejected(self):
+        file_path = write_log(self._directory.name)
+        with open(file_path, 'a') as log_file:
+            log_file.write('\n"10.0.0.1","-","apache",1549573860,"GET",200,1234\ninvalid last line')
+        line_agent = Agent(file_path, ServerStateMachine())
+        get_events(line_agent)
+        reader = MmapReader(file_path, runs_batch=7)
+        list(reader.runs())
+
+        self.assertEqual(line_agent.rejected_lines, 5)
+        self.assertEqual((reader.total_lines, reader.rejected_lines),
+                         (line_agent.total_lines, line_agent.rejected_lines))
+
+    def test_should_read_empty_files(self):
+        file_path = os.path.join(self._directory.name, 'empty.log')
+        open(file_path, 'w').close()
+
+        self.assertEqual(list(MmapReader(file_path).runs()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
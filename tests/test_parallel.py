@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.parallel import ParallelReader, parse_runs_from_lines, read_range
+from tests.helpers import get_events, write_log
+
+
+class TestParallelReader(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file_path = write_log(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_split_the_file_on_line_boundaries(self):
+        reader = ParallelReader(self.file_path, workers=2, chunk_size=1000)
+
+        with open(self.file_path, 'rb') as log_file:
+            content = log_file.read()
+
+        ranges = reader.get_ranges()
+        self.assertGreater(len(ranges), 10)
+        self.assertEqual(ranges[0][0], content.index(b'\n') + 1)
+        self.assertEqual(ranges[-1][1], len(content))
+        for start, end in ranges:
+            self.assertEqual(content[end - 1:end], b'\n')
+
+    def test_should_raise_the_same_events_as_the_sequential_read(self):
+        line_events = get_events(Agent(self.file_path, ServerStateMachine()))
+
+        self.assertEqual(line_events, get_events(ParallelReader(self.file_path, workers=2, chunk_size=1000)))
+
+    def test_should_count_the_lines_read_and_rejected(self):
+        line_agent = Agent(self.file_path, ServerStateMachine())
+        parallel_agent = Agent(self.file_path, ServerStateMachine(), workers=2)
+        get_events(line_agent)
+        get_events(parallel_agent)
+
+        self.assertEqual((parallel_agent.total_lines, parallel_agent.rejected_lines),
+                         (line_agent.total_lines, line_agent.rejected_lines))
+
+    def test_should_parse_without_numpy(self):
+        line_events = get_events(Agent(self.file_path, ServerStateMachine()))
+        reader = ParallelReader(self.file_path)
+        reader.runs = lambda: (parse_runs_from_lines(read_range(self.file_path, *r)) for r in reader.get_ranges())
+
+        self.assertEqual(line_events, get_events(reader))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+from src.model.server import Request
+
+LOG_LINE = '"10.0.0.2","-","apache",1549573860,"GET /api/user HTTP/1.0",200,1234'
+
+
+class TestRequest(unittest.TestCase):
+
+    def test_should_parse_the_log_line(self):
+        request = Request(LOG_LINE)
+
+        self.assertEqual(request.timestamp, 1549573860)
+        self.assertEqual(request.section, 'api')
+        self.assertEqual(request.status, '200')
+        self.assertEqual(request.date, '2019-02-07 21:11:00')
+
+    def test_should_share_section_and_status_strings(self):
+        request = Request(LOG_LINE)
+        other_request = Request(LOG_LINE.replace('/api/user', '/api/help'))
+
+        self.assertIs(request.section, other_request.section)
+        self.assertIs(request.status, other_request.status)
+        self.assertFalse(hasattr(request, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
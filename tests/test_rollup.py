@@ -0,0 +1,107 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.report import Report
+from src.service.rollup import RollupStore
+from tests.helpers import HEADER, log_line, write_log
+
+
+class TestRollupStore(unittest.TestCase):
+
+    def setUp(self):
+        self.rollups = RollupStore([(1, 60), (10, 12), (60, 5)], log_delay=2, top_sections=2)
+
+    def test_should_downsample_the_closed_seconds(self):
+        for second in range(0, 120):
+            self.rollups.append(second, 'api', '200')
+            self.rollups.append(second, 'user', '500', 2)
+        self.rollups.flush()
+
+        minutes = self.rollups.get_buckets(0, 119, resolution=60)
+        self.assertEqual([(bucket.start, bucket.hits) for bucket in minutes], [(0, 180), (60, 180)])
+        self.assertEqual(minutes[0].hits_by_status, {'200': 60, '500': 120})
+        self.assertEqual(minutes[0].hits_by_section, {'api': 60, 'user': 120})
+
+        tens = self.rollups.get_buckets(60, 119, resolution=10)
+        self.assertEqual([bucket.hits for bucket in tens], [30] * 6)
+        self.assertEqual(len(self.rollups.get_buckets(60, 119, resolution=1)), 60)
+
+    def test_should_keep_the_newest_buckets_of_each_ring(self):
+        for second in range(0, 1000):
+            self.rollups.append(second, 'api', '200')
+        self.rollups.flush()
+
+        seconds = self.rollups.get_history(1)
+        self.assertEqual([seconds[0].start, seconds[-1].start, len(seconds)], [940, 999, 60])
+        self.assertEqual([bucket.start for bucket in self.rollups.get_history(60)], [720, 780, 840, 900, 960])
+        # the ranges older than a ring are read on a coarser one
+        self.assertEqual(self.rollups.get_ring(900).resolution, 10)
+        self.assertEqual(self.rollups.get_summary(720, 959).hits, 240)
+        with self.assertRaises(ValueError):
+            self.rollups.get_history(3600)
+
+    def test_should_count_the_late_requests_on_the_next_open_second(self):
+        self.rollups.append(10, 'api', '200')
+        self.rollups.append(20, 'api', '200')
+        self.rollups.append(5, 'user', '200')
+        self.rollups.flush()
+
+        self.assertEqual([(bucket.start, bucket.hits) for bucket in self.rollups.get_buckets(0, 20, resolution=1)],
+                         [(10, 1), (19, 1), (20, 1)])
+
+    def test_should_keep_the_top_sections_of_complete_buckets(self):
+        for second in range(0, 20):
+            for section, hits in (('api', 5), ('user', 3), ('help', 1)):
+                self.rollups.append(second, section, '200', hits)
+        self.rollups.append(second, 'help', '200', 100)
+        self.rollups.flush()
+
+        self.assertEqual(self.rollups.get_buckets(0, 0, resolution=1)[0].hits_by_section, {'api': 5, 'user': 3})
+        ten = self.rollups.get_buckets(10, 19, resolution=10)[0]
+        self.assertEqual(ten.hits, 190)
+        self.assertEqual(ten.get_top_sections(2), [('help', 110), ('api', 50)])
+        self.assertEqual(self.rollups.get_buckets(0, 59, resolution=60)[0].hits_by_section, {'help': 120, 'api': 100})
+
+
+class TestRollupAgent(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_should_keep_every_request_on_the_rollups(self):
+        agent = Agent(write_log(self._directory.name), ServerStateMachine())
+        agent.run()
+        agent.join()
+
+        minutes = agent.rollups.get_history(60)
+        self.assertEqual(sum(bucket.hits for bucket in minutes), agent.total_requests)
+        self.assertEqual(sum(bucket.hits for bucket in agent.rollups.get_history(3600)), agent.total_requests)
+
+    def test_should_write_the_history_on_the_report(self):
+        file_path = os.path.join(self._directory.name, 'access.log')
+        with open(file_path, 'w') as log_file:
+            log_file.write(HEADER)
+            log_file.writelines(log_line(timestamp, section) + '\n'
+                                for timestamp in range(100, 130) for section in ('api', 'user'))
+        agent = Agent(file_path, ServerStateMachine())
+        agent.run()
+        agent.join()
+
+        output = io.StringIO()
+        Report(output).write_history(agent.rollups.get_history(60))
+        rows = [json.loads(row) for row in output.getvalue().splitlines()]
+        self.assertEqual([(row['type'], row['from_timestamp'], row['total_hits']) for row in rows],
+                         [('history', 60, 40), ('history', 120, 20)])
+        self.assertEqual(rows[0]['top_sections'], [{'section': 'api', 'total_hits': 20},
+                                                   {'section': 'user', 'total_hits': 20}])
+
+
+if __name__ == '__main__':
+    unittest.main()
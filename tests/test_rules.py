@@ -0,0 +1,127 @@
+import unittest
+import json
+import os
+import tempfile
+from click.testing import CliRunner
+from src.cli import cli
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.rules import AlertRule, RuleEngine, load_rules
+from src.state_machine.state import RuleState
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__), 'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+
+
+def get_transitions(engine: RuleEngine) -> list:
+    events = []
+    engine.notify = events.append
+    return events
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def test_should_raise_the_same_alarms_as_the_high_traffic_engine(self):
+        agent = Agent(TEST_HIGH_TRAFFIC_AND_RECOVERED, ServerStateMachine(), rules=[AlertRule('high_traffic', 120, 10)])
+        state_events = []
+        rule_events = []
+        agent.add_state_change_subscriber(state_events.append)
+        agent.add_rule_state_change_subscriber(rule_events.append)
+        agent.run()
+        agent.join()
+
+        self.assertEqual(len(state_events), 4)
+        self.assertEqual([(event.rule_state.name, event.timestamp) for event in rule_events],
+                         [('ALERT' if event.server_state.name == 'HIGH_TRAFFIC' else 'GOOD', event.timestamp)
+                          for event in state_events])
+
+    def test_should_evaluate_each_rule_over_the_shared_histogram(self):
+        engine = RuleEngine([
+            AlertRule('api', 10, 2, section='api'),
+            AlertRule('errors', 10, 0.5, metric='error_ratio'),
+            AlertRule('all', 60, 100),
+        ], log_delay=2)
+        events = get_transitions(engine)
+
+        for second in range(100, 130):
+            engine.append(second, 'api', '200', 3 if second < 110 else 1)
+            engine.append(second, 'user', '500' if second >= 115 else '200', 2)
+        engine.flush()
+
+        self.assertEqual([(event.rule_name, event.rule_state, event.timestamp) for event in events], [
+            ('api', RuleState.ALERT, 106),
+            ('api', RuleState.GOOD, 115),
+            ('errors', RuleState.ALERT, 122),
+        ])
+        self.assertEqual(set(engine._hits_prefix), {None, 'api'})
+
+    def test_should_count_the_late_lines_on_their_second(self):
+        engine = RuleEngine([AlertRule('burst', 1, 3)], log_delay=3)
+        events = get_transitions(engine)
+
+        for timestamp in [100, 101, 102, 100, 100, 103, 104, 105]:
+            engine.append(timestamp, 'api', '200')
+
+        self.assertEqual([(event.rule_state, event.timestamp) for event in events], [(RuleState.ALERT, 100),
+                                                                                    (RuleState.GOOD, 101)])
+
+    def test_should_raise_low_traffic_after_a_full_window(self):
+        engine = RuleEngine([AlertRule('low_traffic', 30, 1, condition='below')], log_delay=0)
+        events = get_transitions(engine)
+
+        for second in range(1000, 1040):
+            engine.append(second, 'api', '200', 2)
+        engine.append(100000, 'api', '200', 2)
+        for second in range(100001, 100040):
+            engine.append(second, 'api', '200', 2)
+
+        self.assertEqual([(event.rule_state, event.timestamp) for event in events], [(RuleState.ALERT, 1055),
+                                                                                    (RuleState.GOOD, 100014)])
+
+
+class TestLoadRules(unittest.TestCase):
+
+    def test_should_load_the_rules_of_a_json_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rules_path = os.path.join(directory, 'rules.json')
+            with open(rules_path, 'w') as rules_file:
+                json.dump({'rules': [{'name': 'high_traffic', 'window': 120, 'threshold': 10},
+                                     {'name': 'errors', 'window': 600, 'threshold': 0.05, 'metric': 'error_ratio'}]},
+                          rules_file)
+
+            rules = load_rules(rules_path)
+            result = CliRunner(mix_stderr=False).invoke(cli, ['report', '--rules', rules_path,
+                                                              TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+            with open(rules_path, 'w') as rules_file:
+                json.dump({'rules': [{'name': 'latency', 'window': 60, 'threshold': 1, 'metric': 'latency'}]},
+                          rules_file)
+            with self.assertRaises(ValueError):
+                load_rules(rules_path)
+
+        self.assertEqual([rule.name for rule in rules], ['high_traffic', 'errors'])
+        self.assertEqual(result.exit_code, 0)
+        rule_rows = [json.loads(line) for line in result.stdout.splitlines() if '"type": "rule"' in line]
+        self.assertEqual([row['rule_state'] for row in rule_rows if row['rule'] == 'high_traffic'],
+                         ['ALERT', 'GOOD', 'ALERT', 'GOOD'])
+
+    def test_should_reject_the_rules_with_a_wrong_type(self):
+        for rule in [{'name': 'high_traffic', 'window': 1.5, 'threshold': 10},
+                     {'name': 'high_traffic', 'window': '120', 'threshold': 10},
+                     {'name': 'high_traffic', 'window': 120, 'threshold': '10'},
+                     {'name': 'high_traffic', 'window': True, 'threshold': 10}]:
+            with self.assertRaises(ValueError):
+                AlertRule(**rule)
+
+        with tempfile.TemporaryDirectory() as directory:
+            rules_path = os.path.join(directory, 'rules.json')
+            with open(rules_path, 'w') as rules_file:
+                json.dump({'rules': [{'name': 'high_traffic', 'window': 1.5, 'threshold': 10}]}, rules_file)
+            result = CliRunner(mix_stderr=False).invoke(cli, ['report', '--rules', rules_path,
+                                                              TEST_HIGH_TRAFFIC_AND_RECOVERED])
+
+        self.assertIn('Invalid rules file', result.stdout)
+        self.assertIn(type(result.exception), (type(None), SystemExit))
+
+
+if __name__ == '__main__':
+    unittest.main()
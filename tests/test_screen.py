@@ -0,0 +1,94 @@
+import unittest
+import io
+from unittest import mock
+from src.config import SCREEN_QUEUE_SIZE
+from src.event.event import StatsEvent, StateChangeEvent
+from src.model.stats import SectionTrafficStats
+from src.service.rollup import RollupStore
+from src.state_machine.state import ServerState
+from src.utils.clock import ReplayClock
+from src.utils.renderer import Renderer, CURSOR_POSITION
+from src.utils.utils import Screen
+
+
+def get_stats_event(from_timestamp):
+    section_stats = SectionTrafficStats('api')
+    section_stats.add_hits({'200': 10})
+    return StatsEvent(from_timestamp, from_timestamp + 9, 10, [section_stats], {'200': 10})
+
+
+class TestRenderer(unittest.TestCase):
+
+    def test_should_only_write_the_changed_lines(self):
+        output = io.StringIO()
+        renderer = Renderer(output, fps=1000)
+
+        renderer.render(['first', 'second', 'third'])
+        output.truncate(0)
+        output.seek(0)
+        renderer.render(['first', 'changed', 'third'])
+
+        self.assertIn(CURSOR_POSITION.format(row=2) + 'changed', output.getvalue())
+        self.assertNotIn('first', output.getvalue())
+        self.assertNotIn('third', output.getvalue())
+
+    def test_should_not_draw_the_same_frame_twice(self):
+        renderer = Renderer(io.StringIO(), fps=1000)
+
+        renderer.render(['frame'])
+        renderer.render(['frame'])
+
+        self.assertEqual(renderer.rendered_frames, 1)
+
+
+class TestScreen(unittest.TestCase):
+
+    def test_should_drop_the_oldest_windows_when_the_queue_is_full(self):
+        screen = Screen(Renderer(io.StringIO()), start=False)
+
+        for window in range(SCREEN_QUEUE_SIZE + 5):
+            screen.on_new_stats(get_stats_event(window * 10))
+
+        self.assertEqual(screen.dropped_windows, 5)
+        self.assertEqual(len(screen._new_data_queue), SCREEN_QUEUE_SIZE)
+        self.assertEqual(screen._new_data_queue[0].from_timestamp, 50)
+
+    def test_should_show_every_alarm_of_the_window(self):
+        output = io.StringIO()
+        screen = Screen(Renderer(output, fps=1000), start=False, clock=ReplayClock(0))
+        screen.on_server_state_change(StateChangeEvent(ServerState.HIGH_TRAFFIC, 10, 2))
+        screen.on_server_state_change(StateChangeEvent(ServerState.GOOD, 9.9, 5))
+        screen.on_server_state_change(StateChangeEvent(ServerState.HIGH_TRAFFIC, 10, 50))
+
+        screen._print_data(get_stats_event(0))
+
+        self.assertIn('High Traffic generated an alert - hits 10.00', output.getvalue())
+        self.assertIn('Server recovered alert', output.getvalue())
+        self.assertEqual(screen._server_status, ServerState.GOOD)
+        self.assertEqual(len(screen._alarms_queue), 1)
+
+    @mock.patch('src.utils.utils.SCREEN_ALARMS_QUEUE_SIZE', 2)
+    def test_should_drop_the_oldest_alarms_when_the_queue_is_full(self):
+        screen = Screen(Renderer(io.StringIO()), start=False)
+        for timestamp in range(5):
+            screen.on_server_state_change(StateChangeEvent(ServerState.HIGH_TRAFFIC, 10, timestamp))
+
+        self.assertEqual(screen.dropped_alarms, 3)
+        self.assertEqual([alarm.timestamp for alarm in screen._alarms_queue], [3, 4])
+
+    def test_should_compare_the_last_hour_with_the_previous_one(self):
+        rollups = RollupStore()
+        for second in range(0, 7200, 10):
+            rollups.append(second, 'api', '200', 1 if second < 3600 else 2)
+        rollups.flush()
+
+        output = io.StringIO()
+        screen = Screen(Renderer(output, fps=1000), start=False, history_hits=rollups.get_hits, clock=ReplayClock(0))
+        screen._print_data(get_stats_event(7190))
+
+        self.assertIn('last hour 720 hits (previous 360)', output.getvalue())
+        self.assertIn('last day 1080 hits (previous 0)', output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import os
+import random
+from collections import Counter
+from src.config import DISPLAY_INTERVAL, LOG_DELAY, CSV_COLUMNS
+from src.model.server import Request
+from src.service.aggregator import SketchStatsAggregator, StatsAggregator
+from src.utils.sketch import DDSketch, SpaceSaving
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), '..', 'sample_csv.txt')
+
+
+def zipf_stream(keys: int, length: int, seed: int = 0) -> list:
+    rand = random.Random(seed)
+    return rand.choices([f'key{index}' for index in range(keys)], [1 / (rank + 1) for rank in range(keys)], k=length)
+
+
+class TestSpaceSaving(unittest.TestCase):
+
+    def test_should_be_exact_while_the_keys_fit(self):
+        sketch = SpaceSaving(10)
+        for key in 'aabbbcd':
+            sketch.add(key)
+
+        self.assertEqual([(hitter.key, hitter.count, hitter.error) for hitter in sketch.top(3)],
+                         [('b', 3, 0), ('a', 2, 0), ('c', 1, 0)])
+
+    def test_should_keep_the_error_bound_with_many_keys(self):
+        stream = zipf_stream(5000, 50000)
+        counts = Counter(stream)
+        sketch = SpaceSaving.from_error_rate(0.01)
+        for key in stream:
+            sketch.add(key)
+
+        self.assertEqual(len(sketch), 100)
+        for hitter in sketch.top(10):
+            self.assertGreaterEqual(hitter.count, counts[hitter.key])
+            self.assertLessEqual(hitter.count - hitter.error, counts[hitter.key])
+            self.assertLessEqual(hitter.count - counts[hitter.key], len(stream) * 0.01)
+        self.assertEqual([hitter.key for hitter in sketch.top(3)], [key for key, _ in counts.most_common(3)])
+
+    def test_should_merge_sketches(self):
+        stream = zipf_stream(2000, 20000, seed=1)
+        counts = Counter(stream)
+        first, second = SpaceSaving(200), SpaceSaving(200)
+        for index, key in enumerate(stream):
+            (first if index % 2 else second).add(key, detail='200')
+
+        first.merge(second)
+
+        self.assertEqual(first.total, len(stream))
+        for hitter in first.top(5):
+            self.assertGreaterEqual(hitter.count, counts[hitter.key])
+            self.assertLessEqual(hitter.count - counts[hitter.key], len(stream) / 100)
+            self.assertEqual(hitter.details, {'200': counts[hitter.key]})
+
+
+class TestDDSketch(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(5)
+        self.values = [int(rand.lognormvariate(8, 1.5)) for _ in range(20000)]
+
+    def _get_exact_quantile(self, values, q):
+        return sorted(values)[int(q * (len(values) - 1))]
+
+    def test_should_keep_the_relative_error(self):
+        sketch = DDSketch(0.01)
+        for value in self.values:
+            sketch.add(value)
+
+        for q in (0.5, 0.95, 0.99):
+            exact = self._get_exact_quantile(self.values, q)
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), exact * 0.01 + 1)
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertEqual(sketch.sum, sum(self.values))
+        self.assertEqual(sketch.quantile(1), max(self.values))
+
+    def test_should_merge_sketches(self):
+        first, second, merged = DDSketch(0.01), DDSketch(0.01), DDSketch(0.01)
+        for index, value in enumerate(self.values):
+            (first if index % 2 else second).add(value)
+            merged.add(value)
+
+        first.merge(second)
+
+        self.assertEqual(first._buckets, merged._buckets)
+        self.assertEqual(first.quantile(0.95), merged.quantile(0.95))
+        with self.assertRaises(ValueError):
+            first.merge(DDSketch(0.05))
+
+    def test_should_collapse_the_lowest_buckets(self):
+        sketch = DDSketch(0.01, max_buckets=200)
+        for value in self.values:
+            sketch.add(value)
+
+        self.assertLessEqual(len(sketch), 200)
+        exact = self._get_exact_quantile(self.values, 0.99)
+        self.assertLessEqual(abs(sketch.quantile(0.99) - exact), exact * 0.01 + 1)
+        self.assertIsNone(DDSketch().quantile(0.5))
+
+
+class TestSketchStatsAggregator(unittest.TestCase):
+
+    def setUp(self):
+        with open(SAMPLE_CSV, 'r') as log_file:
+            next(log_file)
+            self.requests = [Request(line) for line in log_file if len(line.split(',')) == CSV_COLUMNS]
+
+    def test_should_close_the_same_windows_as_the_exact_aggregator(self):
+        exact_events = []
+        sketch_events = []
+        exact = StatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        exact.notify = exact_events.append
+        sketch = SketchStatsAggregator(DISPLAY_INTERVAL, LOG_DELAY)
+        sketch.notify = sketch_events.append
+
+        for request in self.requests:
+            exact.append(request)
+            sketch.append(request)
+
+        self.assertGreater(len(exact_events), 0)
+        self.assertEqual([(event.from_timestamp, event.to_timestamp, event.total_hits, event.hits_by_status,
+                           [(stats.section, stats.total_hits, stats.hits_by_status) for stats in event.top_sections])
+                          for event in sketch_events],
+                         [(event.from_timestamp, event.to_timestamp, event.total_hits, event.hits_by_status,
+                           [(stats.section, stats.total_hits, stats.hits_by_status) for stats in event.top_sections])
+                          for event in exact_events])
+        self.assertTrue(all(event.top_hosts for event in sketch_events))
+        self.assertGreaterEqual(sketch_events[-1].alert_top_sections[0].total_hits,
+                                sketch_events[-1].top_sections[0].total_hits)
+
+    def test_should_keep_fixed_size_sketches_with_many_sections(self):
+        aggregator = SketchStatsAggregator(DISPLAY_INTERVAL, LOG_DELAY, error_rate=0.1)
+        events = []
+        aggregator.notify = events.append
+
+        for second in range(30):
+            for index in range(200):
+                aggregator.append(Request(f'"10.0.{index}.1","-","apache",{1549573860 + second},'
+                                          f'"GET /section{index}/x HTTP/1.0",200,1234'))
+            for _ in range(50):
+                aggregator.append(Request(f'"10.0.0.9","-","apache",{1549573860 + second},"GET /hot/x HTTP/1.0",200,1'))
+
+        self.assertTrue(all(len(sections) <= 10 and len(hosts) <= 10
+                            for sections, hosts, _ in aggregator._seconds.values()))
+        self.assertEqual(events[0].top_sections[0].section, 'hot')
+        self.assertEqual(events[0].top_hosts[0].key, '10.0.0.9')
+
+
+if __name__ == '__main__':
+    unittest.main()
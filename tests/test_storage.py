@@ -0,0 +1,120 @@
+import unittest
+import json
+import os
+import tempfile
+from click.testing import CliRunner
+from src.cli import cli
+from src.event.event import RuleStateChangeEvent, StateChangeEvent, StatsEvent
+from src.model.stats import SectionTrafficStats
+from src.service.storage import JsonlStore, SQLiteStore, StatsStore, get_store
+from src.state_machine.state import RuleState, ServerState
+
+TEST_HIGH_TRAFFIC_AND_RECOVERED = os.path.join(os.path.dirname(__file__),
+                                               'fixtures/sample_with_high_traffic_and_recovered_alarms.csv')
+
+
+def get_stats_event(from_timestamp, hits_by_section):
+    top_sections = []
+    for section, hits in hits_by_section.items():
+        section_stats = SectionTrafficStats(section)
+        section_stats.add_hits({'200': hits})
+        top_sections.append(section_stats)
+    total_hits = sum(hits_by_section.values())
+    return StatsEvent(from_timestamp, from_timestamp + 9, total_hits, top_sections, {'200': total_hits})
+
+
+class TestStatsStore(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _fill(self, store):
+        store.start()
+        store.on_new_stats(get_stats_event(100, {'api': 10, 'user': 5}))
+        store.on_new_stats(get_stats_event(110, {'user': 20}))
+        store.on_server_state_change(StateChangeEvent(ServerState.HIGH_TRAFFIC, 12.5, 115))
+        store.on_new_stats(get_stats_event(120, {'api': 30}))
+        store.on_rule_state_change(RuleStateChangeEvent('errors', RuleState.ALERT, 0.2, 125))
+        store.close()
+
+    def _assert_queries(self, store):
+        self.assertEqual(store.query_top_sections(limit=1), [('api', 40)])
+        self.assertEqual(store.query_top_sections(100, 119), [('user', 25), ('api', 10)])
+        self.assertEqual(store.query_alerts(), [
+            {'timestamp': 115, 'name': 'high_traffic', 'state': 'HIGH_TRAFFIC', 'value': 12.5},
+            {'timestamp': 125, 'name': 'errors', 'state': 'ALERT', 'value': 0.2},
+        ])
+        self.assertEqual(store.query_alerts(120), store.query_alerts()[1:])
+
+    def test_should_write_the_events_in_batches_on_sqlite(self):
+        store = SQLiteStore(os.path.join(self._directory.name, 'stats.db'), batch_size=2, flush_interval=60)
+        self._fill(store)
+
+        self.assertIsNone(store.error)
+        self.assertEqual(store.written_rows, 5)
+        self.assertEqual(store.written_batches, 3)
+        self._assert_queries(store)
+
+    def test_should_rotate_the_jsonl_files(self):
+        path = os.path.join(self._directory.name, 'stats.jsonl')
+        store = JsonlStore(path, batch_size=1, max_bytes=1, backups=10)
+        self._fill(store)
+
+        # a file by row and the new empty file
+        self.assertEqual(len(os.listdir(self._directory.name)), 6)
+        self._assert_queries(store)
+
+        path = os.path.join(self._directory.name, 'other.jsonl')
+        self._fill(JsonlStore(path, batch_size=1, max_bytes=1, backups=2))
+        self.assertEqual(sorted(name for name in os.listdir(self._directory.name) if name.startswith('other')),
+                         ['other.jsonl', 'other.jsonl.1', 'other.jsonl.2'])
+
+    def test_should_keep_the_error_of_the_disk(self):
+        store = get_store(os.path.join(self._directory.name, 'missing', 'stats.jsonl'))
+        self._fill(store)
+
+        self.assertIsNotNone(store.error)
+        self.assertEqual(store.written_rows, 0)
+
+    def test_should_not_create_a_store_with_the_queries(self):
+        path = os.path.join(self._directory.name, 'stats.db')
+
+        with self.assertRaises(ValueError):
+            SQLiteStore(path).query_alerts()
+        self.assertFalse(os.path.exists(path))
+        with self.assertRaises(TypeError):
+            StatsStore(path)
+
+    def test_should_report_a_file_that_is_not_a_store(self):
+        runner = CliRunner(mix_stderr=False)
+        for name in ('stats.db', 'stats.jsonl'):
+            path = os.path.join(self._directory.name, name)
+            with open(path, 'w') as store_file:
+                store_file.write('not a store\n')
+
+            result = runner.invoke(cli, ['query', path])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn('Can not read the store', result.stderr)
+            with open(path, 'r') as store_file:
+                self.assertEqual(store_file.read(), 'not a store\n')
+
+    def test_should_query_the_store_of_a_report(self):
+        path = os.path.join(self._directory.name, 'stats.db')
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(cli, ['report', '--store', path, TEST_HIGH_TRAFFIC_AND_RECOVERED])
+        self.assertEqual(result.exit_code, 0)
+
+        alerts = [row for row in result.stdout.splitlines() if json.loads(row)['type'] == 'alert']
+        self.assertEqual(len(SQLiteStore(path).query_alerts()), len(alerts))
+
+        result = runner.invoke(cli, ['query', '--top', '1', path])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('HIGH_TRAFFIC', result.stdout)
+        self.assertIn('Top sections', result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import socket
+import threading
+import time
+from src.model.server import ServerStateMachine
+from src.service.agent import Agent
+from src.service.syslog import SyslogReader, get_log_line
+
+
+def log_line(timestamp, section='api'):
+    return f'"10.0.0.1","-","apache",{timestamp},"GET /{section}/user HTTP/1.0",200,1234'
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestSyslogReader(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = SyslogReader(udp_port=0, tcp_port=0, flush_interval=0.01)
+        self.reader.start()
+        self.lines = []
+        self._thread = None
+
+    def tearDown(self):
+        self.reader.stop()
+        if self._thread:
+            self._thread.join()
+
+    def _read(self):
+        def read():
+            for batch in self.reader.batches():
+                self.lines.extend(batch)
+
+        self._thread = threading.Thread(target=read)
+        self._thread.start()
+
+    def _send_udp(self, messages):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            for message in messages:
+                udp_socket.sendto(message.encode(), self.reader.udp_address)
+
+    def test_should_drop_the_syslog_header(self):
+        self.assertEqual(get_log_line(f'<134>Oct 11 22:14:15 web1 nginx: {log_line(1)}\n'.encode()), log_line(1))
+        self.assertEqual(get_log_line(f'<134>1 2019-02-07T21:11:00Z web1 nginx - - - {log_line(1)}'.encode()),
+                         log_line(1))
+        self.assertEqual(get_log_line(log_line(1).encode()), log_line(1))
+        self.assertIsNone(get_log_line(b'<134>Oct 11 22:14:15 web1 kernel: no access log'))
+
+    def test_should_skip_the_structured_data(self):
+        structured_data = '[exampleSDID@32473 iut="3" eventSource="App \\"web\\" [x\\]"][origin ip="10.0.0.2"]'
+        for message in [f'<134>1 2019-02-07T21:11:00.003Z web1 nginx 1234 ID47 {structured_data} {log_line(1)}',
+                        f'<134>1 - - - - - {structured_data} \ufeff{log_line(1)}',
+                        f'<134>1 - web1 nginx - - - {log_line(1)}\r\n']:
+            self.assertEqual(get_log_line(message.encode()), log_line(1))
+
+        self.assertIsNone(get_log_line(f'<134>1 - web1 nginx - - {structured_data} no access log'.encode()))
+        self.assertIsNone(get_log_line(f'<134>1 - web1 nginx - - [origin ip="10.0.0.2" {log_line(1)}'.encode()))
+
+    def test_should_receive_the_lines_over_udp_and_tcp(self):
+        self._read()
+        self._send_udp([f'<134>Oct 11 22:14:15 web1 nginx: {log_line(1)}'])
+
+        with socket.create_connection(self.reader.tcp_address) as tcp_socket:
+            framed = f'<134>1 - web2 nginx - - - {log_line(3)}'
+            tcp_socket.sendall(f'<134>web2 nginx: {log_line(2)}\n{len(framed)} {framed}'.encode())
+
+        wait_for(lambda: len(self.lines) == 3)
+        self.assertEqual(sorted(self.lines), [log_line(1), log_line(2), log_line(3)])
+
+    def test_should_drop_the_udp_lines_while_the_queue_is_full(self):
+        reader = SyslogReader(udp_port=0, tcp_port=0, batch_size=1, flush_interval=0.01, queue_size=1)
+        reader.start()
+        self.addCleanup(reader.stop)
+        self.reader, previous = reader, self.reader
+        previous.stop()
+
+        self._send_udp([log_line(timestamp) for timestamp in range(10)])
+        wait_for(lambda: reader.received_lines == 10)
+        self.assertGreater(reader.dropped_lines, 0)
+
+        with socket.create_connection(reader.tcp_address) as tcp_socket:
+            tcp_socket.sendall(''.join(f'{log_line(timestamp)}\n' for timestamp in range(20, 30)).encode())
+
+        self._read()
+        # the TCP lines wait for the agent instead of being dropped
+        wait_for(lambda: len(self.lines) == 20 - reader.dropped_lines)
+        self.assertEqual(self.lines[-10:], [log_line(timestamp) for timestamp in range(20, 30)])
+
+
+class TestSyslogAgent(unittest.TestCase):
+
+    def test_should_process_the_received_lines(self):
+        reader = SyslogReader(udp_port=0, flush_interval=0.01)
+        reader.start()
+        agent = Agent(reader.name, ServerStateMachine(), reader=reader)
+        agent.run()
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+            for timestamp in range(100, 120):
+                udp_socket.sendto(f'<134>web1 nginx: {log_line(timestamp)}'.encode(), reader.udp_address)
+            udp_socket.sendto(b'<134>web1 nginx: "not","an","access","log"', reader.udp_address)
+
+        wait_for(lambda: agent.total_lines == 21)
+        agent.stop()
+        agent.join()
+
+        self.assertEqual(agent.total_requests, 20)
+        self.assertEqual(agent.rejected_lines, 1)
+
+    def test_should_not_accept_a_reader_with_a_file_engine(self):
+        reader = SyslogReader(udp_port=0)
+        with self.assertRaises(ValueError):
+            Agent(reader.name, ServerStateMachine(), batch=True, reader=reader)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from src.service.tail import LogTail, Inotify
+
+HEADER = '"remotehost","rfc931","authuser","date","request","status","bytes"\n'
+
+
+def log_line(timestamp):
+    return f'"10.0.0.1","-","apache",{timestamp},"GET /api/user HTTP/1.0",200,1234\n'
+
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self._directory.name, 'access.log')
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER + log_line(1))
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _append(self, content, file_path=None):
+        with open(file_path or self.file_path, 'a') as log_file:
+            log_file.write(content)
+
+    def _start(self, log_tail):
+        lines = []
+
+        def read():
+            for batch in log_tail.batches():
+                lines.extend(batch)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        return lines, thread
+
+    def _wait_for(self, lines, total):
+        deadline = time.time() + 5
+        while len(lines) < total and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_should_stop_at_the_end_of_the_file_without_follow(self):
+        self._append(log_line(2) + log_line(3).rstrip('\n'))
+
+        lines = [line for batch in LogTail(self.file_path).batches() for line in batch]
+
+        self.assertEqual(lines, [log_line(1).rstrip('\n'), log_line(2).rstrip('\n'), log_line(3).rstrip('\n')])
+
+    def _test_follow(self, log_tail):
+        lines, thread = self._start(log_tail)
+        self._wait_for(lines, 1)
+
+        self._append(log_line(2))
+        self._wait_for(lines, 2)
+
+        os.rename(self.file_path, self.file_path + '.1')
+        self._append(log_line(3), self.file_path + '.1')
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER + log_line(4))
+        self._wait_for(lines, 4)
+
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(HEADER)
+        time.sleep(0.1)
+        self._append(log_line(5))
+        self._wait_for(lines, 5)
+
+        log_tail.stop()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([int(line.split(',')[3]) for line in lines], [1, 2, 3, 4, 5])
+
+    def test_should_keep_the_first_line_after_a_truncation_without_header(self):
+        log_tail = LogTail(self.file_path, follow=True, min_poll=0.01, max_poll=0.05)
+        lines, thread = self._start(log_tail)
+        self._append(log_line(2))
+        self._wait_for(lines, 2)
+
+        with open(self.file_path, 'w'):
+            pass
+        time.sleep(0.1)
+        self._append(log_line(3) + log_line(4))
+        self._wait_for(lines, 4)
+
+        log_tail.stop()
+        thread.join(5)
+
+        self.assertEqual([int(line.split(',')[3]) for line in lines], [1, 2, 3, 4])
+
+    def test_should_follow_appends_rotation_and_truncation(self):
+        self._test_follow(LogTail(self.file_path, follow=True, min_poll=0.01, max_poll=0.05))
+
+    @mock.patch.object(Inotify, 'is_available', return_value=False)
+    def test_should_follow_with_poll_when_inotify_is_not_available(self, _):
+        self._test_follow(LogTail(self.file_path, follow=True, min_poll=0.01, max_poll=0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()